@@ -1,22 +1,45 @@
+import copy
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import json
-from openpyxl import Workbook
-import io
-from utils import create_change_message
-from session_state import init_session_state, IMPLEMENTATION_TYPES
+from utils import create_change_message, refresh_derived_costs
+from session_state import (
+    init_session_state, rebuild_implementation_tables, CATEGORIES, TECH_LOCATIONS
+)
+from cost_model import (
+    REPORTING_CURRENCY, REPORTING_SYMBOL, change_key, current_costs, current_rate, item_currencies,
+    record_positions, resource_locations, unknown_currencies
+)
+from cost_cube import session_cube
+from change_index import ChangeIndex, conflicts_by_change, describe_conflict
+from cost_tables import MAX_STYLED_ROWS, cost_change_styles, currency_column_config
+from workbook_io import write_analysis, read_analysis
+from timing import begin_rerun, lap, render_timing_panel
+from session_memory import compact_session_state, render_memory_panel
+from background_jobs import (
+    JobCancelled, collect_finished_jobs, render_job_panel, running_job, submit_job
+)
+from consolidation import consolidate_workbooks
+from portfolio_store import (
+    sync_shared_portfolio, publish, publish_items, publish_removed_items, publish_portfolio
+)
+from record_import import (
+    IMPORT_FIELDS, guess_column_mapping, read_import_file, build_import_records, next_record_id
+)
 
 # Page config
 st.set_page_config(page_title="Cost Savings Analysis", layout="wide")
+begin_rerun('app')
 
 # Initialize session state
+lap("Session sync")
 init_session_state()
+sync_shared_portfolio()
+refresh_derived_costs()
+compact_session_state()
 
-# Constants
-CATEGORIES = ["Resource", "Technology"]
-RESOURCE_LOCATIONS = ["Onshore", "Offshore"]
-TECH_LOCATIONS = ["On-premise", "Cloud"]
+RECORD_PAGE_SIZES = [25, 50, 100]
+RECORD_VIEWS = ["Current Records", "Add Record", "Future State Changes", "Cost Analysis"]
 
 # Helper functions
 def delete_record(record):
@@ -27,6 +50,7 @@ def delete_record(record):
     st.session_state.records = [r for r in st.session_state.records if r['id'] != record_id]
     
     # Remove associated changes while preserving other changes
+    removed_changes = [c for c in st.session_state.changes if c['record_id'] == record_id]
     st.session_state.changes = [
         c for c in st.session_state.changes 
         if c['record_id'] != record_id
@@ -41,9 +65,36 @@ def delete_record(record):
     for key in keys_to_remove:
         del st.session_state.implementation_costs[key]
     
+    publish_removed_items('records', [record])
+    publish_removed_items('changes', removed_changes)
+    publish('implementation_costs', removals=keys_to_remove)
+    
     # Set flag to trigger rerun
     st.session_state.trigger_rerun = True
 
+def add_change(change):
+    """Record a planned change, warning when it conflicts with the record's other changes"""
+    record_changes = [c for c in st.session_state.changes if str(c['record_id']) == str(change['record_id'])]
+    index = ChangeIndex(record_changes)
+    
+    # Changes set absolute values, so a change starts from what the change of
+    # the same type in effect at its year leaves rather than the record's value
+    previous = index.before(change)
+    if previous is not None and previous['type'] == change['type']:
+        change['from'] = previous['to']
+    conflicts = index.check(change)
+    
+    st.session_state.changes.append(change)
+    publish_items('changes', [change])
+    if conflicts:
+        st.toast(
+            f"Change recorded, but it conflicts with {len(conflicts)} other planned "
+            f"change{'s' if len(conflicts) > 1 else ''} of this record. See Future State Changes.",
+            icon="⚠️"
+        )
+    else:
+        st.toast("Change recorded!")
+
 def add_sample_data():
     """Add sample records and changes for demonstration"""
     # Sample records
@@ -289,731 +340,805 @@ def add_sample_data():
             }
         }
     }
+    publish_portfolio()
 
     st.success("Sample data loaded successfully!")
     st.rerun()
 
+def load_portfolio(records, changes, implementation_costs):
+    """Replace the session portfolio and rebuild the implementation tables from its costs"""
+    st.session_state.records = records
+    st.session_state.changes = changes
+    st.session_state.implementation_costs = implementation_costs
+    
+    rebuild_implementation_tables(implementation_costs)
+    publish_portfolio()
+
+@st.fragment
+def render_record_editor(record, internal_business, selected_category):
+    """
+    Render the detail view and change-planning widgets for a single record.
+
+    Runs as a fragment so editing these widgets only reruns this block; applying
+    a change or deleting the record triggers a full rerun to refresh the totals.
+    """
+    # A delete callback fired inside the fragment needs the whole app to rerun
+    if st.session_state.get('trigger_rerun', False):
+        st.session_state.trigger_rerun = False
+        st.rerun()
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        # Simplified layout for better readability
+        if selected_category == "Resource":
+            # Resource layout
+            st.markdown(f"""
+                #### Key Information
+                - **Location:** {record['location']}
+                - **Team Size:** {record['count']} resources
+                - **Cost per Resource:** {REPORTING_SYMBOL}{record['unit_cost'] or 0:,.0f}
+    
+                #### Comments
+                _{record['comments'] if record['comments'] else 'No comments provided'}_
+            """)
+        else:
+            # Technology layout
+            st.markdown(f"""
+                #### Key Information
+                - **Annual Cost:** {record_cost_label(record)}
+    
+                #### Comments
+                _{record['comments'] if record['comments'] else 'No comments provided'}_
+            """)
+    
+    with col2:
+        if selected_category == "Resource":
+            change_type = st.selectbox(
+                "Plan Change",
+                ["No Change", "Modify Count", "Change Location"],
+                key=f"change_type_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+            )
+    
+            implementation_year = st.selectbox(
+                "Implementation Year",
+                range(1, 6),
+                key=f"year_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+            )
+    
+            st.button("Delete Record", 
+                    key=f"del_record_{record['id']}_{hash(tuple(sorted(record['functions'])))}",
+                    type="secondary",
+                    on_click=delete_record,
+                    args=(record,))
+    
+            if change_type == "Modify Count":
+                new_count = st.number_input(
+                    "New Count",
+                    min_value=0,
+                    value=record['count'],
+                    key=f"new_count_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+                )
+                change_description = st.text_area(
+                    "Change Description",
+                    placeholder="e.g., Automation reduces headcount",
+                    key=f"desc_count_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+                )
+                if st.button("Apply Change", key=f"apply_count_{record['id']}_{hash(tuple(sorted(record['functions'])))}"):
+                    # Calculate new total cost based on unit cost
+                    new_total_cost = (new_count * record['unit_cost']) if record['unit_cost'] is not None else 0
+    
+                    change = {
+                        'record_id': record['id'],
+                        'type': 'count_change',
+                        'from': record['count'],
+                        'to': new_count,
+                        'implementation_year': implementation_year,
+                        'description': change_description,
+                        'timestamp': datetime.now().isoformat(),
+                        'new_total_cost': new_total_cost,
+                        'original_location': record['location'],
+                        'original_unit_cost': record['unit_cost']
+                    }
+    
+                    add_change(change)
+                    st.rerun()
+    
+            elif change_type == "Change Location":
+                new_location = st.selectbox(
+                    "New Location",
+                    resource_locations(st.session_state.assumptions, internal_business) if record['category'] == "Resource" else TECH_LOCATIONS,
+                    key=f"new_location_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+                )
+                # Add description field before the button
+                change_description = st.text_area(
+                    "Change Description",
+                    placeholder="e.g., Moving to cloud reduces headcount",
+                    key=f"desc_location_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+                )
+    
+                if st.button("Apply Change", key=f"apply_location_{record['id']}_{hash(tuple(sorted(record['functions'])))}"):
+                    # Get new unit cost from assumptions
+                    new_unit_cost = current_rate(st.session_state.assumptions, internal_business, new_location)
+                    # Calculate new total cost based on the ratio of unit costs
+                    new_total_cost = (new_unit_cost / record['unit_cost']) * record['total_cost'] if record['unit_cost'] > 0 else record['total_cost']
+    
+                    change = {
+                        'record_id': record['id'],
+                        'type': 'location_change',
+                        'from': record['location'],
+                        'to': new_location,
+                        'implementation_year': implementation_year,
+                        'description': change_description,
+                        'timestamp': datetime.now().isoformat(),
+                        'new_total_cost': new_total_cost
+                    }
+                    add_change(change)
+                    st.rerun()
+    
+        else:  # Technology
+            change_type = st.selectbox(
+                "Plan Change",
+                ["No Change", "Modify Cost"],
+                key=f"change_type_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+            )
+    
+            implementation_year = st.selectbox(
+                "Implementation Year",
+                range(1, 6),
+                key=f"year_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+            )
+    
+            st.button("Delete Record", 
+                    key=f"del_record_{record['id']}_{hash(tuple(sorted(record['functions'])))}",
+                    type="secondary",
+                    on_click=delete_record,
+                    args=(record,))
+    
+            if change_type == "Modify Cost":
+                new_cost = st.number_input(
+                    "New Annual Cost",
+                    min_value=0.0,
+                    value=float(record['total_cost']),
+                    key=f"new_cost_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+                )
+                # Add description field
+                change_description = st.text_area(
+                    "Change Description",
+                    placeholder="e.g., Cloud migration reduces cost",
+                    key=f"desc_cost_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
+                )
+                if st.button("Apply Change", key=f"apply_cost_{record['id']}_{hash(tuple(sorted(record['functions'])))}"):
+                    change = {
+                        'record_id': record['id'],
+                        'type': 'cost_change',
+                        'from': record['total_cost'],
+                        'to': new_cost,  # Just use the new cost directly
+                        'implementation_year': implementation_year,
+                        'description': change_description,
+                        'timestamp': datetime.now().isoformat(),
+                        'new_total_cost': new_cost  # Add this to be consistent with other changes
+                    }
+                    add_change(change)
+                    st.rerun()
+
+def record_cost_label(record):
+    """Current annual cost of a record in the reporting currency, plus its own amount when it is in another"""
+    label = f"{REPORTING_SYMBOL}{current_costs([record], st.session_state.fx_rates)[0]:,.0f}"
+    currency = item_currencies([record])[0]
+    if currency != REPORTING_CURRENCY:
+        label += f" ({record['total_cost'] or 0:,.0f} {currency})"
+    return label
+
+def record_display_name(record):
+    """Short label for a record in lists and selectors"""
+    if record['category'] == "Resource":
+        return f"{', '.join(record['functions'])} Team ({record['location']})"
+    return f"{record['tech_name']} ({', '.join(record['functions'])})"
+
+def render_records_page(category_records, internal_business, selected_category):
+    """Searchable, paginated summary of records with a full editor for the selected one"""
+    key_suffix = f"{internal_business}_{selected_category}"
+    
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        search = st.text_input(
+            "Search",
+            placeholder="Function, technology or comment",
+            key=f"record_search_{key_suffix}"
+        )
+    with col2:
+        function_filter = st.multiselect(
+            "Functions",
+            st.session_state.FUNCTIONS,
+            key=f"record_functions_{key_suffix}"
+        )
+    with col3:
+        page_size = st.selectbox("Rows per page", RECORD_PAGE_SIZES, key=f"record_page_size_{key_suffix}")
+    
+    records_df = pd.DataFrame({
+        'ID': [r['id'] for r in category_records],
+        'Name': [record_display_name(r) for r in category_records],
+        'Functions': [', '.join(r['functions']) for r in category_records],
+        'Location': [r['location'] for r in category_records],
+        'Currency': item_currencies(category_records),
+        'Count': [r['count'] for r in category_records],
+        'Unit Cost': [r['unit_cost'] for r in category_records],
+        'Total Cost': [r['total_cost'] for r in category_records],
+        'Comments': [r['comments'] or '' for r in category_records],
+    })
+    
+    # Filter on the summary frame so only matching rows are ever rendered
+    mask = pd.Series(True, index=records_df.index)
+    if search:
+        searchable = records_df['Name'] + ' ' + records_df['Comments']
+        mask &= searchable.str.contains(search, case=False, regex=False)
+    if function_filter:
+        wanted = set(function_filter)
+        mask &= [bool(wanted.intersection(r['functions'])) for r in category_records]
+    matches = records_df.index[mask.to_numpy()]
+    
+    page_count = max(1, -(-len(matches) // page_size))
+    page_key = f"record_page_{key_suffix}"
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key=page_key)
+    page_rows = matches[(page - 1) * page_size:page * page_size]
+    st.caption(f"Showing {len(page_rows):,} of {len(matches):,} matching records ({len(category_records):,} total)")
+    
+    if selected_category == "Resource":
+        columns = ['Name', 'Location', 'Count', 'Unit Cost', 'Total Cost', 'Currency', 'Comments']
+    else:
+        columns = ['Name', 'Functions', 'Total Cost', 'Currency', 'Comments']
+    # Costs are shown in each record's own currency
+    money_format = "dollar" if (records_df['Currency'] == REPORTING_CURRENCY).all() else "localized"
+    st.dataframe(
+        records_df.loc[page_rows, columns],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'Unit Cost': st.column_config.NumberColumn(format=money_format),
+            'Total Cost': st.column_config.NumberColumn(format=money_format),
+        }
+    )
+    
+    # Only the record picked for editing gets the full set of widgets; the pick is
+    # kept by record id so deletes, filters and syncs never retarget it
+    records_by_id = {r['id']: r for r in category_records}
+    edit_options = [None] + [category_records[i]['id'] for i in page_rows]
+    edit_key = f"record_edit_{key_suffix}"
+    if st.session_state.get(edit_key) not in edit_options:
+        st.session_state[edit_key] = None
+    edit_id = st.selectbox(
+        "Edit Record",
+        edit_options,
+        format_func=lambda i: "Select a record to edit or plan a change" if i is None else record_display_name(records_by_id[i]),
+        key=edit_key
+    )
+    if edit_id is not None:
+        record = records_by_id[edit_id]
+        with st.container(border=True):
+            st.markdown(f"### {record_display_name(record)} - {record_cost_label(record)}")
+            render_record_editor(record, internal_business, selected_category)
+
+def apply_finished_jobs():
+    """Pick up Save/Load Analysis jobs that finished since the last rerun"""
+    for job in collect_finished_jobs():
+        result, error = job.outcome()
+        if job.name == 'load_analysis':
+            # Only a successful load marks the upload as done; a failed or cancelled
+            # one is skipped until the file is removed, and selecting it again retries
+            file_id = st.session_state.pop('loading_file_id', None)
+            if error is None:
+                st.session_state.loaded_file_id = file_id
+            else:
+                st.session_state.failed_file_id = file_id
+        if isinstance(error, JobCancelled):
+            st.toast(f"{job.label} cancelled")
+        elif error is not None:
+            if job.name == 'load_analysis':
+                st.sidebar.error(f"Error loading file: {str(error)}")
+                st.sidebar.error("Please ensure the file format is correct.")
+            else:
+                st.sidebar.error(f"{job.label} failed: {str(error)}")
+        elif job.name == 'save_analysis':
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            st.session_state.analysis_download = (result, f"cost_analysis_{timestamp}.xlsx")
+            st.toast("Analysis ready for download!")
+        elif job.name == 'load_analysis':
+            records, changes, implementation_costs = result
+            if not implementation_costs:
+                st.toast("No implementation data found in this file")
+            load_portfolio(records, changes, implementation_costs)
+            st.toast("Analysis loaded successfully!")
+
+lap("Background jobs")
+apply_finished_jobs()
+
 # Main content
 st.title("Cost Savings Analysis")
 
 # Move Save/Load to sidebar
+lap("Sidebar")
 st.sidebar.title("Data Management")
 
 # Create three columns in the sidebar for the buttons
 col1, col2, col3 = st.sidebar.columns(3)
 
 with col1:
-    if st.button("Save Analysis"):
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            # Save records
-            records_df = pd.DataFrame(st.session_state.records)
-            if not records_df.empty:
-                records_df['functions'] = records_df['functions'].apply(lambda x: json.dumps(x))
-                records_df['function_descriptions'] = records_df['function_descriptions'].apply(lambda x: json.dumps(x))
-            records_df.to_excel(writer, sheet_name='Records', index=False)
-            
-            # Save changes
-            changes_df = pd.DataFrame(st.session_state.changes)
-            changes_df.to_excel(writer, sheet_name='Changes', index=False)
-            
-            # Save implementation costs
-            impl_costs_data = []
-            for key, data in st.session_state.implementation_costs.items():
-                if isinstance(data, dict) and 'resources' in data:
-                    for impl_type, impl_data in data['resources'].items():
-                        if isinstance(impl_data, dict):
-                            row = {
-                                'key': key,
-                                'implementation_type': impl_type,
-                                'values': json.dumps(impl_data.get('values', [])),
-                                'salary': impl_data.get('salary'),
-                                'description': impl_data.get('description', '')
-                            }
-                            impl_costs_data.append(row)
-            
-            if impl_costs_data:
-                impl_costs_df = pd.DataFrame(impl_costs_data)
-                impl_costs_df.to_excel(writer, sheet_name='Implementation', index=False)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"cost_analysis_{timestamp}.xlsx"
-        st.sidebar.download_button(
-            label="Download Excel",
-            data=buffer.getvalue(),
-            file_name=filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    if st.button("Save Analysis", disabled=running_job('save_analysis') is not None):
+        # The workbook is written in the background from a copy of the portfolio
+        st.session_state.pop('analysis_download', None)
+        submit_job(
+            'save_analysis', "Save Analysis", write_analysis,
+            copy.deepcopy(st.session_state.records),
+            copy.deepcopy(st.session_state.changes),
+            copy.deepcopy(st.session_state.implementation_costs)
         )
-        st.sidebar.success("Analysis ready for download!")
 
 with col2:
     uploaded_file = st.file_uploader("Load Analysis", type=['xlsx'])
-    if uploaded_file is not None:
-        try:
-            # Load records and changes as before
-            records_df = pd.read_excel(uploaded_file, sheet_name='Records')
-            changes_df = pd.read_excel(uploaded_file, sheet_name='Changes')
-            
-            # Load implementation costs
-            try:
-                impl_costs_df = pd.read_excel(uploaded_file, sheet_name='Implementation')
-                
-                # Reset implementation costs
-                st.session_state.implementation_costs = {}
-                
-                # Rebuild implementation costs structure
-                for _, row in impl_costs_df.iterrows():
-                    key = row['key']
-                    impl_type = row['implementation_type']
-                    
-                    try:
-                        values = json.loads(row['values']) if isinstance(row['values'], str) else []
-                        values = [float(v) if not pd.isna(v) else 0.0 for v in values]
-                    except:
-                        values = [0.0] * 5
-                    
-                    try:
-                        salary = float(row['salary']) if not pd.isna(row['salary']) else None
-                    except:
-                        salary = None
-                    
-                    description = row.get('description', '') if not pd.isna(row.get('description')) else ''
-                    
-                    if key not in st.session_state.implementation_costs:
-                        st.session_state.implementation_costs[key] = {'resources': {}}
-                    
-                    st.session_state.implementation_costs[key]['resources'][impl_type] = {
-                        'values': values,
-                        'salary': salary,
-                        'description': description
-                    }
-                    
-                    # Update the corresponding table in session state
-                    business = key.split('_')[0]
-                    category = "Resource" if impl_type in IMPLEMENTATION_TYPES["Resource"] else "Technology"
-                    table_key = f"{business}_{category}_table"
-                    
-                    if table_key not in st.session_state:
-                        st.session_state[table_key] = pd.DataFrame()
-                    
-                    # Update the table with the loaded values
-                    table_data = {
-                        'Description': description,
-                        'Implementation Type': impl_type,
-                        **{f'Year {i+1}': values[i] for i in range(5)}
-                    }
-                    if category == "Resource":
-                        table_data['Salary'] = salary
-                    
-                    st.session_state[table_key] = pd.concat([
-                        st.session_state[table_key],
-                        pd.DataFrame([table_data])
-                    ]).reset_index(drop=True)
-                    
-            except Exception as e:
-                st.sidebar.warning(f"No implementation data found or error loading it: {str(e)}")
-            
-            # Continue with existing loading logic for records and changes...
-            if not records_df.empty:
-                records_df['functions'] = records_df['functions'].apply(lambda x: json.loads(x) if isinstance(x, str) else [])
-                records_df['function_descriptions'] = records_df['function_descriptions'].apply(
-                    lambda x: json.loads(x) if isinstance(x, str) else {}
-                )
-            
-            st.session_state.records = records_df.to_dict('records')
-            st.session_state.changes = changes_df.to_dict('records')
-            
-            # Clean up NaN values
-            for record in st.session_state.records:
-                for key, value in record.items():
-                    if pd.isna(value):
-                        if key in ['functions']:
-                            record[key] = []
-                        elif key in ['function_descriptions']:
-                            record[key] = {}
-                        else:
-                            record[key] = None
-            
-            for change in st.session_state.changes:
-                for key, value in change.items():
-                    if pd.isna(value):
-                        change[key] = None
-            
-            st.sidebar.success("Analysis loaded successfully!")
-            st.rerun()
-        except Exception as e:
-            st.sidebar.error(f"Error loading file: {str(e)}")
-            st.sidebar.error("Please ensure the file format is correct.")
+    if uploaded_file is None:
+        st.session_state.pop('failed_file_id', None)
+    elif uploaded_file.file_id not in (
+        st.session_state.get('loaded_file_id'),
+        st.session_state.get('loading_file_id'),
+        st.session_state.get('failed_file_id'),
+    ):
+        # The workbook is parsed in the background and loaded on the rerun after it finishes
+        st.session_state.loading_file_id = uploaded_file.file_id
+        submit_job('load_analysis', "Load Analysis", read_analysis, uploaded_file.getvalue())
 
 with col3:
     if st.button("Load Sample Data", help="Click to populate with sample data for demonstration"):
         add_sample_data()
 
+with st.sidebar:
+    render_job_panel()
+
+render_memory_panel()
+
+if 'analysis_download' in st.session_state:
+    workbook_bytes, filename = st.session_state.analysis_download
+    st.sidebar.download_button(
+        label="Download Excel",
+        data=workbook_bytes,
+        file_name=filename,
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+# Combine the workbooks saved by each business unit into one portfolio
+with st.sidebar.expander("Consolidate Workbooks"):
+    workbook_files = st.file_uploader(
+        "Business Unit Workbooks",
+        type=['xlsx'],
+        accept_multiple_files=True,
+        key="consolidation_files"
+    )
+    if st.button("Consolidate", disabled=not workbook_files, key="consolidate_button"):
+        try:
+            records, changes, implementation_costs = consolidate_workbooks(
+                [f.getvalue() for f in workbook_files]
+            )
+            load_portfolio(records, changes, implementation_costs)
+            st.success(
+                f"Consolidated {len(workbook_files)} workbooks into {len(records):,} records "
+                f"and {len(changes):,} changes"
+            )
+        except Exception as e:
+            st.error(f"Error consolidating workbooks: {str(e)}")
+
+# Bulk import of HR / CMDB extracts
+with st.sidebar.expander("Bulk Import"):
+    import_file = st.file_uploader("Import Records", type=['csv', 'xlsx'], key="bulk_import_file")
+    if import_file is None:
+        st.session_state.pop('import_errors', None)
+    else:
+        try:
+            import_df = read_import_file(import_file.name, import_file.getvalue())
+        except Exception as e:
+            st.error(f"Error reading file: {str(e)}")
+            import_df = None
+
+        if import_df is not None:
+            st.caption(f"{len(import_df):,} rows found")
+
+            # Let the user confirm which source column feeds each record field
+            guessed_mapping = guess_column_mapping(import_df.columns)
+            column_options = ["(not mapped)"] + list(import_df.columns)
+            column_mapping = {}
+            for field in IMPORT_FIELDS:
+                guess = guessed_mapping[field]
+                choice = st.selectbox(
+                    field,
+                    column_options,
+                    index=column_options.index(guess) if guess is not None else 0,
+                    key=f"import_map_{field}"
+                )
+                column_mapping[field] = None if choice == "(not mapped)" else choice
+
+            skip_invalid = st.checkbox("Import valid rows and skip invalid ones", key="import_skip_invalid")
+
+            if st.button("Validate & Import", key="bulk_import_button"):
+                new_records, import_errors = build_import_records(
+                    import_df,
+                    column_mapping,
+                    st.session_state.assumptions,
+                    st.session_state.business_names,
+                    st.session_state.FUNCTIONS,
+                    next_record_id(st.session_state.records),
+                    st.session_state.fx_rates
+                )
+                st.session_state.import_errors = import_errors
+
+                if import_errors.empty or skip_invalid:
+                    # Append the whole batch in a single state mutation
+                    st.session_state.records = st.session_state.records + new_records
+                    publish_items('records', new_records)
+                    st.success(f"Imported {len(new_records):,} records")
+                else:
+                    st.error(f"{import_errors['Row'].nunique():,} rows have errors; nothing was imported")
+
+            if not st.session_state.get('import_errors', pd.DataFrame()).empty:
+                st.dataframe(st.session_state.import_errors, hide_index=True, use_container_width=True)
+
 # Add this check at the top of the main content section (after initializing session state):
 if st.session_state.get('trigger_rerun', False):
     st.session_state.trigger_rerun = False
     st.rerun()
 
-# Create business level tabs
-business_tabs = st.tabs([st.session_state.business_names[business] 
-                        for business in ['Business A', 'Business B']])
+# Navigation is driven by selection state so that only the visible pane is computed
+lap("Business metrics")
+internal_business = st.segmented_control(
+    "Business",
+    ['Business A', 'Business B'],
+    format_func=lambda business: st.session_state.business_names[business],
+    default='Business A',
+    required=True,
+    key="selected_business"
+)
+# Get the display name
+selected_business = st.session_state.business_names[internal_business]
 
-for i, business_tab in enumerate(business_tabs):
-    with business_tab:
-        # Get the internal business name (Business A or Business B)
-        internal_business = ['Business A', 'Business B'][i]
-        # Get the display name
-        selected_business = st.session_state.business_names[internal_business]
-        
-        # Add key metrics in columns
-        col1, col2, col3 = st.columns([1, 1, 2])
-        
-        # Calculate metrics for the selected business
-        resource_count = sum(r['count'] for r in st.session_state.records 
-                            if r['business'] == internal_business 
-                            and r['category'] == 'Resource')
+# Add key metrics in columns
+col1, col2, col3 = st.columns([1, 1, 2])
+
+# Calculate metrics for the selected business from the cost cube
+cube = session_cube()
+resource_count = round(cube.total('count', internal_business, 'Resource')[0])
+tech_count = cube.items(internal_business, 'Technology')
+total_cost = cube.total('baseline', internal_business)[0]
+
+# Display metrics
+with col1:
+    st.metric("Total Resources", resource_count)
+
+with col2:
+    st.metric("Total Technology Items", tech_count)
+
+with col3:
+    st.metric("Total Current Cost", f"{REPORTING_SYMBOL}{total_cost:,.0f}")
+
+st.divider()  # Add a line to separate metrics from the category and view selectors
+
+col1, col2 = st.columns([1, 2])
+with col1:
+    selected_category = st.segmented_control(
+        "Category",
+        CATEGORIES,
+        default=CATEGORIES[0],
+        required=True,
+        key="selected_category"
+    )
+with col2:
+    selected_view = st.segmented_control(
+        "View",
+        RECORD_VIEWS,
+        default=RECORD_VIEWS[0],
+        required=True,
+        key="selected_view"
+    )
+
+lap(f"View: {selected_view}")
+
+# Current Records
+if selected_view == "Current Records":
+    category_records = [
+        r for r in st.session_state.records
+        if r['business'] == internal_business and r['category'] == selected_category
+    ]
+    total_cost = cube.total('baseline', internal_business, selected_category)[0]
+    
+    if category_records:
+        render_records_page(category_records, internal_business, selected_category)
+    else:
+        st.info(f"No {selected_category.lower()} records yet.")
+    
+    st.metric("Total Current Cost", f"{REPORTING_SYMBOL}{total_cost:,.0f}")
+
+# Add Record
+elif selected_view == "Add Record":
+    with st.form(f"new_record_{selected_business}_{selected_category}"):
+        st.subheader("New Record Details")
         
-        tech_count = sum(1 for r in st.session_state.records 
-                        if r['business'] == internal_business 
-                        and r['category'] == 'Technology')
+        # Replace single function selector with multiple checkboxes
+        st.write("**Select Functions:**")
+        selected_functions = {}
+        function_descriptions = {}
         
-        total_cost = sum(r['total_cost'] for r in st.session_state.records 
-                        if r['business'] == internal_business)
+        # Create columns for better layout
+        cols = st.columns(len(st.session_state.FUNCTIONS))
+        for i, function in enumerate(st.session_state.FUNCTIONS):
+            with cols[i]:
+                selected_functions[function] = st.checkbox(
+                    function,
+                    key=f"func_{function}_{selected_business}_{selected_category}"
+                )
+                if selected_functions[function]:
+                    function_descriptions[function] = st.text_area(
+                        f"Description for {function}",
+                        key=f"func_desc_{function}_{selected_business}_{selected_category}",
+                        placeholder=f"Describe {function} responsibilities..."
+                    )
         
-        # Display metrics
-        with col1:
-            st.metric("Total Resources", resource_count)
+        # Validate at least one function is selected
+        functions_selected = any(selected_functions.values())
+        if not functions_selected:
+            st.warning("Please select at least one function.")
         
-        with col2:
-            st.metric("Total Technology Items", tech_count)
+        if selected_category == "Resource":
+            # Resource-specific fields
+            location = st.selectbox("Location", resource_locations(st.session_state.assumptions, internal_business))
+            count = st.number_input("Count", min_value=1, value=1)
+            unit_cost = current_rate(st.session_state.assumptions, internal_business, location)
+            total_cost = unit_cost * count
+            
+            st.write(f"Unit Cost: {REPORTING_SYMBOL}{unit_cost:,.0f}")
+            st.write(f"Total Cost: {REPORTING_SYMBOL}{total_cost:,.0f}")
+            
+        else:  # Technology
+            tech_name = st.text_input("Technology Name")
+            total_cost = st.number_input("Total Annual Cost", min_value=0.0, value=0.0)
+            unit_cost = None
+            count = None
+            location = None
         
-        with col3:
-            st.metric("Total Current Cost", f"${total_cost:,}")
+        # Only typed-in costs can be in another currency; Resource costs come from
+        # the rate table, which is in the reporting currency
+        if selected_category == "Technology":
+            currency = st.selectbox(
+                "Currency",
+                [REPORTING_CURRENCY] + list(st.session_state.fx_rates),
+                help="Currency the record's costs are expressed in"
+            )
+        else:
+            currency = REPORTING_CURRENCY
+        comments = st.text_area("Comments")
         
-        st.divider()  # Add a line to separate metrics from category tabs
+        if st.form_submit_button("Add Record"):
+            if functions_selected:
+                # Get list of selected functions
+                selected_function_list = [
+                    f for f, selected in selected_functions.items() 
+                    if selected
+                ]
+                
+                # Filter descriptions to only include selected functions
+                selected_descriptions = {
+                    f: function_descriptions.get(f, '')
+                    for f in selected_function_list
+                    if f in function_descriptions
+                }
+                
+                new_record = {
+                    'id': next_record_id(st.session_state.records),
+                    'business': internal_business,
+                    'category': selected_category,
+                    'functions': selected_function_list,
+                    'function_descriptions': selected_descriptions or {},  # Ensure it's never None
+                    'tech_name': tech_name if selected_category == "Technology" else None,
+                    'location': location,
+                    'count': count,
+                    'unit_cost': unit_cost,
+                    'total_cost': total_cost,
+                    'currency': currency,
+                    'comments': comments,
+                    'timestamp': datetime.now().isoformat()
+                }
+                st.session_state.records.append(new_record)
+                publish_items('records', [new_record])
+                st.success("Record added successfully!")
+                st.rerun()
+
+# Future State Changes
+elif selected_view == "Future State Changes":
+    if st.session_state.changes:
+        # Match changes to their records by id, as the projections do, and keep
+        # those of the current business and category
+        positions = record_positions(st.session_state.records)
+        relevant_changes = []
+        for change in st.session_state.changes:
+            position = positions.get(str(change['record_id']))
+            record = st.session_state.records[position] if position is not None else None
+            if record and record['business'] == internal_business and record['category'] == selected_category:
+                relevant_changes.append((position, record, change))
         
-        # Create category level tabs
-        category_tabs = st.tabs(CATEGORIES)
+        # List each record's changes in the order the projections apply them;
+        # changes of the same year keep the order they were added in
+        relevant_changes.sort(key=lambda item: (item[0], max(item[2]['implementation_year'] or 0, 1)))
+        conflicts = conflicts_by_change([change for _, _, change in relevant_changes])
+        if conflicts:
+            st.warning(
+                f"{len(conflicts)} planned changes overlap or contradict another change of the same record. "
+                "Where they overlap only the later change applies."
+            )
         
-        for j, category_tab in enumerate(category_tabs):
-            with category_tab:
-                selected_category = CATEGORIES[j]
+        for _, record, change in relevant_changes:
+            if record:  # Only proceed if we found a matching record
+                # Create message based on change type
+                if change['type'] == 'count_change' and record['category'] == 'Resource':
+                    message = (
+                        f"Resource count will change from {change['from']} to {change['to']} "
+                        f"in Year {change['implementation_year']}\n"
+                        f"- Impact: {'Reduction' if change['to'] < change['from'] else 'Increase'} "
+                        f"of {abs(change['from'] - change['to'])} resources\n"
+                        f"- Description: {change.get('description', 'No description provided')}"
+                    )
+                elif change['type'] == 'location_change':
+                    message = (
+                        f"Location will change from {change['from']} to {change['to']} "
+                        f"in Year {change['implementation_year']}\n"
+                        f"- Description: {change.get('description', 'No description provided')}"
+                    )
+                elif change['type'] == 'cost_change':
+                    message = (
+                        f"Cost will change from ${change['from']:,} to ${change['to']:,} "
+                        f"in Year {change['implementation_year']}\n"
+                        f"- Description: {change.get('description', 'No description provided')}"
+                    )
                 
-                # Create the main function tabs with reordered tabs
-                tab1, tab2, tab3, tab4 = st.tabs([
-                    "Current Records",  # Moved to first position
-                    "Add Record", 
-                    "Future State Changes",
-                    "Cost Analysis"
-                ])
+                # Display the change
+                if record['category'] == "Resource":
+                    st.subheader(f"{', '.join(record['functions'])} Team ({record['location']})")
+                else:
+                    st.subheader(f"{record['tech_name']} ({', '.join(record['functions'])})")
                 
-                # Move the Current Records content to tab1
-                with tab1:
-                    total_cost = 0
-                    for record in st.session_state.records:
-                        if record['business'] == internal_business and record['category'] == selected_category:
-                            total_cost += record['total_cost']
-                            
-                            # Different display for resources vs technology
-                            if selected_category == "Resource":
-                                title = f"### {', '.join(record['functions'])} Team - ${record['total_cost']:,}"
-                            else:
-                                title = f"### {record['tech_name']} - ${record['total_cost']:,}"
-                                
-                            with st.expander(title, expanded=False):
-                                col1, col2 = st.columns([2, 1])
-                                
-                                with col1:
-                                    # Simplified layout for better readability
-                                    if selected_category == "Resource":
-                                        # Resource layout
-                                        st.markdown(f"""
-                                            #### Key Information
-                                            - **Location:** {record['location']}
-                                            - **Team Size:** {record['count']} resources
-                                            - **Cost per Resource:** ${record['unit_cost']:,}
-                                            
-                                            #### Comments
-                                            _{record['comments'] if record['comments'] else 'No comments provided'}_
-                                        """)
-                                    else:
-                                        # Technology layout
-                                        st.markdown(f"""
-                                            #### Key Information
-                                            - **Annual Cost:** ${record['total_cost']:,}
-                                            
-                                            #### Comments
-                                            _{record['comments'] if record['comments'] else 'No comments provided'}_
-                                        """)
-                                
-                                with col2:
-                                    if selected_category == "Resource":
-                                        change_type = st.selectbox(
-                                            "Plan Change",
-                                            ["No Change", "Modify Count", "Change Location"],
-                                            key=f"change_type_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                        )
-                                        
-                                        implementation_year = st.selectbox(
-                                            "Implementation Year",
-                                            range(1, 6),
-                                            key=f"year_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                        )
-                                        
-                                        st.button("Delete Record", 
-                                                key=f"del_record_{record['id']}_{hash(tuple(sorted(record['functions'])))}",
-                                                type="secondary",
-                                                on_click=delete_record,
-                                                args=(record,))
-                                        
-                                        if change_type == "Modify Count":
-                                            new_count = st.number_input(
-                                                "New Count",
-                                                min_value=0,
-                                                value=record['count'],
-                                                key=f"new_count_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                            )
-                                            change_description = st.text_area(
-                                                "Change Description",
-                                                placeholder="e.g., Automation reduces headcount",
-                                                key=f"desc_count_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                            )
-                                            if st.button("Apply Change", key=f"apply_count_{record['id']}_{hash(tuple(sorted(record['functions'])))}"):
-                                                # Calculate new total cost based on unit cost
-                                                new_total_cost = (new_count * record['unit_cost']) if record['unit_cost'] is not None else 0
-                                                
-                                                change = {
-                                                    'record_id': record['id'],
-                                                    'type': 'count_change',
-                                                    'from': record['count'],
-                                                    'to': new_count,
-                                                    'implementation_year': implementation_year,
-                                                    'description': change_description,
-                                                    'timestamp': datetime.now().isoformat(),
-                                                    'new_total_cost': new_total_cost,
-                                                    'category': record['category'],  # Explicitly set category
-                                                    'functions': record['functions'].copy(),  # Make a copy of functions
-                                                    'original_location': record['location'],
-                                                    'original_unit_cost': record['unit_cost'],
-                                                    'business': record['business'],  # Add business for more specific matching
-                                                    'record_timestamp': record['timestamp']  # Add record timestamp for unique identification
-                                                }
-                                                
-                                                st.session_state.changes.append(change)
-                                                st.success("Change recorded!")
-                                        
-                                        elif change_type == "Change Location":
-                                            new_location = st.selectbox(
-                                                "New Location",
-                                                RESOURCE_LOCATIONS if record['category'] == "Resource" else TECH_LOCATIONS,
-                                                key=f"new_location_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                            )
-                                            # Add description field before the button
-                                            change_description = st.text_area(
-                                                "Change Description",
-                                                placeholder="e.g., Moving to cloud reduces headcount",
-                                                key=f"desc_location_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                            )
-                                            
-                                            if st.button("Apply Change", key=f"apply_location_{record['id']}_{hash(tuple(sorted(record['functions'])))}"):
-                                                # Get new unit cost from assumptions
-                                                new_unit_cost = st.session_state.assumptions[internal_business][new_location]
-                                                # Calculate new total cost based on the ratio of unit costs
-                                                new_total_cost = (new_unit_cost / record['unit_cost']) * record['total_cost'] if record['unit_cost'] > 0 else record['total_cost']
-                                                
-                                                change = {
-                                                    'record_id': record['id'],
-                                                    'type': 'location_change',
-                                                    'from': record['location'],
-                                                    'to': new_location,
-                                                    'implementation_year': implementation_year,
-                                                    'description': change_description,
-                                                    'timestamp': datetime.now().isoformat(),
-                                                    'new_total_cost': new_total_cost
-                                                }
-                                                st.session_state.changes.append(change)
-                                                st.success("Change recorded!")
-                                    
-                                    else:  # Technology
-                                        change_type = st.selectbox(
-                                            "Plan Change",
-                                            ["No Change", "Modify Cost"],
-                                            key=f"change_type_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                        )
-                                        
-                                        implementation_year = st.selectbox(
-                                            "Implementation Year",
-                                            range(1, 6),
-                                            key=f"year_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                        )
-                                        
-                                        st.button("Delete Record", 
-                                                key=f"del_record_{record['id']}_{hash(tuple(sorted(record['functions'])))}",
-                                                type="secondary",
-                                                on_click=delete_record,
-                                                args=(record,))
-                                        
-                                        if change_type == "Modify Cost":
-                                            new_cost = st.number_input(
-                                                "New Annual Cost",
-                                                min_value=0.0,
-                                                value=float(record['total_cost']),
-                                                key=f"new_cost_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                            )
-                                            # Add description field
-                                            change_description = st.text_area(
-                                                "Change Description",
-                                                placeholder="e.g., Cloud migration reduces cost",
-                                                key=f"desc_cost_{record['id']}_{hash(tuple(sorted(record['functions'])))}"
-                                            )
-                                            if st.button("Apply Change", key=f"apply_cost_{record['id']}_{hash(tuple(sorted(record['functions'])))}"):
-                                                change = {
-                                                    'record_id': record['id'],
-                                                    'type': 'cost_change',
-                                                    'from': record['total_cost'],
-                                                    'to': new_cost,  # Just use the new cost directly
-                                                    'implementation_year': implementation_year,
-                                                    'description': change_description,
-                                                    'timestamp': datetime.now().isoformat(),
-                                                    'new_total_cost': new_cost  # Add this to be consistent with other changes
-                                                }
-                                                st.session_state.changes.append(change)
-                                                st.success("Change recorded!")
-                                
-                    st.metric("Total Current Cost", f"${total_cost:,}")
-
-                # Move the Add Record content to tab2
-                with tab2:
-                    with st.form(f"new_record_{selected_business}_{selected_category}"):
-                        st.subheader("New Record Details")
-                        
-                        # Replace single function selector with multiple checkboxes
-                        st.write("**Select Functions:**")
-                        selected_functions = {}
-                        function_descriptions = {}
-                        
-                        # Create columns for better layout
-                        cols = st.columns(len(st.session_state.FUNCTIONS))
-                        for i, function in enumerate(st.session_state.FUNCTIONS):
-                            with cols[i]:
-                                selected_functions[function] = st.checkbox(
-                                    function,
-                                    key=f"func_{function}_{selected_business}_{selected_category}"
-                                )
-                                if selected_functions[function]:
-                                    function_descriptions[function] = st.text_area(
-                                        f"Description for {function}",
-                                        key=f"func_desc_{function}_{selected_business}_{selected_category}",
-                                        placeholder=f"Describe {function} responsibilities..."
-                                    )
-                        
-                        # Validate at least one function is selected
-                        functions_selected = any(selected_functions.values())
-                        if not functions_selected:
-                            st.warning("Please select at least one function.")
-                        
-                        if selected_category == "Resource":
-                            # Resource-specific fields
-                            location = st.selectbox("Location", RESOURCE_LOCATIONS)
-                            count = st.number_input("Count", min_value=1, value=1)
-                            unit_cost = st.session_state.assumptions[internal_business][location]
-                            total_cost = unit_cost * count
-                            
-                            st.write(f"Unit Cost: ${unit_cost:,}")
-                            st.write(f"Total Cost: ${total_cost:,}")
-                            
-                        else:  # Technology
-                            tech_name = st.text_input("Technology Name")
-                            total_cost = st.number_input("Total Annual Cost", min_value=0.0, value=0.0)
-                            unit_cost = None
-                            count = None
-                            location = None
-                        
-                        comments = st.text_area("Comments")
-                        
-                        if st.form_submit_button("Add Record"):
-                            if functions_selected:
-                                # Get list of selected functions
-                                selected_function_list = [
-                                    f for f, selected in selected_functions.items() 
-                                    if selected
-                                ]
-                                
-                                # Filter descriptions to only include selected functions
-                                selected_descriptions = {
-                                    f: function_descriptions.get(f, '')
-                                    for f in selected_function_list
-                                    if f in function_descriptions
-                                }
-                                
-                                new_record = {
-                                    'id': len(st.session_state.records),
-                                    'business': internal_business,
-                                    'category': selected_category,
-                                    'functions': selected_function_list,
-                                    'function_descriptions': selected_descriptions or {},  # Ensure it's never None
-                                    'tech_name': tech_name if selected_category == "Technology" else None,
-                                    'location': location,
-                                    'count': count,
-                                    'unit_cost': unit_cost,
-                                    'total_cost': total_cost,
-                                    'comments': comments,
-                                    'timestamp': datetime.now().isoformat()
-                                }
-                                st.session_state.records.append(new_record)
-                                st.success("Record added successfully!")
-                                st.rerun()
-
-                # Tab 3: Future State Changes
-                with tab3:
-                    if st.session_state.changes:
-                        # First filter changes for current business and category
-                        relevant_changes = [
-                            change for change in st.session_state.changes
-                            if (
-                                # Match the record
-                                (record := next(
-                                    (r for r in st.session_state.records 
-                                     if r['id'] == change['record_id'] 
-                                     and r['category'] == change.get('category', r['category'])),
-                                    None
-                                ))
-                                # Check if it matches current business and category
-                                and record['business'] == internal_business  # Use internal_business instead of selected_business
-                                and record['category'] == selected_category
-                            )
-                        ]
-                        
-                        for change in relevant_changes:
-                            # Get the record using the same matching logic as above
-                            record = next(
-                                (r for r in st.session_state.records 
-                                 if r['id'] == change['record_id'] 
-                                 and r['category'] == change.get('category', r['category'])),
-                                None
-                            )
-                            
-                            if record:  # Only proceed if we found a matching record
-                                # Create message based on change type
-                                if change['type'] == 'count_change' and record['category'] == 'Resource':
-                                    message = (
-                                        f"Resource count will change from {change['from']} to {change['to']} "
-                                        f"in Year {change['implementation_year']}\n"
-                                        f"- Impact: {'Reduction' if change['to'] < change['from'] else 'Increase'} "
-                                        f"of {abs(change['from'] - change['to'])} resources\n"
-                                        f"- Description: {change.get('description', 'No description provided')}"
-                                    )
-                                elif change['type'] == 'location_change':
-                                    message = (
-                                        f"Location will change from {change['from']} to {change['to']} "
-                                        f"in Year {change['implementation_year']}\n"
-                                        f"- Description: {change.get('description', 'No description provided')}"
-                                    )
-                                elif change['type'] == 'cost_change':
-                                    message = (
-                                        f"Cost will change from ${change['from']:,} to ${change['to']:,} "
-                                        f"in Year {change['implementation_year']}\n"
-                                        f"- Description: {change.get('description', 'No description provided')}"
-                                    )
-                                
-                                # Display the change
-                                if record['category'] == "Resource":
-                                    st.subheader(f"{', '.join(record['functions'])} Team ({record['location']})")
-                                else:
-                                    st.subheader(f"{record['tech_name']} ({', '.join(record['functions'])})")
-                                
-                                st.markdown(message)
-                                
-                                # Add delete button for each change
-                                if st.button("Delete Change", 
-                                           key=f"del_change_{record['id']}_{change['timestamp']}"):
-                                    st.session_state.changes.remove(change)
-                                    st.rerun()
-                                
-                                st.divider()
-                    else:
-                        st.info("No changes recorded yet.")
-
-                # Tab 4: Cost Analysis Table
-                with tab4:
-                    if st.session_state.records:
-                        # Calculate current and future costs
-                        analysis_data = []
-                        total_current = 0
-                        total_future = 0
-                        
-                        for record in st.session_state.records:
-                            # Use internal_business instead of selected_business for comparison
-                            if record['business'] == internal_business and record['category'] == selected_category:
-                                current_cost = record['total_cost']
-                                total_current += current_cost
-                                
-                                # Calculate future cost based on changes and implementation year
-                                future_costs_by_year = [current_cost] * 6  # Year 0-5
-                                
-                                for change in st.session_state.changes:
-                                    if change['record_id'] == record['id']:
-                                        year = change['implementation_year']
-                                        if change['type'] == 'count_change':
-                                            if record['category'] == 'Resource':
-                                                new_cost = (change['to'] * record['unit_cost']) if record['unit_cost'] is not None else 0
-                                            else:
-                                                new_cost = record['total_cost']  # For technology records, keep original cost
-                                        elif change['type'] == 'location_change':
-                                            new_unit_cost = st.session_state.assumptions[internal_business][change['to']]
-                                            new_cost = (record['count'] * new_unit_cost) if record['count'] is not None else record['total_cost']
-                                        elif change['type'] == 'cost_change':
-                                            new_cost = change['to']
-                                        
-                                        # Apply the new cost from implementation year onwards
-                                        for y in range(year, 6):
-                                            future_costs_by_year[y] = new_cost
-                                
-                                # Different name construction for Resource vs Technology
-                                if record['category'] == 'Technology':
-                                    name = f"{record['tech_name']} ({', '.join(record['functions'])})"
-                                else:
-                                    name = f"{', '.join(record['functions'])} Team"
-                                
-                                analysis_data.append({
-                                    'Business': st.session_state.business_names[record['business']],  # Use display name for display
-                                    'Category': record['category'],
-                                    'Name': name,
-                                    'Current Cost': current_cost,
-                                    'Year 1': future_costs_by_year[1],
-                                    'Year 2': future_costs_by_year[2],
-                                    'Year 3': future_costs_by_year[3],
-                                    'Year 4': future_costs_by_year[4],
-                                    'Year 5': future_costs_by_year[5],
-                                    'Total 5Y Savings': sum(current_cost - cost for cost in future_costs_by_year[1:]),
-                                    'Row Total': sum(future_costs_by_year[1:])
-                                })
-
-                        # Only create and format DataFrame if we have data
-                        if analysis_data:
-                            # Create DataFrame and sort by Business and Category
-                            df = pd.DataFrame(analysis_data)
-                            df = df.sort_values(['Business', 'Category', 'Name'])
-                            
-                            # Format currency columns
-                            currency_cols = ['Current Cost', 'Year 1', 'Year 2', 'Year 3', 'Year 4', 'Year 5', 
-                                           'Total 5Y Savings', 'Row Total']
-                            for col in currency_cols:
-                                df[col] = df[col].apply(lambda x: f"${x:,.2f}")
-                            
-                            # Create a style function for background colors with better contrast
-                            def style_df(df):
-                                styles = pd.DataFrame('', index=df.index, columns=df.columns)
-                                
-                                # Simpler styling with better contrast
-                                for col in currency_cols[1:-1]:  # Skip Current Cost and Row Total
-                                    try:
-                                        current_vals = df['Current Cost'].apply(lambda x: float(x.replace('$', '').replace(',', '')))
-                                        col_vals = df[col].apply(lambda x: float(x.replace('$', '').replace(',', '')))
-                                        
-                                        # Use more subtle colors with dark text
-                                        styles.loc[col_vals < current_vals, col] = 'color: #006100'  # Dark green
-                                        styles.loc[col_vals > current_vals, col] = 'color: #9c0006'  # Dark red
-                                    except:
-                                        continue
-                                
-                                # Style savings column
-                                styles.loc[:, 'Total 5Y Savings'] = df['Total 5Y Savings'].apply(
-                                    lambda x: 'color: #006100' if '-' not in x else 'color: #9c0006'
-                                )
-                                
-                                return styles
-                            
-                            # Apply styling
-                            styled_df = df.style\
-                                .apply(style_df, axis=None)\
-                                .set_properties(**{
-                                    'text-align': 'right',
-                                    'padding': '5px 15px',
-                                    'font-size': '14px'
-                                })\
-                                .set_table_styles([
-                                    {'selector': 'th', 'props': [
-                                        ('text-align', 'center'),
-                                        ('font-weight', 'bold'),
-                                        ('color', '#333333'),
-                                        ('background-color', '#f0f2f6')
-                                    ]},
-                                    {'selector': 'td', 'props': [
-                                        ('text-align', 'right'),
-                                        ('color', '#333333')
-                                    ]}
-                                ])
-                            
-                            # Display the table
-                            st.dataframe(styled_df, use_container_width=True)
-                            
-                            # Add column totals at the bottom
-                            st.divider()
-                            st.subheader("Column Totals")
-                            totals = {}
-                            for col in currency_cols:
-                                try:
-                                    total = sum(float(x.replace('$', '').replace(',', '')) 
-                                              for x in df[col])
-                                    totals[col] = f"${total:,.2f}"
-                                except:
-                                    continue
-                            
-                            # Display totals in a single row with same styling as main table
-                            totals_df = pd.DataFrame([totals])
-                            
-                            # Create style function for totals with same conditional formatting
-                            def style_totals(df):
-                                styles = pd.DataFrame('', index=df.index, columns=df.columns)
-                                
-                                # Apply same color coding for changes
-                                for col in currency_cols[1:-1]:  # Skip Current Cost and Row Total
-                                    try:
-                                        current_val = float(df['Current Cost'].iloc[0].replace('$', '').replace(',', ''))
-                                        col_val = float(df[col].iloc[0].replace('$', '').replace(',', ''))
-                                        
-                                        if col_val < current_val:
-                                            styles.iloc[0][col] = 'color: #006100'  # Dark green
-                                        elif col_val > current_val:
-                                            styles.iloc[0][col] = 'color: #9c0006'  # Dark red
-                                    except:
-                                        continue
-                                
-                                # Style savings column
-                                try:
-                                    savings_val = df['Total 5Y Savings'].iloc[0]
-                                    styles.iloc[0]['Total 5Y Savings'] = 'color: #006100' if '-' not in savings_val else 'color: #9c0006'
-                                except:
-                                    pass
-                                
-                                return styles
-                            
-                            # Apply styling to totals
-                            styled_totals_df = totals_df.style\
-                                .apply(style_totals, axis=None)\
-                                .set_properties(**{
-                                    'text-align': 'right',
-                                    'padding': '5px 15px',
-                                    'font-size': '14px',
-                                    'font-weight': 'bold',
-                                    'color': '#333333'
-                                })\
-                                .set_table_styles([
-                                    {'selector': 'th', 'props': [
-                                        ('text-align', 'center'),
-                                        ('font-weight', 'bold'),
-                                        ('color', '#333333'),
-                                        ('background-color', '#f0f2f6')
-                                    ]},
-                                    {'selector': 'td', 'props': [
-                                        ('text-align', 'right'),
-                                        ('color', '#333333')
-                                    ]}
-                                ])
-                            
-                            st.dataframe(styled_totals_df, use_container_width=True)
-                        else:
-                            st.info(f"No records found for {st.session_state.business_names[internal_business]} - {selected_category}")
-                    else:
-                        st.info("No records available. Please add some records first.") 
\ No newline at end of file
+                st.markdown(message)
+                for conflict in conflicts.get(change_key(change), []):
+                    st.warning(describe_conflict(conflict, change), icon="⚠️")
+                
+                # Add delete button for each change
+                if st.button("Delete Change", 
+                           key=f"del_change_{record['id']}_{change['timestamp']}"):
+                    st.session_state.changes.remove(change)
+                    publish_removed_items('changes', [change])
+                    st.rerun()
+                
+                st.divider()
+    else:
+        st.info("No changes recorded yet.")
+
+# Cost Analysis Table
+elif selected_view == "Cost Analysis":
+    if st.session_state.records:
+        # Project every record of the selected business and category in one pass
+        analysis_records = [
+            r for r in st.session_state.records
+            if r['business'] == internal_business and r['category'] == selected_category
+        ]
+        # The cube keeps every record's projection in the reporting currency
+        lap("Cost Analysis: projection")
+        projection = cube.record_values(analysis_records, 'projected')
+        baseline = cube.record_values(analysis_records, 'baseline')
+        missing_fx = unknown_currencies(item_currencies(analysis_records), st.session_state.fx_rates)
+        if missing_fx:
+            st.warning(f"No FX rate for {', '.join(missing_fx)}; those costs are shown unconverted.")
+        lap("Cost Analysis: table rows")
+        analysis_data = []
+        
+        for record, future_costs_by_year, baseline_by_year in zip(
+            analysis_records, projection.tolist(), baseline.tolist()
+        ):
+            current_cost = baseline_by_year[0]
+            
+            # Different name construction for Resource vs Technology
+            if record['category'] == 'Technology':
+                name = f"{record['tech_name']} ({', '.join(record['functions'])})"
+            else:
+                name = f"{', '.join(record['functions'])} Team"
+            
+            analysis_data.append({
+                'Business': st.session_state.business_names[record['business']],  # Use display name for display
+                'Category': record['category'],
+                'Name': name,
+                'Current Cost': current_cost,
+                'Year 1': future_costs_by_year[1],
+                'Year 2': future_costs_by_year[2],
+                'Year 3': future_costs_by_year[3],
+                'Year 4': future_costs_by_year[4],
+                'Year 5': future_costs_by_year[5],
+                'Total 5Y Savings': sum(baseline_by_year[1:]) - sum(future_costs_by_year[1:]),
+                'Row Total': sum(future_costs_by_year[1:])
+            })
+
+        # Only create and format DataFrame if we have data
+        if analysis_data:
+            # Create DataFrame and sort by Business and Category
+            df = pd.DataFrame(analysis_data)
+            df = df.sort_values(['Business', 'Category', 'Name'])
+            
+            currency_cols = ['Current Cost', 'Year 1', 'Year 2', 'Year 3', 'Year 4', 'Year 5', 
+                           'Total 5Y Savings', 'Row Total']
+            
+            # Keep the values numeric; the dollar formatting is applied by the column config
+            lap("Cost Analysis: styling")
+            if len(df) <= MAX_STYLED_ROWS:
+                styled_df = df.style\
+                    .apply(cost_change_styles, axis=None, zero_is_saving=True)\
+                    .set_properties(**{
+                        'text-align': 'right',
+                        'padding': '5px 15px',
+                        'font-size': '14px'
+                    })\
+                    .set_table_styles([
+                        {'selector': 'th', 'props': [
+                            ('text-align', 'center'),
+                            ('font-weight', 'bold'),
+                            ('color', '#333333'),
+                            ('background-color', '#f0f2f6')
+                        ]},
+                        {'selector': 'td', 'props': [
+                            ('text-align', 'right'),
+                            ('color', '#333333')
+                        ]}
+                    ])
+            else:
+                styled_df = df
+                st.caption(f"Savings and increases are colour coded for up to {MAX_STYLED_ROWS:,} records.")
+            
+            # Display the table
+            st.dataframe(
+                styled_df,
+                use_container_width=True,
+                column_config=currency_column_config(currency_cols)
+            )
+            
+            # Add column totals at the bottom
+            st.divider()
+            st.subheader("Column Totals")
+            totals_df = df[currency_cols].sum().to_frame().T
+            
+            # Apply the same color coding to the totals
+            styled_totals_df = totals_df.style\
+                .apply(cost_change_styles, axis=None, zero_is_saving=True)\
+                .set_properties(**{
+                    'text-align': 'right',
+                    'padding': '5px 15px',
+                    'font-size': '14px',
+                    'font-weight': 'bold',
+                    'color': '#333333'
+                })\
+                .set_table_styles([
+                    {'selector': 'th', 'props': [
+                        ('text-align', 'center'),
+                        ('font-weight', 'bold'),
+                        ('color', '#333333'),
+                        ('background-color', '#f0f2f6')
+                    ]},
+                    {'selector': 'td', 'props': [
+                        ('text-align', 'right'),
+                        ('color', '#333333')
+                    ]}
+                ])
+            
+            st.dataframe(
+                styled_totals_df,
+                use_container_width=True,
+                column_config=currency_column_config(currency_cols)
+            )
+        else:
+            st.info(f"No records found for {st.session_state.business_names[internal_business]} - {selected_category}")
+    else:
+        st.info("No records available. Please add some records first.") 
+
+render_timing_panel()
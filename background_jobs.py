@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+# How often the sidebar panel polls running jobs, in seconds
+POLL_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when the user cancelled it"""
+
+
+class Job:
+    """
+    A long-running task executed off the script thread.
+
+    The task receives report(fraction, message) as its progress callback; a
+    cancelled job stops at its next report. Jobs never touch session state,
+    their result is picked up by the script on a later rerun.
+    """
+
+    def __init__(self, name, label):
+        self.name = name
+        self.label = label
+        self.progress = 0.0
+        self.message = "Queued"
+        self.future = None
+        self._cancel = threading.Event()
+
+    def report(self, fraction, message=None):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message:
+            self.message = message
+
+    def cancel(self):
+        self._cancel.set()
+        self.message = "Cancelling"
+        # Jobs that have not started yet never run
+        self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    def outcome(self):
+        """Return (result, error) of a finished job; error is a JobCancelled when it was cancelled"""
+        if self.future.cancelled():
+            return None, JobCancelled()
+        error = self.future.exception()
+        if error is not None:
+            return None, error
+        return self.future.result(), None
+
+
+@st.cache_resource
+def job_executor():
+    """Worker pool shared by every session of this server process"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="background-job")
+
+
+def submit_job(name, label, fn, *args):
+    """
+    Run fn(*args, progress=...) in the background and track it under name.
+
+    A job still running under the same name is cancelled first. Arguments must
+    not be session state objects that the script keeps mutating; pass copies.
+    """
+    jobs = st.session_state.setdefault('background_jobs', {})
+    if name in jobs and not jobs[name].done:
+        jobs[name].cancel()
+
+    job = Job(name, label)
+    job.future = job_executor().submit(fn, *args, progress=job.report)
+    jobs[name] = job
+    return job
+
+
+def running_job(name):
+    """The job running under name, or None"""
+    job = st.session_state.get('background_jobs', {}).get(name)
+    return job if job is not None and not job.done else None
+
+
+def collect_finished_jobs():
+    """Remove finished jobs from the session and return them for their results to be applied"""
+    jobs = st.session_state.get('background_jobs', {})
+    finished = [job for job in jobs.values() if job.done]
+    for job in finished:
+        del jobs[job.name]
+    return finished
+
+
+def _job_panel():
+    jobs = st.session_state.get('background_jobs', {})
+    if any(job.done for job in jobs.values()):
+        # Rerun the whole script so the results are applied
+        st.rerun()
+
+    for name, job in list(jobs.items()):
+        st.progress(job.progress, text=f"{job.label}: {job.message}")
+        if not job.cancelled:
+            st.button("Cancel", key=f"cancel_job_{name}", on_click=job.cancel)
+
+
+def render_job_panel():
+    """
+    Show progress and a Cancel button for the session's running jobs.
+
+    The panel polls as a fragment while jobs are running, so only it reruns
+    until a job finishes; nothing polls once the session is idle.
+    """
+    if st.session_state.get('background_jobs'):
+        st.fragment(_job_panel, run_every=POLL_INTERVAL)()
@@ -0,0 +1,133 @@
+"""
+Headless batch projection over saved "Save Analysis" workbooks.
+
+Recomputes baseline, projected cost, savings, implementation cost and net
+savings for every business in each workbook, without starting Streamlit.
+Workbooks are processed in parallel, one per worker process, and the summary
+is written as JSON (default) or CSV with one row per workbook, business and year.
+
+    python batch_run.py exports/ other/cost_analysis_20241122_181313.xlsx
+    python batch_run.py exports/ --assumptions assumptions.json --fx-rates fx.json --format csv -o summary.csv
+
+Directories are searched for cost_analysis_*.xlsx. Workbooks do not carry the
+cost assumptions or FX rates, so the app defaults are used unless JSON files
+are given; with --assumptions, Resource records are re-priced from them first.
+Exits with 1 when any workbook could not be processed.
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from cost_model import DEFAULT_ASSUMPTIONS, PROJECTION_YEARS, REPORTING_CURRENCY, portfolio_summary
+from workbook_io import read_analysis
+
+WORKBOOK_PATTERN = 'cost_analysis_*.xlsx'
+
+CSV_COLUMNS = [
+    'workbook', 'business', 'year', 'baseline_cost', 'projected_cost', 'savings',
+    'implementation_cost', 'net_savings'
+]
+
+
+def workbook_paths(sources):
+    """Expand files and directories into a sorted, de-duplicated list of workbook paths"""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(glob.glob(os.path.join(source, WORKBOOK_PATTERN)))
+        else:
+            paths.append(source)
+    return sorted(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+def summarize_workbook(path, assumptions, fx_rates, reprice=False, years=PROJECTION_YEARS):
+    """
+    Project one workbook and summarise it per business.
+
+    Returns a JSON-serialisable dict; failures are reported in its 'error'
+    field so one bad file does not stop the batch.
+    """
+    try:
+        records, changes, implementation_costs = read_analysis(path)
+        summary = portfolio_summary(
+            records, changes, implementation_costs, assumptions, fx_rates, reprice=reprice, years=years
+        )
+    except Exception as e:
+        return {'workbook': path, 'error': f"{type(e).__name__}: {e}"}
+    return {'workbook': path, **summary}
+
+
+def run_batch(paths, assumptions, fx_rates, reprice=False, max_workers=None):
+    """Summarise workbooks in parallel, preserving input order"""
+    if len(paths) <= 1:
+        return [summarize_workbook(path, assumptions, fx_rates, reprice) for path in paths]
+
+    # Spawned workers match consolidation.load_workbooks and are safe from any thread
+    with ProcessPoolExecutor(
+        max_workers=max_workers or min(len(paths), multiprocessing.cpu_count()),
+        mp_context=multiprocessing.get_context('spawn')
+    ) as executor:
+        count = len(paths)
+        return list(executor.map(
+            summarize_workbook, paths, [assumptions] * count, [fx_rates] * count, [reprice] * count
+        ))
+
+
+def write_csv(results, output):
+    writer = csv.DictWriter(output, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for result in results:
+        for business in result.get('businesses', []):
+            for year in business['years']:
+                writer.writerow({'workbook': result['workbook'], 'business': business['business'], **year})
+
+
+def _load_json(path, default):
+    if not path:
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute savings for saved cost analysis workbooks")
+    parser.add_argument('sources', nargs='+', help="workbook files or directories containing " + WORKBOOK_PATTERN)
+    parser.add_argument('--assumptions', help="JSON file of cost assumptions; records are re-priced from it")
+    parser.add_argument('--fx-rates', help=f"JSON file mapping currencies to {REPORTING_CURRENCY} rates")
+    parser.add_argument('--format', choices=['json', 'csv'], default='json')
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    parser.add_argument('-j', '--workers', type=int, help="worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    paths = workbook_paths(args.sources)
+    if not paths:
+        parser.error("no workbooks found")
+
+    assumptions = _load_json(args.assumptions, DEFAULT_ASSUMPTIONS)
+    fx_rates = _load_json(args.fx_rates, {})
+    results = run_batch(paths, assumptions, fx_rates, reprice=bool(args.assumptions), max_workers=args.workers)
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'csv':
+            write_csv(results, output)
+        else:
+            json.dump({'currency': REPORTING_CURRENCY, 'workbooks': results}, output, indent=2)
+            output.write('\n')
+    finally:
+        if args.output:
+            output.close()
+
+    errors = [r for r in results if 'error' in r]
+    for result in errors:
+        print(f"{result['workbook']}: {result['error']}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
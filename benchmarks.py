@@ -0,0 +1,224 @@
+"""
+Benchmarks for the calculation hot paths on synthetic portfolios.
+
+Times projections, summary metrics, Excel save/load, function remap,
+implementation totals, the cost cube (full build and one incremental update),
+per-change payback and change conflict detection at each portfolio size, keeping the best of --repeat runs.
+Results are written to benchmark_results/<label>.json (the label defaults to
+the current git commit) and can be compared against an earlier run:
+
+    python benchmarks.py
+    python benchmarks.py --sizes 1000 10000 --compare benchmark_results/4f5961e.json
+    python benchmarks.py --only projections summary_metrics --label before-cube
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from change_index import ChangeIndex, conflicts_by_change
+from cost_cube import CostCube
+from cost_model import (
+    baseline_costs, change_payback, convert_costs, implementation_totals, item_currencies, portfolio_summary,
+    project_costs
+)
+from function_remap import build_function_remap, remap_functions
+from synthetic_data import generate_portfolio
+from workbook_io import read_analysis, write_analysis
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, 'benchmark_results')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Timings that move by more than this fraction and this many seconds against the
+# comparison run are flagged; the absolute floor keeps sub-millisecond noise out
+REPORT_THRESHOLD = 0.2
+REPORT_MIN_DELTA = 0.005
+
+
+def bench_projections(portfolio):
+    records = portfolio['records']
+    currencies = item_currencies(records)
+    convert_costs(project_costs(records, portfolio['changes'], portfolio['assumptions']), currencies, {})
+    convert_costs(baseline_costs(records, portfolio['assumptions']), currencies, {})
+
+
+def bench_summary_metrics(portfolio):
+    portfolio_summary(
+        portfolio['records'], portfolio['changes'], portfolio['implementation_costs'],
+        portfolio['assumptions'], {}
+    )
+
+
+def bench_excel_save(portfolio):
+    return write_analysis(portfolio['records'], portfolio['changes'], portfolio['implementation_costs'])
+
+
+def bench_excel_load(portfolio):
+    read_analysis(portfolio['workbook'])
+
+
+def bench_function_remap(portfolio):
+    # Rename one function and merge two others, as the Functions tab would
+    functions = portfolio['FUNCTIONS']
+    edited = [f"{functions[0]} (renamed)", functions[2]] + functions[2:]
+    remap = build_function_remap(functions, edited)
+    remap_functions(portfolio['remap_records'], remap)
+
+
+def bench_implementation_totals(portfolio):
+    implementation_totals(
+        portfolio['implementation_costs'], portfolio['assumptions'], {}, list(portfolio['business_names'])
+    )
+
+
+def bench_payback(portfolio):
+    change_payback(
+        portfolio['records'], portfolio['changes'], portfolio['implementation_costs'], portfolio['assumptions'], {}
+    )
+
+
+def bench_change_conflicts(portfolio):
+    # Every conflict in the portfolio, then the check run when one more change is planned
+    conflicts_by_change(portfolio['changes'])
+    change = dict(portfolio['changes'][0], timestamp='new')
+    ChangeIndex(c for c in portfolio['changes'] if c['record_id'] == change['record_id']).check(change)
+
+
+def bench_cube_build(portfolio):
+    CostCube().refresh(portfolio['records'], portfolio['changes'], portfolio['assumptions'], {})
+
+
+def setup_cube_update(portfolio):
+    if 'cube' not in portfolio:
+        portfolio['cube'] = CostCube()
+        bench_cube_update(portfolio)
+
+
+def bench_cube_update(portfolio):
+    # One planned change is written, then the cube catches up and is sliced
+    cube = portfolio['cube']
+    change = portfolio['changes'][0]
+    cube.mark('changes', [f"{change['record_id']}|{change['timestamp']}"])
+    cube.refresh(portfolio['records'], portfolio['changes'], portfolio['assumptions'], {})
+    cube.by_function('projected', portfolio['FUNCTIONS'])
+
+
+# name -> (benchmark, untimed setup run before each timing or None)
+BENCHMARKS = {
+    'projections': (bench_projections, None),
+    'summary_metrics': (bench_summary_metrics, None),
+    'excel_save': (bench_excel_save, None),
+    'excel_load': (bench_excel_load, lambda p: 'workbook' in p or p.update(workbook=bench_excel_save(p))),
+    'function_remap': (bench_function_remap, lambda p: p.update(remap_records=copy.deepcopy(p['records']))),
+    'implementation_totals': (bench_implementation_totals, None),
+    'cube_build': (bench_cube_build, None),
+    'cube_update': (bench_cube_update, setup_cube_update),
+    'payback': (bench_payback, None),
+    'change_conflicts': (bench_change_conflicts, None),
+}
+
+
+def time_benchmark(fn, setup, portfolio, repeat):
+    """Best wall time of repeat runs; setup is not timed"""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup(portfolio)
+        start = time.perf_counter()
+        fn(portfolio)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmarks(sizes, names, repeat, seed):
+    results = {}
+    for size in sizes:
+        portfolio = generate_portfolio(records=size, seed=seed)
+        results[str(size)] = {}
+        for name in names:
+            fn, setup = BENCHMARKS[name]
+            seconds = time_benchmark(fn, setup, portfolio, repeat)
+            results[str(size)][name] = seconds
+            print(f"{size:>8,} records  {name:<24} {seconds * 1000:>10.1f} ms", flush=True)
+    return results
+
+
+def compare(results, baseline):
+    """Print the ratio of each timing to the comparison run; returns the number of regressions"""
+    regressions = 0
+    print(f"\nCompared with {baseline['label']} ({baseline['created']}):")
+    for size, timings in results.items():
+        for name, seconds in timings.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if not before:
+                continue
+            ratio = seconds / before
+            flag = ''
+            if abs(seconds - before) < REPORT_MIN_DELTA:
+                pass
+            elif ratio > 1 + REPORT_THRESHOLD:
+                flag = 'slower'
+                regressions += 1
+            elif ratio < 1 - REPORT_THRESHOLD:
+                flag = 'faster'
+            print(f"{int(size):>8,} records  {name:<24} {before * 1000:>10.1f} -> {seconds * 1000:>10.1f} ms"
+                  f"  x{ratio:.2f} {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the calculation hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="portfolio sizes in records")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per benchmark; the best is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', help="name of the stored result (default: the git commit)")
+    parser.add_argument('--compare', help="earlier result file to compare against")
+    parser.add_argument('--no-save', action='store_true', help="do not store the results")
+    args = parser.parse_args(argv)
+
+    names = args.only or list(BENCHMARKS)
+    results = run_benchmarks(args.sizes, names, args.repeat, args.seed)
+    run = {
+        'label': args.label or git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'results': results,
+    }
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{run['label']}.json")
+        with open(path, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Per-record interval index over planned changes, used to spot conflicting changes.
+
+project_costs and project_counts let each change set a record's cost from its
+implementation year until the record's next change, whatever that change is;
+changes planned for the same year apply in the order they were added, so only
+the last one counts. The index keeps every record's changes in that order, so
+each change covers the interval from its year to the next change's year, and
+conflicts are always between neighbours:
+
+- same_year: two changes start in the same year and the earlier one never applies
+- overrides: a change of another type follows, and is costed without this change
+
+A change's 'to' is the absolute value it sets, so a following change of the
+same type is not a conflict; its 'from' is only descriptive, and new changes
+take it from the change in effect at their year (see before).
+
+Looking up a record's neighbours is a bisect, so checking a new change stays
+cheap however many changes the portfolio holds.
+"""
+import bisect
+
+from cost_model import PROJECTION_YEARS, change_key
+
+CHANGE_NAMES = {
+    'count_change': 'count change',
+    'location_change': 'location change',
+    'cost_change': 'cost change',
+}
+
+
+def change_name(change):
+    """Short name of a change for messages, e.g. 'Year 2 count change'"""
+    return f"Year {change['implementation_year']} {CHANGE_NAMES.get(change['type'], change['type'])}"
+
+
+class ChangeIndex:
+    """
+    The changes of every record, ordered the way the projections apply them.
+
+    Changes starting after the projection horizon never apply and are left out.
+    """
+
+    def __init__(self, changes=(), years=PROJECTION_YEARS):
+        self.years = years
+        # record id -> sorted (start year, sequence) and the changes in the same order
+        self._ranks = {}
+        self._changes = {}
+        self._sequence = 0
+        for change in changes:
+            self.add(change)
+
+    def _start(self, change):
+        # The projections treat a missing or Year 0 change as starting in Year 1
+        start = max(change['implementation_year'] or 0, 1)
+        return start if start <= self.years else None
+
+    def add(self, change):
+        start = self._start(change)
+        if start is None:
+            return
+        record_id = str(change['record_id'])
+        ranks = self._ranks.setdefault(record_id, [])
+        rank = (start, self._sequence)
+        position = bisect.bisect(ranks, rank)
+        ranks.insert(position, rank)
+        self._changes.setdefault(record_id, []).insert(position, change)
+        self._sequence += 1
+
+    def intervals(self, record_id):
+        """[(start year, end year, change)] of a record; a change applies from start up to end"""
+        ranks = self._ranks.get(str(record_id), [])
+        ends = [start for start, _ in ranks[1:]] + [self.years + 1]
+        return [
+            (start, end, change)
+            for (start, _), end, change in zip(ranks, ends, self._changes[str(record_id)])
+        ] if ranks else []
+
+    def _conflict(self, earlier, later):
+        if self._start(earlier) == self._start(later):
+            kind = 'same_year'
+        elif earlier['type'] != later['type']:
+            kind = 'overrides'
+        else:
+            return None
+        return {'kind': kind, 'earlier': earlier, 'later': later}
+
+    def _position(self, change):
+        # A new change goes after every change already planned for its year
+        record_id = str(change['record_id'])
+        changes = self._changes.get(record_id, [])
+        return bisect.bisect(self._ranks.get(record_id, []), (self._start(change), self._sequence)), changes
+
+    def before(self, change):
+        """The record's change in effect when the change starts, if it were added now"""
+        if self._start(change) is None:
+            return None
+        position, changes = self._position(change)
+        return changes[position - 1] if position > 0 else None
+
+    def check(self, change):
+        """Conflicts the change would have with the record's changes if it were added now"""
+        if self._start(change) is None:
+            return []
+        position, changes = self._position(change)
+
+        conflicts = []
+        if position > 0:
+            conflicts.append(self._conflict(changes[position - 1], change))
+        if position < len(changes):
+            conflicts.append(self._conflict(change, changes[position]))
+        return [c for c in conflicts if c is not None]
+
+    def conflicts(self):
+        """Every conflict between neighbouring changes, record by record"""
+        found = []
+        for changes in self._changes.values():
+            for earlier, later in zip(changes, changes[1:]):
+                conflict = self._conflict(earlier, later)
+                if conflict is not None:
+                    found.append(conflict)
+        return found
+
+
+def conflicts_by_change(changes, years=PROJECTION_YEARS):
+    """{change key: [conflict]} for every change involved in a conflict"""
+    by_change = {}
+    for conflict in ChangeIndex(changes, years).conflicts():
+        by_change.setdefault(change_key(conflict['earlier']), []).append(conflict)
+        by_change.setdefault(change_key(conflict['later']), []).append(conflict)
+    return by_change
+
+
+def describe_conflict(conflict, change):
+    """One-line explanation of a conflict, seen from one of its two changes"""
+    earlier, later = conflict['earlier'], conflict['later']
+    if change is earlier:
+        if conflict['kind'] == 'same_year':
+            return f"Never applies: the {change_name(later)} added after it replaces it."
+        return (
+            f"Stops applying from Year {later['implementation_year']}: "
+            f"the {change_name(later)} is costed without it."
+        )
+    if conflict['kind'] == 'same_year':
+        return f"Replaces the {change_name(earlier)} added before it."
+    return f"Costed without the {change_name(earlier)} before it, which stops applying here."
@@ -0,0 +1,149 @@
+import streamlit as st
+
+from timing import timed
+
+# plotly is imported inside the builders so pages that never draw a chart
+# do not pay for loading plotly.express
+
+# Series longer than this are drawn with WebGL traces instead of SVG
+WEBGL_POINT_THRESHOLD = 1000
+
+# Update color sequence to include a new color for "Multiple Functions"
+FUNCTION_COLORS = ['#3498db', '#2ecc71', '#9b59b6', '#e67e22']  # Added orange for Multiple Functions
+CATEGORY_COLORS = {
+    'Resource': '#3498db',  # Softer blue
+    'Technology': '#2ecc71'  # Softer green
+}
+
+
+def scatter_trace(x, y, **kwargs):
+    """Build a scatter trace, switching to WebGL for long series"""
+    import plotly.graph_objects as go
+
+    trace_type = go.Scattergl if len(x) > WEBGL_POINT_THRESHOLD else go.Scatter
+    return trace_type(x=list(x), y=list(y), **kwargs)
+
+
+# Figures are cached on their aggregated inputs, so reruns that do not change
+# the aggregates reuse the built figure instead of going through plotly again
+@timed
+@st.cache_data(max_entries=64, show_spinner=False)
+def function_count_pie(names, values):
+    """Pie chart of unit counts by function"""
+    import plotly.express as px
+
+    fig = px.pie(
+        values=list(values),
+        names=list(names),
+        color_discrete_sequence=FUNCTION_COLORS,
+    )
+    # Update to show actual values instead of percentages
+    fig.update_traces(
+        textinfo='value',
+        textfont_size=14,
+    )
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
+        plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot
+        showlegend=True
+    )
+    return fig
+
+
+@timed
+@st.cache_data(max_entries=64, show_spinner=False)
+def cost_distribution_bar(functions, categories, costs):
+    """Stacked bar chart of cost by function and category"""
+    import plotly.express as px
+
+    fig = px.bar(
+        x=list(functions),
+        y=list(costs),
+        color=list(categories),
+        barmode='stack',
+        labels={'x': 'Function', 'y': 'Cost', 'color': 'Category'},
+        color_discrete_map=CATEGORY_COLORS
+    )
+
+    # Update layout for dark theme compatibility
+    fig.update_layout(
+        yaxis_title="Total Cost ($)",
+        showlegend=True,
+        paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
+        plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot
+        yaxis=dict(
+            tickformat="$,.0f",
+            gridcolor='rgba(128,128,128,0.2)',  # Subtle grid
+            zerolinecolor='rgba(128,128,128,0.2)'  # Subtle zero line
+        ),
+        xaxis=dict(
+            gridcolor='rgba(128,128,128,0.2)',  # Subtle grid
+            zerolinecolor='rgba(128,128,128,0.2)'  # Subtle zero line
+        ),
+        hovermode='x unified'
+    )
+    return fig
+
+
+@timed
+@st.cache_data(max_entries=64, show_spinner=False)
+def savings_timeline(periods, annual_savings, cumulative_savings):
+    """Line chart of annual and cumulative savings per period"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+
+    # Add traces with better colors and styling
+    fig.add_trace(scatter_trace(
+        periods,
+        annual_savings,
+        name='Annual Savings',
+        mode='lines+markers',
+        line=dict(color='#3498db', width=2),
+        marker=dict(size=8)
+    ))
+
+    fig.add_trace(scatter_trace(
+        periods,
+        cumulative_savings,
+        name='Cumulative Savings',
+        mode='lines+markers',
+        line=dict(color='#2ecc71', width=2),
+        marker=dict(size=8)
+    ))
+
+    fig.update_layout(
+        title="Projected Savings Over Time",
+        yaxis_title="Savings ($)",
+        hovermode='x unified',
+        yaxis=dict(tickformat="$,.0f"),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        yaxis_gridcolor='rgba(128,128,128,0.2)',
+        xaxis_gridcolor='rgba(128,128,128,0.2)'
+    )
+    return fig
+
+
+@timed
+@st.cache_data(max_entries=64, show_spinner=False)
+def payback_curves(names, periods, cumulative):
+    """Cumulative net cash flow per initiative, crossing zero at its break-even"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for name, values in zip(names, cumulative):
+        fig.add_trace(scatter_trace(periods, values, name=name, mode='lines+markers', marker=dict(size=6)))
+
+    fig.add_hline(y=0, line=dict(color='rgba(128,128,128,0.6)', dash='dash'))
+    fig.update_layout(
+        title="Cumulative Net Cash Flow",
+        yaxis_title="Net Savings ($)",
+        hovermode='x unified',
+        yaxis=dict(tickformat="$,.0f"),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        yaxis_gridcolor='rgba(128,128,128,0.2)',
+        xaxis_gridcolor='rgba(128,128,128,0.2)'
+    )
+    return fig
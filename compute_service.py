@@ -0,0 +1,210 @@
+"""
+Local HTTP/JSON service exposing the projection engine to other tools.
+
+    python compute_service.py --port 8765
+
+Endpoints (all JSON):
+
+    GET  /health      -> {"status": "ok", "cache": {...}}
+    POST /projection  portfolio payload -> per-business savings summary
+    POST /batch       {"requests": [portfolio payload, ...]} -> {"results": [...]}
+
+A portfolio payload has "records" and optional "changes",
+"implementation_costs", "assumptions" (defaults to the app defaults; Resource
+records are re-priced when given), "fx_rates", "years" and "record_costs"
+(true to include each record's baseline and projected cost per year). Results
+are cached by a hash of the payload content, so repeated questions about the
+same change set are answered without recomputing. Requests are served
+concurrently, one thread each.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cost_model import (
+    DEFAULT_ASSUMPTIONS, PROJECTION_YEARS, REPORTING_CURRENCY, baseline_costs, convert_costs, item_currencies,
+    portfolio_summary, project_costs
+)
+
+# Largest request body accepted, in bytes
+MAX_BODY = 64 * 1024 * 1024
+
+# Most years a projection may be asked for
+MAX_YEARS = 30
+
+
+class BadRequest(Exception):
+    """A payload that cannot be projected; reported to the client as a 400"""
+
+
+class ResultCache:
+    """Thread-safe LRU of computed results keyed by payload content hash"""
+
+    def __init__(self, size=256):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._size = size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        # Computed outside the lock so slow portfolios do not block other requests
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self._size:
+                self._items.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._items), 'hits': self.hits, 'misses': self.misses}
+
+
+def content_hash(payload):
+    """Hash of a payload that does not depend on key order"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def project_payload(payload):
+    """Compute the response for one portfolio payload"""
+    if not isinstance(payload, dict) or not isinstance(payload.get('records'), list):
+        raise BadRequest("payload must be an object with a 'records' list")
+
+    records = [dict(r) for r in payload['records']]
+    changes = payload.get('changes') or []
+    implementation_costs = payload.get('implementation_costs') or {}
+    assumptions = payload.get('assumptions') or DEFAULT_ASSUMPTIONS
+    fx_rates = payload.get('fx_rates') or {}
+    years = payload.get('years', PROJECTION_YEARS)
+    if not isinstance(years, int) or not 1 <= years <= MAX_YEARS:
+        raise BadRequest(f"years must be a whole number from 1 to {MAX_YEARS}")
+
+    try:
+        result = portfolio_summary(
+            records, changes, implementation_costs, assumptions, fx_rates,
+            reprice='assumptions' in payload, years=years
+        )
+        if payload.get('record_costs'):
+            currencies = item_currencies(records)
+            baseline = convert_costs(baseline_costs(records, assumptions, years), currencies, fx_rates)
+            projection = convert_costs(project_costs(records, changes, assumptions, years), currencies, fx_rates)
+            result['record_costs'] = [
+                {'id': r['id'], 'baseline_cost': b, 'projected_cost': p}
+                for r, b, p in zip(records, baseline.tolist(), projection.tolist())
+            ]
+    except (KeyError, TypeError, ValueError) as e:
+        raise BadRequest(f"invalid portfolio: {type(e).__name__}: {e}")
+
+    return {'currency': REPORTING_CURRENCY, 'years': years, **result}
+
+
+class ProjectionService:
+    """Projection engine with a warm result cache, independent of the HTTP layer"""
+
+    def __init__(self, cache_size=256):
+        self.cache = ResultCache(cache_size)
+
+    def projection(self, payload):
+        return self.cache.get(content_hash(payload), lambda: project_payload(payload))
+
+    def batch(self, payload):
+        if not isinstance(payload, dict) or not isinstance(payload.get('requests'), list):
+            raise BadRequest("batch payload must be an object with a 'requests' list")
+        results = []
+        for item in payload['requests']:
+            try:
+                results.append(self.projection(item))
+            except BadRequest as e:
+                # One bad portfolio does not fail the rest of the batch
+                results.append({'error': str(e)})
+        return {'results': results}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service = None
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            raise BadRequest(f"request body is larger than {MAX_BODY} bytes")
+        try:
+            return json.loads(self.rfile.read(length) or b'null')
+        except ValueError as e:
+            raise BadRequest(f"invalid JSON: {e}")
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok', 'cache': self.service.cache.stats()})
+        else:
+            self._send(404, {'error': f"unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {'/projection': self.service.projection, '/batch': self.service.batch}
+        handler = routes.get(self.path)
+        if handler is None:
+            self._send(404, {'error': f"unknown path {self.path}"})
+            return
+        try:
+            self._send(200, handler(self._read_json()))
+        except BadRequest as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def log_request(self, code='-', size='-'):
+        # No access log; errors still reach stderr through log_error
+        pass
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The stdlib default backlog of 5 drops connections under bursts of clients
+    request_queue_size = 256
+
+
+def make_server(host='127.0.0.1', port=8765, cache_size=256):
+    """Create (but do not start) a threaded server bound to host:port"""
+    handler = type('Handler', (ServiceHandler,), {'service': ProjectionService(cache_size)})
+    return ServiceServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the cost projection engine over HTTP/JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-size', type=int, default=256, help="portfolio results kept warm")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.cache_size)
+    print(f"Serving projections on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
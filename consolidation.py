@@ -0,0 +1,83 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from cost_model import change_key
+from workbook_io import read_analysis
+
+
+def load_workbooks(sources, max_workers=None):
+    """Parse several "Save Analysis" workbooks in parallel, preserving input order"""
+    if len(sources) <= 1:
+        return [read_analysis(source) for source in sources]
+
+    # Spawned workers avoid forking the threaded Streamlit server
+    with ProcessPoolExecutor(
+        max_workers=max_workers or min(len(sources), multiprocessing.cpu_count()),
+        mp_context=multiprocessing.get_context('spawn')
+    ) as executor:
+        return list(executor.map(read_analysis, sources))
+
+
+def _relink(data, change_map):
+    # Lines keep funding their change under its new key; links to changes
+    # that did not survive the merge are cleared
+    if not isinstance(data, dict):
+        return data
+    return {**data, 'resources': {
+        impl_type: {**impl_data, 'change': change_map.get(impl_data.get('change'))}
+        if isinstance(impl_data, dict) else impl_data
+        for impl_type, impl_data in data.get('resources', {}).items()
+    }}
+
+
+def merge_portfolios(portfolios):
+    """
+    Merge (records, changes, implementation_costs) portfolios into one.
+
+    Every workbook numbers its records from zero, so record ids are reassigned
+    from a single sequence and the changes and implementation cost keys that
+    point at them are rewritten to match, as are the change keys implementation
+    lines fund. Implementation table rows keyed as business_type_row are
+    renumbered per business so they stay unique.
+    """
+    merged_records = []
+    merged_changes = []
+    merged_costs = {}
+    table_rows = {}
+
+    for records, changes, implementation_costs in portfolios:
+        id_map = {}
+        for record in records:
+            new_id = len(merged_records)
+            # Where ids repeat, the first record keeps the changes and costs
+            # pointing at the id, as in the projections (record_positions)
+            id_map.setdefault(str(record['id']), new_id)
+            # Changes may still reference the base id of a renamed record
+            id_map.setdefault(str(record['id']).split('_')[0], new_id)
+            merged_records.append({**record, 'id': new_id})
+
+        change_map = {}
+        for change in changes:
+            new_id = id_map.get(str(change['record_id']))
+            if new_id is not None:
+                merged_change = {**change, 'record_id': new_id}
+                change_map[change_key(change)] = change_key(merged_change)
+                merged_changes.append(merged_change)
+
+        for key, data in implementation_costs.items():
+            business, _, rest = key.partition('_')
+            middle, _, suffix = rest.partition('_')
+            if middle in id_map:
+                new_key = f"{business}_{id_map[middle]}_{suffix}"
+            else:
+                row = table_rows.get(business, 0)
+                table_rows[business] = row + 1
+                new_key = f"{business}_{middle}_{row}"
+            merged_costs[new_key] = _relink(data, change_map)
+
+    return merged_records, merged_changes, merged_costs
+
+
+def consolidate_workbooks(sources, max_workers=None):
+    """Load workbooks in parallel and return the merged portfolio"""
+    return merge_portfolios(load_workbooks(sources, max_workers))
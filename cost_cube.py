@@ -0,0 +1,298 @@
+"""
+Pre-aggregated business x category x function x year cost cube.
+
+The cube holds the current (baseline) and projected cost and headcount of the
+portfolio, summed per business, category and function combination for every
+projected year, in the reporting currency. Metrics and charts read slices of
+it instead of scanning the records, so their cost depends on the number of
+cells rather than the number of records.
+
+Each record's contribution is kept as well, so an edit only re-projects the
+records it touched: the portfolio store reports every write, and on the next
+read those records are subtracted from their cells and added back with their
+new values. Changed assumptions or FX rates rebuild the whole cube.
+"""
+import copy
+from collections import Counter
+
+import numpy as np
+import streamlit as st
+
+from cost_model import (
+    PROJECTION_YEARS, baseline_costs, convert_costs, item_currencies, project_costs, project_counts
+)
+
+# Measures held per record and per cell, each for years 0..PROJECTION_YEARS
+MEASURES = ('baseline', 'projected', 'count')
+
+# Pie charts show records with several functions as one slice
+MULTIPLE_FUNCTIONS = "Multiple Functions"
+
+
+def record_key(record):
+    """Key of a record in the cube, the same as its key in the portfolio store"""
+    return str(record['id'])
+
+
+def _grow(array, axis, size):
+    """Pad array with zeros along axis until it holds size entries"""
+    missing = size - array.shape[axis]
+    if missing <= 0:
+        return array
+    pad = [(0, 0)] * array.ndim
+    pad[axis] = (0, missing)
+    return np.pad(array, pad)
+
+
+class CostCube:
+    """
+    Cost and headcount per (business, category, function combination, measure, year).
+
+    Records with several functions sit in the cell of their whole function
+    combination, so totals never count them twice; slicing by one function
+    sums every combination that contains it.
+    """
+
+    def __init__(self, years=PROJECTION_YEARS):
+        self.years = years
+        self._stale = True
+        self._dirty = set()
+        self._assumptions = None
+        self._fx_rates = None
+        self._synced_length = 0
+        self._clear()
+
+    def _clear(self):
+        self._businesses = {}
+        self._categories = {}
+        self._combos = {}
+        self._function_combos = {}
+        self._cells = np.zeros((0, 0, 0, len(MEASURES), self.years + 1))
+        self._items = np.zeros((0, 0, 0), dtype=int)
+        # Per-record contributions live in reusable slots, listed per record key so
+        # records that share an id (older workbooks) each keep their own
+        self._slots = {}
+        self._free = []
+        self._values = np.zeros((0, len(MEASURES), self.years + 1))
+        self._slot_cells = np.zeros((0, 3), dtype=int)
+        self._slot_currency = []
+        self.currencies = Counter()
+
+    @property
+    def nbytes(self):
+        return self._cells.nbytes + self._items.nbytes + self._values.nbytes + self._slot_cells.nbytes
+
+    def mark(self, kind, keys):
+        """Note written records or changes (by portfolio store key) for the next refresh"""
+        if kind == 'records':
+            self._dirty.update(str(key) for key in keys)
+        elif kind == 'changes':
+            self._dirty.update(str(key).split('|')[0] for key in keys)
+
+    def invalidate(self):
+        """Rebuild from scratch on the next refresh, e.g. after the portfolio was replaced"""
+        self._stale = True
+
+    def refresh(self, records, changes, assumptions, fx_rates):
+        """Bring the cube up to date; only records marked since the last refresh are re-projected"""
+        if self._stale or assumptions != self._assumptions or fx_rates != self._fx_rates:
+            self._rebuild(records, changes, assumptions, fx_rates)
+            return
+        if not self._dirty:
+            # Edits that bypassed the store change the record count; start over then
+            if len(records) != self._synced_length:
+                self._rebuild(records, changes, assumptions, fx_rates)
+            return
+
+        dirty = self._dirty
+        # Timestamped ids ('3_...') match changes by their base id, as in project_costs
+        touched = [r for r in records if record_key(r) in dirty or record_key(r).split('_')[0] in dirty]
+        keys = {record_key(r) for r in touched}
+        ids = keys | {key.split('_')[0] for key in keys}
+        self._remove(dirty | keys)
+        self._add(touched, [c for c in changes if str(c['record_id']) in ids])
+        self._dirty = set()
+        self._synced_length = len(records)
+
+    def _rebuild(self, records, changes, assumptions, fx_rates):
+        self._assumptions = copy.deepcopy(assumptions)
+        self._fx_rates = copy.deepcopy(fx_rates)
+        self._clear()
+        self._add(records, changes)
+        self._stale = False
+        self._dirty = set()
+        self._synced_length = len(records)
+
+    def _position(self, index, value, axis):
+        position = index.get(value)
+        if position is None:
+            position = index[value] = len(index)
+            self._cells = _grow(self._cells, axis, position + 1)
+            self._items = _grow(self._items, axis, position + 1)
+        return position
+
+    def _cell(self, record):
+        combo = tuple(sorted(record['functions']))
+        if combo not in self._combos:
+            for function in combo:
+                self._function_combos.setdefault(function, []).append(len(self._combos))
+        return (
+            self._position(self._businesses, record['business'], 0),
+            self._position(self._categories, record['category'], 1),
+            self._position(self._combos, combo, 2),
+        )
+
+    def _contributions(self, records, changes):
+        """(len(records), measures, years + 1) values of each record in the reporting currency"""
+        currencies = item_currencies(records)
+        baseline = convert_costs(baseline_costs(records, self._assumptions, self.years), currencies, self._fx_rates)
+        projected = convert_costs(
+            project_costs(records, changes, self._assumptions, self.years), currencies, self._fx_rates
+        )
+        return np.stack([baseline, projected, project_counts(records, changes, self.years)], axis=1)
+
+    def _allocate(self, n):
+        reused = self._free[-n:] if n else []
+        del self._free[len(self._free) - len(reused):]
+        start = len(self._values)
+        fresh = list(range(start, start + n - len(reused)))
+        if fresh:
+            size = max(fresh[-1] + 1, 2 * start)
+            self._free.extend(range(fresh[-1] + 1, size))
+            self._values = _grow(self._values, 0, size)
+            self._slot_cells = _grow(self._slot_cells, 0, size)
+            self._slot_currency.extend([None] * (size - start))
+        return reused + fresh
+
+    def _add(self, records, changes):
+        if not records:
+            return
+        values = self._contributions(records, changes)
+        cells = np.array([self._cell(r) for r in records], dtype=int)
+        slots = np.array(self._allocate(len(records)), dtype=int)
+
+        for record, slot, currency in zip(records, slots.tolist(), item_currencies(records)):
+            self._slots.setdefault(record_key(record), []).append(slot)
+            self._slot_currency[slot] = currency
+            self.currencies[currency] += 1
+        self._values[slots] = values
+        self._slot_cells[slots] = cells
+
+        index = tuple(cells.T)
+        np.add.at(self._cells, index, values)
+        np.add.at(self._items, index, 1)
+
+    def _remove(self, keys):
+        slots = [slot for key in keys for slot in self._slots.pop(key, [])]
+        if not slots:
+            return
+        slots = np.array(slots, dtype=int)
+        cells = self._slot_cells[slots]
+
+        index = tuple(cells.T)
+        np.subtract.at(self._cells, index, self._values[slots])
+        np.subtract.at(self._items, index, 1)
+        # Emptied cells are reset so rounding left over from the subtraction does not show
+        empty = cells[self._items[index] == 0]
+        self._cells[tuple(empty.T)] = 0
+
+        for slot in slots.tolist():
+            self.currencies[self._slot_currency[slot]] -= 1
+            self._slot_currency[slot] = None
+        self.currencies += Counter()  # drops currencies no record uses any more
+        self._values[slots] = 0
+        self._free.extend(slots.tolist())
+
+    def _select(self, business, category, function):
+        """Cell positions matching each dimension; None matches everything"""
+        def positions(index, value):
+            if value is None:
+                return list(index.values())
+            return [index[value]] if value in index else []
+
+        combos = (
+            list(self._combos.values()) if function is None else self._function_combos.get(function, [])
+        )
+        return positions(self._businesses, business), positions(self._categories, category), combos
+
+    def total(self, measure, business=None, category=None, function=None):
+        """
+        Per-year total of a measure over the matching cells, as a (years + 1,) array.
+
+        Filtering on a function includes every record that has it, so
+        function totals add up to more than the overall total for records
+        with several functions.
+        """
+        b, c, f = self._select(business, category, function)
+        cells = self._cells[np.ix_(b, c, f)][..., MEASURES.index(measure), :]
+        return cells.reshape(-1, self.years + 1).sum(axis=0)
+
+    def items(self, business=None, category=None, function=None):
+        """Number of records in the matching cells"""
+        b, c, f = self._select(business, category, function)
+        return int(self._items[np.ix_(b, c, f)].sum())
+
+    def by_function(self, measure, functions, year=0, business=None, category=None):
+        """{function: measure in year} for the given functions"""
+        return {
+            function: float(self.total(measure, business, category, function)[year])
+            for function in functions
+        }
+
+    def by_function_group(self, measure, year=0, business=None, category=None):
+        """
+        {function: measure in year} with records of several functions under MULTIPLE_FUNCTIONS.
+
+        Only function combinations that hold records in the slice are listed.
+        """
+        b, c, _ = self._select(business, category, None)
+        combos = list(self._combos)
+        values = self._cells[np.ix_(b, c, list(range(len(combos))))][..., MEASURES.index(measure), year]
+        values = values.reshape(-1, len(combos)).sum(axis=0)
+        items = self._items[np.ix_(b, c, list(range(len(combos))))].reshape(-1, len(combos)).sum(axis=0)
+
+        groups = {}
+        for combo, value, count in zip(combos, values.tolist(), items.tolist()):
+            if count:
+                name = combo[0] if len(combo) == 1 else MULTIPLE_FUNCTIONS
+                groups[name] = groups.get(name, 0.0) + value
+        return groups
+
+    def record_values(self, records, measure):
+        """(len(records), years + 1) values of a measure for each record, in record order"""
+        # Records sharing an id take that id's slots in the order they were added
+        seen = {}
+        slots = []
+        for record in records:
+            key = record_key(record)
+            slots.append(self._slots[key][seen.get(key, 0)])
+            seen[key] = seen.get(key, 0) + 1
+        return self._values[slots, MEASURES.index(measure)]
+
+
+def session_cube():
+    """This session's cost cube, brought up to date with its portfolio and assumptions"""
+    if 'cost_cube' not in st.session_state:
+        st.session_state.cost_cube = CostCube()
+    cube = st.session_state.cost_cube
+    cube.refresh(
+        st.session_state.records,
+        st.session_state.changes,
+        st.session_state.assumptions,
+        st.session_state.get('fx_rates', {})
+    )
+    return cube
+
+
+def note_portfolio_edits(kind, keys):
+    """Mark records and changes written to the session's portfolio for re-projection"""
+    cube = st.session_state.get('cost_cube')
+    if cube is not None:
+        cube.mark(kind, keys)
+
+
+def invalidate_cost_cube():
+    """Rebuild the session's cube on its next read"""
+    cube = st.session_state.get('cost_cube')
+    if cube is not None:
+        cube.invalidate()
@@ -0,0 +1,755 @@
+import numpy as np
+import pandas as pd
+
+# Number of projected years after the current year (year 0)
+PROJECTION_YEARS = 5
+
+# Currency every cost is reported in; other currencies convert through the FX table
+REPORTING_CURRENCY = 'USD'
+REPORTING_SYMBOL = '$'
+
+# Escalation curve location that applies to every location without its own curve
+ALL_LOCATIONS = 'All'
+
+# Implementation line types per category; Resource lines are headcounts, Technology lines amounts
+IMPLEMENTATION_TYPES = {
+    "Resource": ["Rebadge", "House Resources", "New Hire"],
+    "Technology": ["Internal Build Costs"]
+}
+
+# Record fields the cost projections read
+PRICED_FIELDS = ('business', 'category', 'location', 'count', 'unit_cost', 'total_cost', 'currency')
+
+# Cost assumptions a new session starts with
+DEFAULT_ASSUMPTIONS = {
+    'Business A': {
+        'Onshore': 100000.0,
+        'Offshore': 40000.0,
+        'Implementation': {
+            'Rebadge': 15000.0,
+            'House Resources': 20000.0,
+            'New Hire': 25000.0
+        }
+    },
+    'Business B': {
+        'Onshore': 90000.0,
+        'Offshore': 35000.0,
+        'Implementation': {
+            'Rebadge': 12000.0,
+            'House Resources': 18000.0,
+            'New Hire': 22000.0
+        }
+    }
+}
+
+
+def resource_locations(assumptions, business=None):
+    """Locations that have a resource rate, for one business or across all of them"""
+    businesses = [business] if business is not None else list(assumptions)
+    locations = {}
+    for b in businesses:
+        for loc, value in assumptions.get(b, {}).items():
+            # Nested dicts (e.g. 'Implementation') are not location rates
+            if not isinstance(value, dict):
+                locations.setdefault(loc)
+    return list(locations)
+
+
+def rate_path(value, years=PROJECTION_YEARS):
+    """
+    Expand a rate assumption into years + 1 annual rates.
+
+    A rate is either a single number held flat across the years or a list of
+    per-year rates starting at year 0, whose last rate carries forward.
+    """
+    if isinstance(value, (list, tuple)):
+        rates = [float(v) for v in value[:years + 1]]
+        return rates + rates[-1:] * (years + 1 - len(rates))
+    return [float(value)] * (years + 1)
+
+
+def current_rate(assumptions, business, location):
+    """Year 0 annual resource cost for a business and location"""
+    return rate_path(assumptions[business][location], 0)[0]
+
+
+def rate_table(assumptions, years=0):
+    """
+    Build the business x location x year resource rate matrix.
+
+    Returns (business_index, location_index, rates) where the indexes map names
+    to positions in the rates array and missing combinations are NaN.
+    """
+    businesses = list(assumptions)
+    locations = resource_locations(assumptions)
+    business_index = {b: i for i, b in enumerate(businesses)}
+    location_index = {loc: j for j, loc in enumerate(locations)}
+
+    rates = np.full((len(businesses), len(locations), years + 1), np.nan)
+    for b, values in assumptions.items():
+        for loc, value in values.items():
+            if not isinstance(value, dict):
+                rates[business_index[b], location_index[loc]] = rate_path(value, years)
+    return business_index, location_index, rates
+
+
+def gather_rates(assumptions, businesses, locations, years=0):
+    """
+    Look up the annual resource cost for paired business/location sequences in one gather.
+
+    Returns a (len(businesses), years + 1) array, NaN where no rate is defined.
+    """
+    business_index, location_index, rates = rate_table(assumptions, years)
+    rows = pd.Series(businesses, dtype=object).map(business_index).to_numpy(dtype=float)
+    cols = pd.Series(locations, dtype=object).map(location_index).to_numpy(dtype=float)
+
+    found = ~(np.isnan(rows) | np.isnan(cols))
+    result = np.full((len(rows), years + 1), np.nan)
+    result[found] = rates[rows[found].astype(int), cols[found].astype(int)]
+    return result
+
+
+def derive_resource_costs(records, assumptions):
+    """
+    Recompute unit_cost and total_cost of every Resource record from the year 0 (reporting currency) rates.
+
+    Records may be shared with other sessions, so a record whose costs change
+    is replaced in the list by an updated copy rather than edited.
+    """
+    resources = [i for i, r in enumerate(records) if r['category'] == 'Resource']
+    if not resources:
+        return
+
+    unit_costs = gather_rates(
+        assumptions,
+        [records[i]['business'] for i in resources],
+        [records[i]['location'] for i in resources]
+    )[:, 0]
+    counts = np.array([records[i]['count'] or 0 for i in resources], dtype=float)
+    total_costs = unit_costs * counts
+
+    for i, unit_cost, total_cost in zip(resources, unit_costs.tolist(), total_costs.tolist()):
+        # The rates are in the reporting currency, and so is every cost derived from them
+        priced = {'currency': REPORTING_CURRENCY}
+        if not np.isnan(unit_cost):
+            priced.update(unit_cost=unit_cost, total_cost=total_cost)
+        if any(records[i].get(field) != value for field, value in priced.items()):
+            records[i] = {**records[i], **priced}
+
+
+def rate_growth(records, assumptions, years=PROJECTION_YEARS):
+    """
+    Per-year rate of each record relative to year 0.
+
+    Resource records follow the rate path of their business and location;
+    everything else (and records without a rate) stays at 1.
+    """
+    growth = np.ones((len(records), years + 1))
+    resources = [i for i, r in enumerate(records) if r['category'] == 'Resource']
+    if not resources:
+        return growth
+
+    rates = gather_rates(
+        assumptions,
+        [records[i]['business'] for i in resources],
+        [records[i]['location'] for i in resources],
+        years
+    )
+    usable = ~np.isnan(rates[:, 0]) & (rates[:, 0] > 0)
+    growth[np.array(resources)[usable]] = rates[usable] / rates[usable, :1]
+    return growth
+
+
+def escalation_curves(assumptions, years=PROJECTION_YEARS):
+    """
+    Cumulative escalation factors for every (business, category, location) curve.
+
+    Curves live under assumptions[business]['Escalation'][category][location] as
+    an annual percentage, or a list of percentages for years 1..years whose last
+    value carries forward. ALL_LOCATIONS covers locations without their own curve.
+    Returns (keys, factors) with factors of shape (len(keys), years + 1).
+    """
+    keys = []
+    percentages = []
+    for business, values in assumptions.items():
+        for category, curves in values.get('Escalation', {}).items():
+            for location, value in curves.items():
+                keys.append((business, category, location))
+                percentages.append(rate_path(value, years - 1) if years > 0 else [])
+
+    factors = np.ones((len(keys), years + 1))
+    if keys and years > 0:
+        factors[:, 1:] = np.cumprod(1 + np.array(percentages, dtype=float) / 100, axis=1)
+    return keys, factors
+
+
+def escalation_factors(assumptions, businesses, categories, locations, years=PROJECTION_YEARS):
+    """
+    Gather the escalation factors for paired business/category/location sequences.
+
+    Returns a (len(businesses), years + 1) array; items without a curve stay at 1.
+    """
+    result = np.ones((len(businesses), years + 1))
+    keys, factors = escalation_curves(assumptions, years)
+    if not keys:
+        return result
+
+    curve_index = pd.MultiIndex.from_tuples(keys)
+    businesses = pd.Series(businesses, dtype=object).to_numpy()
+    categories = pd.Series(categories, dtype=object).to_numpy()
+    locations = pd.Series(locations, dtype=object).to_numpy()
+
+    # Location-specific curves first, then the business/category wide curve
+    positions = curve_index.get_indexer(pd.MultiIndex.from_arrays([businesses, categories, locations]))
+    fallback = curve_index.get_indexer(pd.MultiIndex.from_arrays(
+        [businesses, categories, np.full(len(businesses), ALL_LOCATIONS, dtype=object)]
+    ))
+    positions = np.where(positions >= 0, positions, fallback)
+
+    found = positions >= 0
+    result[found] = factors[positions[found]]
+    return result
+
+
+def record_escalation(records, assumptions, years=PROJECTION_YEARS):
+    """Escalation factors for each record's own business, category and location"""
+    return escalation_factors(
+        assumptions,
+        [r['business'] for r in records],
+        [r['category'] for r in records],
+        [r['location'] for r in records],
+        years
+    )
+
+
+def baseline_costs(records, assumptions, years=PROJECTION_YEARS):
+    """Annual cost of every record for years 0..years if no changes were made"""
+    current = np.array([r['total_cost'] or 0 for r in records], dtype=float)
+    return current[:, None] * rate_growth(records, assumptions, years) * record_escalation(records, assumptions, years)
+
+
+def rate_frame(assumptions, years=PROJECTION_YEARS):
+    """Resource rates as an editable table with one row per business and location"""
+    business_index, location_index, rates = rate_table(assumptions, years)
+    year_columns = [f"Year {y}" for y in range(years + 1)]
+    b, loc = np.nonzero(~np.isnan(rates[:, :, 0]))
+    businesses = list(business_index)
+    locations = list(location_index)
+
+    df = pd.DataFrame(rates[b, loc], columns=year_columns)
+    df.insert(0, 'Location', [locations[j] for j in loc])
+    df.insert(0, 'Business', [businesses[i] for i in b])
+    return df
+
+
+def apply_rate_frame(assumptions, df):
+    """
+    Return assumptions with the resource rates replaced by those in a rate_frame table.
+
+    Blank later years carry the previous year's rate forward, rows without a
+    business, location or year 0 rate are dropped, and rates that are flat
+    across the years are stored as a single number.
+    """
+    year_columns = [col for col in df.columns if col.startswith('Year ')]
+    df = df.dropna(subset=['Business', 'Location', 'Year 0'])
+    df = df[(df['Business'].astype(str).str.strip() != '') & (df['Location'].astype(str).str.strip() != '')]
+    rates = df[year_columns].astype(float).ffill(axis=1).to_numpy()
+
+    # Keep the non-rate entries (e.g. 'Implementation') of every business
+    updated = {
+        b: {key: value for key, value in values.items() if isinstance(value, dict)}
+        for b, values in assumptions.items()
+    }
+    flat = (rates == rates[:, :1]).all(axis=1)
+    for business, location, row, is_flat in zip(
+        df['Business'], df['Location'].astype(str).str.strip(), rates.tolist(), flat.tolist()
+    ):
+        updated.setdefault(business, {})[location] = row[0] if is_flat else row
+    return updated
+
+
+def escalation_frame(assumptions, years=PROJECTION_YEARS):
+    """Escalation curves as an editable table of annual percentages per year"""
+    year_columns = [f"Year {y}" for y in range(1, years + 1)]
+    keys, factors = escalation_curves(assumptions, years)
+    percentages = (factors[:, 1:] / factors[:, :-1] - 1) * 100
+
+    df = pd.DataFrame(percentages.round(6), columns=year_columns)
+    df.insert(0, 'Location', [key[2] for key in keys])
+    df.insert(0, 'Category', [key[1] for key in keys])
+    df.insert(0, 'Business', [key[0] for key in keys])
+    return df
+
+
+def apply_escalation_frame(assumptions, df):
+    """
+    Return assumptions with the escalation curves replaced by those in an escalation_frame table.
+
+    Blank years carry the previous year's percentage forward (0 for year 1) and
+    curves that are flat across the years are stored as a single percentage.
+    """
+    year_columns = [col for col in df.columns if col.startswith('Year ')]
+    df = df.dropna(subset=['Business', 'Category'])
+    locations = df['Location'].fillna(ALL_LOCATIONS).astype(str).str.strip().replace('', ALL_LOCATIONS)
+    percentages = df[year_columns].astype(float).ffill(axis=1).fillna(0).to_numpy()
+
+    updated = {
+        b: {key: value for key, value in values.items() if key != 'Escalation'}
+        for b, values in assumptions.items()
+    }
+    flat = (percentages == percentages[:, :1]).all(axis=1)
+    for business, category, location, row, is_flat in zip(
+        df['Business'], df['Category'], locations, percentages.tolist(), flat.tolist()
+    ):
+        curves = updated.setdefault(business, {}).setdefault('Escalation', {})
+        curves.setdefault(category, {})[location] = row[0] if is_flat else row
+    return updated
+
+
+def fx_table(fx_rates, years=PROJECTION_YEARS):
+    """
+    Per-year conversion factors into the reporting currency for every known currency.
+
+    fx_rates maps a currency to the reporting-currency value of one unit, either
+    flat or as a list of per-year rates from year 0. The reporting currency is
+    always 1. Returns (currency_index, factors) with factors of shape
+    (len(currency_index), years + 1).
+    """
+    currencies = [REPORTING_CURRENCY] + [c for c in fx_rates if c != REPORTING_CURRENCY]
+    factors = np.ones((len(currencies), years + 1))
+    for i, currency in enumerate(currencies[1:], start=1):
+        factors[i] = rate_path(fx_rates[currency], years)
+    return {c: i for i, c in enumerate(currencies)}, factors
+
+
+def item_currencies(items):
+    """
+    Currency of each record or implementation entry, defaulting to the reporting currency.
+
+    Resource records are priced from the rate table, which is in the reporting
+    currency, so whatever currency they are tagged with is ignored.
+    """
+    return [
+        REPORTING_CURRENCY if item.get('category') == 'Resource' else item.get('currency') or REPORTING_CURRENCY
+        for item in items
+    ]
+
+
+def priced_from_assumption(impl_type, impl_data):
+    """Whether an implementation line is priced from its business's Implementation assumption"""
+    return impl_type in IMPLEMENTATION_TYPES['Resource'] and not (impl_data.get('salary') or 0) > 0
+
+
+def line_currency(impl_type, impl_data):
+    """
+    Currency of an implementation line's amounts.
+
+    Resource lines without a salary are priced from the Implementation
+    assumption, which is in the reporting currency.
+    """
+    if priced_from_assumption(impl_type, impl_data):
+        return REPORTING_CURRENCY
+    return impl_data.get('currency') or REPORTING_CURRENCY
+
+
+def unknown_currencies(currencies, fx_rates):
+    """Currencies without an FX rate, which are reported unconverted"""
+    known = set(fx_rates) | {REPORTING_CURRENCY}
+    return sorted(set(currencies) - known)
+
+
+def fx_factors(fx_rates, currencies, years=PROJECTION_YEARS):
+    """Gather the (len(currencies), years + 1) conversion factors; unknown currencies stay at 1"""
+    currency_index, factors = fx_table(fx_rates, years)
+    positions = pd.Series(currencies, dtype=object).map(currency_index).fillna(0).to_numpy(dtype=int)
+    return factors[positions]
+
+
+def convert_costs(costs, currencies, fx_rates):
+    """Convert a local-currency (items, years + 1) cost matrix to the reporting currency in one multiply"""
+    return costs * fx_factors(fx_rates, currencies, costs.shape[1] - 1)
+
+
+def current_costs(records, fx_rates):
+    """Current annual cost of each record in the reporting currency"""
+    costs = np.array([r['total_cost'] or 0 for r in records], dtype=float)
+    return costs * fx_factors(fx_rates, item_currencies(records), 0)[:, 0]
+
+
+def fx_frame(fx_rates, years=PROJECTION_YEARS):
+    """FX rates as an editable table with one row per currency"""
+    currency_index, factors = fx_table(fx_rates, years)
+    df = pd.DataFrame(factors[1:], columns=[f"Year {y}" for y in range(years + 1)])
+    df.insert(0, 'Currency', pd.Series(list(currency_index)[1:], dtype='string'))
+    return df
+
+
+def apply_fx_frame(df):
+    """
+    Build fx_rates from an fx_frame table or an uploaded file of the same shape.
+
+    A file may give a single 'Rate' column instead of per-year columns. Blank
+    later years carry the previous rate forward and flat rates are stored as one number.
+    """
+    df = df.rename(columns=lambda col: str(col).strip())
+    if 'Rate' in df.columns and 'Year 0' not in df.columns:
+        df = df.rename(columns={'Rate': 'Year 0'})
+    year_columns = [col for col in df.columns if col.startswith('Year ')]
+    df = df.dropna(subset=['Currency', 'Year 0'])
+    currencies = df['Currency'].astype(str).str.strip().str.upper()
+    keep = (currencies != '') & (currencies != REPORTING_CURRENCY)
+    rates = df.loc[keep, year_columns].astype(float).ffill(axis=1).to_numpy()
+
+    flat = (rates == rates[:, :1]).all(axis=1)
+    return {
+        currency: row[0] if is_flat else row
+        for currency, row, is_flat in zip(currencies[keep], rates.tolist(), flat.tolist())
+    }
+
+
+def change_key(change):
+    """Stable key of a change; implementation lines funding it refer to it by this key"""
+    return f"{change['record_id']}|{change['timestamp']}"
+
+
+def record_positions(records):
+    """Map record ids (and the base part of timestamped ids) to list positions"""
+    positions = {}
+    for i, record in enumerate(records):
+        positions.setdefault(str(record['id']), i)
+        positions.setdefault(str(record['id']).split('_')[0], i)
+    return positions
+
+
+def project_costs(records, changes, assumptions, years=PROJECTION_YEARS):
+    """
+    Project the annual cost of every record for years 0..years.
+
+    Returns a (len(records), years + 1) array whose column 0 is the current cost.
+    A change takes effect from its implementation year onwards and the change
+    with the latest implementation year wins, matching calculate_future_cost.
+    Resource costs follow the per-year rates of their (new) location and every
+    cost is escalated by the curve of its business, category and location.
+    """
+    growth = rate_growth(records, assumptions, years)
+    escalation = record_escalation(records, assumptions, years)
+    current = np.array([r['total_cost'] or 0 for r in records], dtype=float)
+    projection = current[:, None] * growth * escalation
+
+    positions = record_positions(records)
+    matched = [(positions.get(str(c['record_id'])), c) for c in changes]
+    matched = [(i, c) for i, c in matched if i is not None]
+    if not matched:
+        return projection
+
+    rows = np.array([i for i, _ in matched])
+    change_type = np.array([c['type'] for _, c in matched])
+    start_year = np.array([c['implementation_year'] or 0 for _, c in matched], dtype=int)
+    is_resource = np.array([records[i]['category'] == 'Resource' for i in rows])
+    unit_cost = np.array([records[i]['unit_cost'] or 0 for i in rows], dtype=float)
+    count = np.array([np.nan if records[i]['count'] is None else records[i]['count'] for i in rows], dtype=float)
+    numeric_to = pd.to_numeric(pd.Series([c['to'] for _, c in matched], dtype=object), errors='coerce').to_numpy()
+    location_rate = gather_rates(
+        assumptions,
+        [records[i]['business'] for i in rows],
+        [c['to'] for _, c in matched],
+        years
+    )
+
+    # Per-year cost each change would set; NaN marks changes that leave the cost unchanged
+    new_cost = np.select(
+        [
+            ((change_type == 'count_change') & is_resource)[:, None],
+            ((change_type == 'location_change') & is_resource)[:, None],
+            (change_type == 'cost_change')[:, None],
+        ],
+        [
+            (numeric_to * unit_cost)[:, None] * growth[rows],
+            count[:, None] * location_rate,
+            np.broadcast_to(numeric_to[:, None], location_rate.shape),
+        ],
+        default=np.nan
+    )
+
+    # Location changes escalate along the curve of the location being moved to
+    is_move = (change_type == 'location_change') & is_resource
+    change_escalation = escalation[rows]
+    if is_move.any():
+        change_escalation[is_move] = escalation_factors(
+            assumptions,
+            [records[i]['business'] for i in rows[is_move]],
+            ['Resource'] * int(is_move.sum()),
+            [c['to'] for (_, c), move in zip(matched, is_move) if move],
+            years
+        )
+    new_cost = new_cost * change_escalation
+
+    start_year = np.maximum(start_year, 1)
+    effective = ~np.isnan(new_cost[:, 0]) & (start_year <= years)
+    if not effective.any():
+        return projection
+    rows, start_year, new_cost = rows[effective], start_year[effective], new_cost[effective]
+
+    # Rank changes by implementation year, mark each at its start year and carry the
+    # highest rank forward so later-year changes override earlier ones
+    order = np.argsort(start_year, kind='stable')
+    active = np.full(projection.shape, -1)
+    active[rows[order], start_year[order]] = np.arange(len(order))
+    active = np.maximum.accumulate(active, axis=1)
+
+    changed = new_cost[order][np.maximum(active, 0), np.arange(years + 1)]
+    return np.where(active >= 0, changed, projection)
+
+
+def project_counts(records, changes, years=PROJECTION_YEARS):
+    """
+    Project the headcount of every record for years 0..years.
+
+    Returns a (len(records), years + 1) array. Count changes take effect from
+    their implementation year and the latest one wins, as in project_costs.
+    Technology records have no headcount.
+    """
+    counts = np.array(
+        [(r['count'] or 0) if r['category'] == 'Resource' else 0 for r in records], dtype=float
+    )
+    projection = np.repeat(counts[:, None], years + 1, axis=1)
+
+    positions = record_positions(records)
+    matched = [(positions.get(str(c['record_id'])), c) for c in changes if c['type'] == 'count_change']
+    matched = [(i, c) for i, c in matched if i is not None and records[i]['category'] == 'Resource']
+    if not matched:
+        return projection
+
+    rows = np.array([i for i, _ in matched])
+    start_year = np.maximum(np.array([c['implementation_year'] or 0 for _, c in matched], dtype=int), 1)
+    new_count = pd.to_numeric(pd.Series([c['to'] for _, c in matched], dtype=object), errors='coerce').to_numpy()
+    effective = ~np.isnan(new_count) & (start_year <= years)
+    if not effective.any():
+        return projection
+    rows, start_year, new_count = rows[effective], start_year[effective], new_count[effective]
+
+    # Same carry-forward as project_costs: the highest ranked change so far applies
+    order = np.argsort(start_year, kind='stable')
+    active = np.full(projection.shape, -1)
+    active[rows[order], start_year[order]] = np.arange(len(order))
+    active = np.maximum.accumulate(active, axis=1)
+    return np.where(active >= 0, new_count[order][np.maximum(active, 0)], projection)
+
+
+def implementation_costs_by_type(implementation_costs, assumptions, fx_rates, business, years=PROJECTION_YEARS):
+    """
+    Yearly implementation costs of one business in the reporting currency.
+
+    Returns {category: {implementation type: [cost for years 1..years]}}. Resource
+    entries are headcounts priced at the entry's salary, or the business's
+    implementation assumption when no salary is given; Technology entries are amounts.
+    """
+    costs = {
+        category: {impl_type: [0] * years for impl_type in impl_types}
+        for category, impl_types in IMPLEMENTATION_TYPES.items()
+    }
+
+    fx = fx_table(fx_rates, years)
+    for entry_key, data in implementation_costs.items():
+        if not entry_key.startswith(business) or not isinstance(data, dict):
+            continue
+        for impl_type, impl_data in data.get('resources', {}).items():
+            if not isinstance(impl_data, dict):
+                continue
+            for category_costs in costs.values():
+                if impl_type in category_costs:
+                    line = implementation_line_costs(impl_type, impl_data, assumptions, business, fx, years)
+                    category_costs[impl_type] = (np.array(category_costs[impl_type]) + line).tolist()
+
+    return costs
+
+
+def implementation_line_costs(impl_type, impl_data, assumptions, business, fx, years=PROJECTION_YEARS):
+    """
+    Yearly cost of one implementation line in the reporting currency, for years 1..years.
+
+    fx is an fx_table result. Resource lines are headcounts priced at the
+    line's salary, or the business's implementation assumption when no salary
+    is given; Technology lines are amounts.
+    """
+    currency_index, factors = fx
+    values = np.zeros(years)
+    given = [float(v or 0) for v in list(impl_data.get('values') or [])[:years]]
+    values[:len(given)] = given
+    rates = factors[currency_index.get(line_currency(impl_type, impl_data), 0), 1:]
+
+    if impl_type in IMPLEMENTATION_TYPES['Resource']:
+        salary = impl_data.get('salary') or 0
+        values = values * (salary if salary > 0 else assumptions[business]['Implementation'][impl_type])
+    return values * rates
+
+
+def implementation_totals(implementation_costs, assumptions, fx_rates, businesses, years=PROJECTION_YEARS):
+    """Yearly implementation cost of each business as a (len(businesses), years) array"""
+    totals = np.zeros((len(businesses), years))
+    for i, business in enumerate(businesses):
+        costs = implementation_costs_by_type(implementation_costs, assumptions, fx_rates, business, years)
+        for category in costs.values():
+            for yearly_costs in category.values():
+                totals[i] += yearly_costs
+    return totals
+
+
+def savings_by_business(records, changes, assumptions, fx_rates, businesses, years=PROJECTION_YEARS):
+    """
+    Yearly baseline and projected cost of each business in the reporting currency.
+
+    Returns (baseline, projection), each a (len(businesses), years + 1) array;
+    records of other businesses are left out.
+    """
+    currencies = item_currencies(records)
+    baseline = convert_costs(baseline_costs(records, assumptions, years), currencies, fx_rates)
+    projection = convert_costs(project_costs(records, changes, assumptions, years), currencies, fx_rates)
+
+    positions = pd.Series([r['business'] for r in records], dtype=object).map(
+        {b: i for i, b in enumerate(businesses)}
+    )
+    keep = positions.notna().to_numpy()
+    rows = positions[keep].to_numpy(dtype=int)
+    by_business = np.zeros((2, len(businesses), years + 1))
+    np.add.at(by_business[0], rows, baseline[keep])
+    np.add.at(by_business[1], rows, projection[keep])
+    return by_business[0], by_business[1]
+
+
+def change_payback(records, changes, implementation_costs, assumptions, fx_rates, years=PROJECTION_YEARS):
+    """
+    Cash flows, break-even year and ROI of every change, in the reporting currency.
+
+    Each change is projected on its own against its record's baseline, so its
+    savings do not depend on the record's other changes. An implementation
+    line funds the change whose key it holds under 'change'. Returns a dict of
+    arrays aligned with changes:
+
+    - savings, implementation, cumulative: (len(changes), years) for years
+      1..years, cumulative being the running net cash flow
+    - break_even_year: first year in which cumulative savings cover the
+      cumulative implementation cost, 0 if none within the projection
+    - payback_years: years until break-even, interpolated within the
+      break-even year with that year's costs paid up front; NaN if none
+    - roi: net savings over implementation cost; NaN without implementation cost
+
+    plus 'unlinked', {business: (years,) cost} of lines funding none of the changes,
+    and 'unpriced', {business: number of lines} of lines that cannot be priced.
+    Lines of a business without assumptions count as unlinked; those priced
+    from the missing Implementation assumption are unpriced.
+    """
+    n = len(changes)
+    savings = np.zeros((n, years))
+    positions = record_positions(records)
+    matched = [(j, positions.get(str(c['record_id']))) for j, c in enumerate(changes)]
+    matched = [(j, i) for j, i in matched if i is not None]
+    if matched:
+        # One copy of the record per change, holding only that change, so all
+        # changes are projected in a single pass; only the priced fields are copied
+        solo_records = [
+            {'id': j, **{field: records[i].get(field) for field in PRICED_FIELDS}} for j, i in matched
+        ]
+        solo_changes = [{**changes[j], 'record_id': j} for j, _ in matched]
+        currencies = item_currencies(solo_records)
+        baseline = convert_costs(baseline_costs(solo_records, assumptions, years), currencies, fx_rates)
+        projected = convert_costs(project_costs(solo_records, solo_changes, assumptions, years), currencies, fx_rates)
+        savings[[j for j, _ in matched]] = (baseline - projected)[:, 1:]
+
+    # Price each implementation line once and add it to the change it funds
+    index = {change_key(c): j for j, c in enumerate(changes)}
+    implementation = np.zeros((n, years))
+    unlinked = {}
+    unpriced = {}
+    fx = fx_table(fx_rates, years)
+    for entry_key, data in implementation_costs.items():
+        if not isinstance(data, dict):
+            continue
+        business = entry_key.partition('_')[0]
+        for impl_type, impl_data in data.get('resources', {}).items():
+            if not isinstance(impl_data, dict):
+                continue
+            known = business in assumptions
+            if not known and priced_from_assumption(impl_type, impl_data):
+                unpriced[business] = unpriced.get(business, 0) + 1
+                continue
+            line = implementation_line_costs(impl_type, impl_data, assumptions, business, fx, years)
+            j = index.get(impl_data.get('change')) if known else None
+            if j is None:
+                unlinked[business] = unlinked.get(business, 0) + line
+            else:
+                implementation[j] += line
+
+    net = savings - implementation
+    cumulative = np.cumsum(net, axis=1)
+    saved = np.cumsum(savings, axis=1)
+    spent = np.cumsum(implementation, axis=1)
+    paid_back = (saved >= spent) & (saved > 0)
+    has_break_even = paid_back.any(axis=1)
+    first = np.argmax(paid_back, axis=1)
+
+    rows = np.arange(n)
+    saved_before = np.where(first > 0, saved[rows, np.maximum(first - 1, 0)], 0.0)
+    outstanding = spent[rows, first] - saved_before
+    year_savings = savings[rows, first]
+    fraction = np.divide(outstanding, year_savings, out=np.zeros(n), where=year_savings > 0)
+    payback_years = np.where(has_break_even, first + np.clip(fraction, 0, 1), np.nan)
+
+    total_implementation = implementation.sum(axis=1)
+    roi = np.divide(net.sum(axis=1), total_implementation, out=np.full(n, np.nan), where=total_implementation > 0)
+
+    return {
+        'savings': savings,
+        'implementation': implementation,
+        'cumulative': cumulative,
+        'break_even_year': np.where(has_break_even, first + 1, 0),
+        'payback_years': payback_years,
+        'roi': roi,
+        'unlinked': unlinked,
+        'unpriced': unpriced,
+    }
+
+
+def portfolio_summary(records, changes, implementation_costs, assumptions, fx_rates, reprice=False,
+                      years=PROJECTION_YEARS):
+    """
+    Savings, implementation cost and net savings of a portfolio per business, as plain JSON-ready values.
+
+    With reprice, Resource records are first re-priced from the assumptions
+    (in place). Each business carries totals over years 1..years and a
+    per-year breakdown.
+    """
+    if reprice:
+        derive_resource_costs(records, assumptions)
+
+    businesses = list(dict.fromkeys(list(assumptions) + [r['business'] for r in records]))
+    baseline, projection = savings_by_business(records, changes, assumptions, fx_rates, businesses, years)
+    implementation = implementation_totals(implementation_costs, assumptions, fx_rates, businesses, years)
+    savings = baseline[:, 1:] - projection[:, 1:]
+    net = savings - implementation
+    record_counts = pd.Series([r['business'] for r in records], dtype=object).value_counts()
+
+    summary = []
+    for i, business in enumerate(businesses):
+        summary.append({
+            'business': business,
+            'records': int(record_counts.get(business, 0)),
+            'baseline_cost': float(baseline[i, 1:].sum()),
+            'projected_cost': float(projection[i, 1:].sum()),
+            'savings': float(savings[i].sum()),
+            'implementation_cost': float(implementation[i].sum()),
+            'net_savings': float(net[i].sum()),
+            'years': [
+                {
+                    'year': year,
+                    'baseline_cost': float(baseline[i, year]),
+                    'projected_cost': float(projection[i, year]),
+                    'savings': float(savings[i, year - 1]),
+                    'implementation_cost': float(implementation[i, year - 1]),
+                    'net_savings': float(net[i, year - 1]),
+                }
+                for year in range(1, years + 1)
+            ],
+        })
+
+    return {'records': len(records), 'changes': len(changes), 'businesses': summary}
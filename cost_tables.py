@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+YEAR_COLUMNS = ['Year 1', 'Year 2', 'Year 3', 'Year 4', 'Year 5']
+
+# Text colours used across the cost tables
+SAVING_TEXT = 'color: #006100'  # Dark green
+INCREASE_TEXT = 'color: #9c0006'  # Dark red
+
+# Background + text colours used for highlighted cells
+SAVING_CELL = 'background-color: #c6efce; color: #006100'  # Green background
+INCREASE_CELL = 'background-color: #ffc7ce; color: #9c0006'  # Red background
+
+# The Styler renders every cell, so larger tables are shown without the colour coding
+MAX_STYLED_ROWS = 2000
+
+
+def currency_column_config(columns):
+    """Display numeric columns as dollar amounts without converting them to strings"""
+    return {col: st.column_config.NumberColumn(col, format="dollar") for col in columns}
+
+
+def cost_change_styles(df, saving_style=SAVING_TEXT, increase_style=INCREASE_TEXT,
+                       savings_col='Total 5Y Savings', zero_is_saving=False):
+    """
+    Vectorized Styler function colouring each year cost against the current cost
+    and the savings column by its sign. Use with `Styler.apply(..., axis=None)`.
+    """
+    styles = pd.DataFrame('', index=df.index, columns=df.columns)
+
+    year_cols = [col for col in YEAR_COLUMNS if col in df.columns]
+    year_vals = df[year_cols].to_numpy(dtype=float)
+    current_vals = df[['Current Cost']].to_numpy(dtype=float)
+    styles[year_cols] = np.where(
+        year_vals < current_vals, saving_style,
+        np.where(year_vals > current_vals, increase_style, '')
+    )
+
+    if savings_col in df.columns:
+        savings = df[savings_col].to_numpy(dtype=float)
+        is_saving = savings >= 0 if zero_is_saving else savings > 0
+        styles[savings_col] = np.where(is_saving, saving_style, np.where(savings < 0, increase_style, ''))
+
+    return styles
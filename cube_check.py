@@ -0,0 +1,128 @@
+"""
+Consistency check of the cost cube's incremental updates against full builds.
+
+A generated portfolio (with some records sharing an id, as in older workbooks)
+is edited at random the way the app edits it: records and changes are added,
+edited and removed, and the written keys are marked as the portfolio store
+marks them. After every step the incrementally refreshed cube is compared with
+a cube built from scratch, and the check fails on the first difference.
+
+    python cube_check.py
+    python cube_check.py --records 2000 --steps 200 --seed 3
+"""
+import argparse
+import copy
+import random
+import sys
+
+import numpy as np
+
+from cost_cube import MEASURES, CostCube, record_key
+from cost_model import change_key
+from synthetic_data import generate_portfolio
+
+
+def duplicate_ids(records, count, rng):
+    """Give count records the id of another record"""
+    for record in rng.sample(records[1:], min(count, len(records) - 1)):
+        record['id'] = rng.choice(records)['id']
+
+
+def edit_portfolio(portfolio, rng, next_id):
+    """Apply one random edit; returns the (kind, keys) marks the portfolio store would make"""
+    records, changes = portfolio['records'], portfolio['changes']
+    action = rng.choice(['edit_record', 'add_record', 'remove_record', 'add_change', 'edit_change', 'remove_change'])
+
+    if action == 'edit_record':
+        record = rng.choice(records)
+        if record['category'] == 'Resource':
+            record['count'] = rng.randint(1, 40)
+            record['total_cost'] = (record['unit_cost'] or 0) * record['count']
+        else:
+            record['total_cost'] = float(rng.randint(1000, 500000))
+        return 'records', [record_key(record)]
+    if action == 'add_record':
+        record = {**copy.deepcopy(rng.choice(records)), 'id': next_id}
+        records.append(record)
+        return 'records', [record_key(record)]
+    if action == 'remove_record' and len(records) > 1:
+        record = records.pop(rng.randrange(len(records)))
+        return 'records', [record_key(record)]
+    if action == 'add_change':
+        template = rng.choice(changes)
+        record = rng.choice(records)
+        change = {
+            **template,
+            'record_id': record['id'],
+            'implementation_year': rng.randint(1, 5),
+            'timestamp': f"check-{next_id}",
+        }
+        changes.append(change)
+        return 'changes', [change_key(change)]
+    if action == 'edit_change' and changes:
+        change = rng.choice(changes)
+        change['implementation_year'] = rng.randint(1, 5)
+        return 'changes', [change_key(change)]
+    if action == 'remove_change' and changes:
+        change = changes.pop(rng.randrange(len(changes)))
+        return 'changes', [change_key(change)]
+    return None, []
+
+
+def compare(cube, portfolio):
+    """Differences between the cube and a fresh build, as messages"""
+    fresh = CostCube()
+    fresh.refresh(portfolio['records'], portfolio['changes'], portfolio['assumptions'], {})
+
+    problems = []
+    for measure in MEASURES:
+        for business in [None] + list(portfolio['business_names']):
+            if not np.allclose(cube.total(measure, business), fresh.total(measure, business)):
+                problems.append(f"total('{measure}', {business!r}) differs from a fresh build")
+        groups, fresh_groups = cube.by_function_group(measure), fresh.by_function_group(measure)
+        if set(groups) != set(fresh_groups) or not all(np.isclose(groups[k], fresh_groups[k]) for k in groups):
+            problems.append(f"by_function_group('{measure}') differs from a fresh build")
+        if not np.allclose(
+            cube.record_values(portfolio['records'], measure), fresh.record_values(portfolio['records'], measure)
+        ):
+            problems.append(f"record_values('{measure}') differs from a fresh build")
+    if cube.items() != fresh.items():
+        problems.append(f"items() is {cube.items()}, a fresh build has {fresh.items()}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare incremental cost cube updates with full builds")
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--steps', type=int, default=100, help="random edits to apply")
+    parser.add_argument('--duplicates', type=int, default=10, help="records given another record's id")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    portfolio = generate_portfolio(records=args.records, seed=args.seed)
+    duplicate_ids(portfolio['records'], args.duplicates, rng)
+    next_id = max(int(r['id']) for r in portfolio['records']) + 1
+
+    cube = CostCube()
+    cube.refresh(portfolio['records'], portfolio['changes'], portfolio['assumptions'], {})
+    for step in range(1, args.steps + 1):
+        kind, keys = edit_portfolio(portfolio, rng, next_id)
+        next_id += 1
+        if kind is not None:
+            cube.mark(kind, keys)
+        cube.refresh(portfolio['records'], portfolio['changes'], portfolio['assumptions'], {})
+        problems = compare(cube, portfolio)
+        if problems:
+            print(f"Step {step} ({kind} {keys}):")
+            for problem in problems:
+                print(f"  - {problem}")
+            return 1
+
+    print(f"Cube matched a fresh build after each of {args.steps} edits "
+          f"({args.records:,} records, {args.duplicates} repeated ids)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
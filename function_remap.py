@@ -0,0 +1,62 @@
+UNASSIGNED = 'Unassigned'
+
+
+def build_function_remap(old_functions, edited_names, removed=()):
+    """
+    Map every existing function to its new name.
+
+    edited_names lines up with old_functions; blank names keep the old name and
+    removed functions map to Unassigned. Renaming two functions to the same name
+    merges them.
+    """
+    remap = {}
+    for old, new in zip(old_functions, edited_names):
+        if old in removed:
+            remap[old] = UNASSIGNED
+        else:
+            remap[old] = (new or '').strip() or old
+    return remap
+
+
+def remapped_function_list(old_functions, remap, new_function=None):
+    """The function list after a remap, with an optional new function and Unassigned last"""
+    functions = list(dict.fromkeys(
+        remap.get(f, f) for f in old_functions if remap.get(f, f) != UNASSIGNED
+    ))
+    if new_function and new_function.strip() and new_function.strip() not in functions:
+        functions.append(new_function.strip())
+    functions.append(UNASSIGNED)
+    return functions
+
+
+def remap_functions(items, remap):
+    """
+    Apply a function remap in place to records (or changes) carrying a functions list.
+
+    Only items that use a remapped function are touched and ids are left as they
+    are, so changes keep pointing at their records. Items may be shared with
+    other sessions, so each touched item is replaced in the list by an updated
+    copy. Returns the updated items.
+    """
+    moved = {old for old, new in remap.items() if old != new}
+    if not moved:
+        return []
+
+    updated = []
+    for i, item in enumerate(items):
+        functions = item.get('functions')
+        if not functions or moved.isdisjoint(functions):
+            continue
+
+        item = {**item, 'functions': list(dict.fromkeys(remap.get(f, f) for f in functions))}
+        if 'function_descriptions' in item:
+            descriptions = {}
+            for func, desc in item['function_descriptions'].items():
+                new_func = remap.get(func, func)
+                # Merged functions keep the first non-empty description
+                if not descriptions.get(new_func):
+                    descriptions[new_func] = desc
+            item['function_descriptions'] = descriptions
+        items[i] = item
+        updated.append(item)
+    return updated
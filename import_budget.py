@@ -0,0 +1,83 @@
+"""
+Import-time budget check for the app pages.
+
+Each page's top-level imports are executed in a fresh interpreter after
+importing streamlit (which every page needs anyway). The check fails when a
+page pulls in a module that should only be loaded on the code path that uses
+it, or when its imports take longer than the page's budget.
+
+    python import_budget.py
+"""
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds allowed for each page's own imports on top of streamlit
+PAGE_BUDGETS = {
+    'app.py': 1.0,
+    'pages/assumptions.py': 1.0,
+    'pages/implementation.py': 1.0,
+    'pages/dashboard.py': 1.0,
+}
+
+# Modules that must be imported lazily by the code that needs them
+DEFERRED_MODULES = ['plotly.express', 'openpyxl']
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+before = set(sys.modules)
+start = time.perf_counter()
+exec(compile({source!r}, {page!r}, 'exec'), {{'__name__': '__import_budget__'}})
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': sorted(set(sys.modules) - before)}}))
+"""
+
+
+def page_imports(path):
+    """Return the source of the module-level import statements in a page"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return '\n'.join(ast.unparse(node) for node in imports)
+
+
+def measure_page(page):
+    """Import a page's dependencies in a fresh interpreter and report time and new modules"""
+    probe = _PROBE.format(root=ROOT, source=page_imports(os.path.join(ROOT, page)), page=page)
+    result = subprocess.run(
+        [sys.executable, '-c', probe],
+        capture_output=True, text=True, check=True, cwd=ROOT
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    failures = []
+    for page, budget in PAGE_BUDGETS.items():
+        result = measure_page(page)
+        deferred = [
+            m for m in result['loaded']
+            if any(m == d or m.startswith(d + '.') for d in DEFERRED_MODULES)
+        ]
+        status = 'ok'
+        if deferred:
+            status = 'FAIL'
+            failures.append(f"{page} imports {', '.join(sorted({m.split('.')[0] for m in deferred}))} at load time")
+        if result['elapsed'] > budget:
+            status = 'FAIL'
+            failures.append(f"{page} imports took {result['elapsed']:.3f}s (budget {budget:.3f}s)")
+        print(f"{page:<28} {result['elapsed']:.3f}s / {budget:.3f}s  {status}")
+
+    for failure in failures:
+        print(f"  - {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
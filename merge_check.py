@@ -0,0 +1,82 @@
+"""
+Check that merging workbooks keeps every implementation line linked as it was.
+
+Generated portfolios (numbered from zero, as saved workbooks are) are merged
+the way Consolidate Workbooks merges them, some records sharing an id as in
+older workbooks. The payback figures of the merged
+portfolio must equal those of the inputs added together: the savings of the
+changes, the implementation cost funding them, and each business's unlinked
+implementation cost.
+
+    python merge_check.py
+    python merge_check.py --portfolios 3 --records 2000 --seed 3
+"""
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from consolidation import merge_portfolios
+from cost_model import change_payback
+from cube_check import duplicate_ids
+from synthetic_data import generate_portfolio
+
+
+def payback_totals(records, changes, implementation_costs, assumptions):
+    """(savings, linked implementation, {business: unlinked}) totals of a portfolio"""
+    payback = change_payback(records, changes, implementation_costs, assumptions, {})
+    unlinked = {business: float(np.sum(costs)) for business, costs in payback['unlinked'].items()}
+    return float(payback['savings'].sum()), float(payback['implementation'].sum()), unlinked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare payback figures before and after a merge")
+    parser.add_argument('--portfolios', type=int, default=2, help="portfolios to merge")
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--duplicates', type=int, default=10, help="records per portfolio given another record's id")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    portfolios = [generate_portfolio(records=args.records, seed=args.seed + i) for i in range(args.portfolios)]
+    for portfolio in portfolios:
+        duplicate_ids(portfolio['records'], args.duplicates, rng)
+        # The merge drops changes of records that no longer exist, so leave none
+        ids = {str(r['id']) for r in portfolio['records']}
+        portfolio['changes'] = [c for c in portfolio['changes'] if str(c['record_id']) in ids]
+    # Every portfolio is priced with the same assumptions, as they are after a merge
+    assumptions = portfolios[0]['assumptions']
+    inputs = [(p['records'], p['changes'], p['implementation_costs']) for p in portfolios]
+
+    savings, linked, unlinked = 0.0, 0.0, {}
+    for portfolio in inputs:
+        input_savings, input_linked, input_unlinked = payback_totals(*portfolio, assumptions)
+        savings += input_savings
+        linked += input_linked
+        for business, cost in input_unlinked.items():
+            unlinked[business] = unlinked.get(business, 0.0) + cost
+
+    merged_savings, merged_linked, merged_unlinked = payback_totals(*merge_portfolios(inputs), assumptions)
+
+    problems = []
+    if not np.isclose(savings, merged_savings):
+        problems.append(f"savings {merged_savings:,.0f} after the merge, {savings:,.0f} before")
+    if not np.isclose(linked, merged_linked):
+        problems.append(f"linked implementation {merged_linked:,.0f} after the merge, {linked:,.0f} before")
+    for business in sorted(set(unlinked) | set(merged_unlinked)):
+        before, after = unlinked.get(business, 0.0), merged_unlinked.get(business, 0.0)
+        if not np.isclose(before, after):
+            problems.append(f"{business} unlinked implementation {after:,.0f} after the merge, {before:,.0f} before")
+    if problems:
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+
+    print(f"Merging {args.portfolios} portfolios of {args.records:,} records kept "
+          f"{linked:,.0f} linked and {sum(unlinked.values()):,.0f} unlinked implementation cost")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,13 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from cost_model import (
+    ALL_LOCATIONS, REPORTING_CURRENCY, rate_frame, apply_rate_frame, escalation_frame, apply_escalation_frame,
+    fx_frame, apply_fx_frame, resource_locations
+)
+from record_import import read_import_file
+from function_remap import build_function_remap, remap_functions, remapped_function_list
+from portfolio_store import sync_shared_portfolio, publish_items
+from session_state import init_session_state
 
 # Page config
 st.set_page_config(page_title="Cost Assumptions", layout="wide")
@@ -25,108 +32,68 @@ if 'business_names' not in st.session_state:
         'Business B': 'Business B'
     }
 
+# FX rates into the reporting currency, per currency
+if 'fx_rates' not in st.session_state:
+    st.session_state.fx_rates = {}
+
 # Initialize functions with default values if not exists
 if 'FUNCTIONS' not in st.session_state:
     st.session_state.FUNCTIONS = ["Development", "Testing", "Support"]
 
+# Records and changes are shared with the other pages and sessions
+init_session_state()
+sync_shared_portfolio()
+
 st.title("Cost Assumptions")
 
 # Update tabs to include business names
-tab1, tab2, tab3, tab4 = st.tabs(["Resource Costs", "Functions", "Business Names", "Other Assumptions"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["Resource Costs", "Functions", "Business Names", "Escalation", "FX Rates"])
 
 with tab1:
     st.header("Resource Cost Assumptions")
     
+    st.caption(
+        "One row per business and delivery location. Add rows for new locations; "
+        "blank later years keep the previous year's cost."
+    )
+    
+    # Show display names in the editor and map them back on save
+    display_to_internal = {display: internal for internal, display in st.session_state.business_names.items()}
+    rates_df = rate_frame(st.session_state.assumptions)
+    rates_df['Business'] = rates_df['Business'].map(st.session_state.business_names).fillna(rates_df['Business'])
+    year_columns = [col for col in rates_df.columns if col.startswith('Year ')]
+    
     # Create a form for resource costs
     with st.form("resource_costs_form"):
-        # Business A costs
-        st.subheader(st.session_state.business_names['Business A'])
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            business_a_onshore = st.number_input(
-                "Onshore Resource Cost (Annual)",
-                min_value=0.0,
-                value=float(st.session_state.assumptions['Business A']['Onshore']),
-                step=1000.0,
-                help="Annual cost per onshore resource for Business A"
-            )
-        
-        with col2:
-            business_a_offshore = st.number_input(
-                "Offshore Resource Cost (Annual)",
-                min_value=0.0,
-                value=float(st.session_state.assumptions['Business A']['Offshore']),
-                step=1000.0,
-                help="Annual cost per offshore resource for Business A"
-            )
-        
-        st.divider()
-        
-        # Business B costs
-        st.subheader(st.session_state.business_names['Business B'])
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            business_b_onshore = st.number_input(
-                "Onshore Resource Cost (Annual)",
-                min_value=0.0,
-                value=float(st.session_state.assumptions['Business B']['Onshore']),
-                step=1000.0,
-                help="Annual cost per onshore resource for Business B"
-            )
-        
-        with col2:
-            business_b_offshore = st.number_input(
-                "Offshore Resource Cost (Annual)",
-                min_value=0.0,
-                value=float(st.session_state.assumptions['Business B']['Offshore']),
-                step=1000.0,
-                help="Annual cost per offshore resource for Business B"
-            )
+        edited_rates = st.data_editor(
+            rates_df,
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Business': st.column_config.SelectboxColumn(
+                    'Business', options=list(display_to_internal), required=True
+                ),
+                'Location': st.column_config.TextColumn('Location', required=True),
+                **{
+                    col: st.column_config.NumberColumn(col, min_value=0.0, step=1000.0, format="dollar")
+                    for col in year_columns
+                }
+            },
+            key="resource_rates_editor"
+        )
         
         # Submit button
         if st.form_submit_button("Update Resource Costs"):
-            # Update session state
-            st.session_state.assumptions['Business A']['Onshore'] = business_a_onshore
-            st.session_state.assumptions['Business A']['Offshore'] = business_a_offshore
-            st.session_state.assumptions['Business B']['Onshore'] = business_b_onshore
-            st.session_state.assumptions['Business B']['Offshore'] = business_b_offshore
+            edited_rates = edited_rates.assign(Business=edited_rates['Business'].map(display_to_internal))
+            st.session_state.assumptions = apply_rate_frame(st.session_state.assumptions, edited_rates)
             
-            # Update existing records with new costs
-            for record in st.session_state.records:
-                if record['category'] == 'Resource':
-                    business = record['business']
-                    location = record['location']
-                    new_unit_cost = st.session_state.assumptions[business][location]
-                    record['unit_cost'] = new_unit_cost
-                    record['total_cost'] = new_unit_cost * record['count']
+            # Records are re-priced once, on the next page that reads them
+            st.session_state.assumptions_version = st.session_state.get('assumptions_version', 0) + 1
             
             st.success("Resource costs updated successfully!")
             st.rerun()
 
-    # Display current assumptions in a table
-    st.subheader("Current Resource Cost Assumptions")
-    
-    # Create DataFrame for display
-    data = []
-    for business in ['Business A', 'Business B']:
-        for location in ['Onshore', 'Offshore']:
-            data.append({
-                'Business': business,
-                'Location': location,
-                'Annual Cost': f"${st.session_state.assumptions[business][location]:,}"
-            })
-    
-    df = pd.DataFrame(data)
-    st.dataframe(
-        df.style.set_properties(**{
-            'text-align': 'left',
-            'font-size': '16px'
-        }),
-        use_container_width=True
-    )
-
 with tab2:
     st.header("Function Management")
     
@@ -156,80 +123,16 @@ with tab2:
         new_function = st.text_input("New Function Name", key="new_function")
         
         if st.form_submit_button("Update Functions"):
-            # Store old functions for reference
+            # One remap table covers renames, merges (two functions renamed to the
+            # same name) and removals; record ids are never touched
             old_functions = st.session_state.FUNCTIONS.copy()
+            remap = build_function_remap(old_functions, edited_functions, functions_to_remove)
             
-            # Create new edited_functions list excluding removed functions
-            edited_functions = [
-                f for f in edited_functions 
-                if f not in functions_to_remove
-            ]
-            
-            # Update existing records that use any removed function
-            if 'records' in st.session_state:
-                for record in st.session_state.records:
-                    # Store the base ID
-                    base_id = str(record['id']).split('_')[0]
-                    
-                    # Update functions list
-                    new_functions = []
-                    for f in record['functions']:
-                        if f in functions_to_remove:
-                            if 'Unassigned' not in new_functions:
-                                new_functions.append('Unassigned')
-                        else:
-                            new_functions.append(f)
-                    record['functions'] = new_functions
-
-                    # Update function descriptions
-                    new_descriptions = {}
-                    for func, desc in record['function_descriptions'].items():
-                        if func in functions_to_remove:
-                            new_descriptions['Unassigned'] = desc
-                        else:
-                            new_descriptions[func] = desc
-                    record['function_descriptions'] = new_descriptions
-
-                    # Update record ID while preserving the base ID
-                    record['id'] = f"{base_id}_{datetime.now().timestamp()}"
-                    
-                    # Update any related changes to use the base ID
-                    if 'changes' in st.session_state:
-                        for change in st.session_state.changes:
-                            if str(change['record_id']) == base_id:
-                                change['record_id'] = base_id
-            
-            # Add new function if provided
-            if new_function and new_function not in edited_functions:
-                edited_functions.append(new_function)
-            
-            # Ensure "Unassigned" is always available
-            if 'Unassigned' not in edited_functions:
-                edited_functions.append('Unassigned')
+            publish_items('records', remap_functions(st.session_state.get('records', []), remap))
+            publish_items('changes', remap_functions(st.session_state.get('changes', []), remap))
             
             # Update session state
-            st.session_state.FUNCTIONS = edited_functions
-            
-            # Update existing records with renamed functions
-            if 'records' in st.session_state:
-                for record in st.session_state.records:
-                    # Create a mapping of old function names to new ones
-                    function_mapping = {
-                        old: new for old, new in zip(old_functions, edited_functions)
-                        if old != new and old in record['functions']
-                    }
-                    
-                    # Update functions using the mapping
-                    record['functions'] = [
-                        function_mapping.get(f, f) for f in record['functions']
-                    ]
-                    
-                    # Update function descriptions
-                    new_descriptions = {}
-                    for func, desc in record['function_descriptions'].items():
-                        new_func = function_mapping.get(func, func)
-                        new_descriptions[new_func] = desc
-                    record['function_descriptions'] = new_descriptions
+            st.session_state.FUNCTIONS = remapped_function_list(old_functions, remap, new_function)
             
             st.success("Functions updated successfully!")
             st.rerun()
@@ -276,4 +179,89 @@ with tab3:
     st.dataframe(business_names_df, use_container_width=True)
 
 with tab4:
-    st.info("Additional assumptions can be added here in future versions") 
\ No newline at end of file
+    st.header("Escalation Curves")
+    st.caption(
+        "Annual wage inflation or vendor escalation in percent, applied to both current and "
+        f"future costs. Location '{ALL_LOCATIONS}' covers every location without its own curve; "
+        "blank later years keep the previous year's percentage."
+    )
+    
+    display_to_internal = {display: internal for internal, display in st.session_state.business_names.items()}
+    escalation_df = escalation_frame(st.session_state.assumptions)
+    escalation_df['Business'] = escalation_df['Business'].map(st.session_state.business_names).fillna(escalation_df['Business'])
+    year_columns = [col for col in escalation_df.columns if col.startswith('Year ')]
+    
+    with st.form("escalation_form"):
+        edited_escalation = st.data_editor(
+            escalation_df,
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Business': st.column_config.SelectboxColumn(
+                    'Business', options=list(display_to_internal), required=True
+                ),
+                'Category': st.column_config.SelectboxColumn(
+                    'Category', options=["Resource", "Technology"], required=True
+                ),
+                'Location': st.column_config.SelectboxColumn(
+                    'Location',
+                    options=[ALL_LOCATIONS] + resource_locations(st.session_state.assumptions),
+                    default=ALL_LOCATIONS
+                ),
+                **{
+                    col: st.column_config.NumberColumn(col, step=0.5, format="%.2f%%")
+                    for col in year_columns
+                }
+            },
+            key="escalation_editor"
+        )
+        
+        if st.form_submit_button("Update Escalation"):
+            edited_escalation = edited_escalation.assign(
+                Business=edited_escalation['Business'].map(display_to_internal)
+            )
+            st.session_state.assumptions = apply_escalation_frame(st.session_state.assumptions, edited_escalation)
+            st.success("Escalation curves updated successfully!")
+            st.rerun()
+
+with tab5:
+    st.header("FX Rates")
+    st.caption(
+        f"Value of one unit of each currency in {REPORTING_CURRENCY}, per projection year. "
+        "Records and implementation costs in other currencies are converted with these rates; "
+        "blank later years keep the previous year's rate."
+    )
+    
+    # Load a rate table from a CSV/Excel file with a Currency column and either
+    # Year 0..Year 5 columns or a single Rate column
+    fx_file = st.file_uploader("Load FX table", type=['csv', 'xlsx'], key="fx_file")
+    if fx_file is not None and st.session_state.get('loaded_fx_file_id') != fx_file.file_id:
+        try:
+            st.session_state.fx_rates = apply_fx_frame(read_import_file(fx_file.name, fx_file.getvalue()))
+            st.session_state.loaded_fx_file_id = fx_file.file_id
+            st.success(f"Loaded rates for {len(st.session_state.fx_rates)} currencies")
+        except (KeyError, ValueError) as e:
+            st.error(f"Could not read FX table: {e}")
+    
+    fx_df = fx_frame(st.session_state.fx_rates)
+    with st.form("fx_rates_form"):
+        edited_fx = st.data_editor(
+            fx_df,
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Currency': st.column_config.TextColumn('Currency', required=True, max_chars=3),
+                **{
+                    col: st.column_config.NumberColumn(col, min_value=0.0, format="%.4f")
+                    for col in fx_df.columns if col.startswith('Year ')
+                }
+            },
+            key="fx_rates_editor"
+        )
+        
+        if st.form_submit_button("Update FX Rates"):
+            st.session_state.fx_rates = apply_fx_frame(edited_fx)
+            st.success("FX rates updated successfully!")
+            st.rerun()
@@ -1,31 +1,57 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 from session_state import init_session_state  # Import the initialization function
-import openpyxl
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from io import BytesIO
+from utils import refresh_derived_costs
+from portfolio_store import sync_shared_portfolio, publish_removed_items
+from cost_model import (
+    PROJECTION_YEARS, change_payback, item_currencies, record_positions, unknown_currencies
+)
+from cost_cube import session_cube
+from charts import function_count_pie, cost_distribution_bar, savings_timeline, payback_curves
+from timing import begin_rerun, lap, render_timing_panel, timed
+from session_memory import compact_session_state
+from cost_tables import cost_change_styles, currency_column_config, MAX_STYLED_ROWS, SAVING_CELL, INCREASE_CELL
 
 # Page config
 st.set_page_config(page_title="Cost Savings Dashboard", layout="wide")
+begin_rerun('dashboard')
 
 # Initialize session state
+lap("Session sync")
 init_session_state()
-
-# Helper function to extract base record ID
-def get_base_record_id(record_id):
-    """Extract the base record ID from a timestamp-based ID"""
-    try:
-        return str(record_id).split('_')[0]
-    except (AttributeError, IndexError):
-        return str(record_id)
+sync_shared_portfolio()
+refresh_derived_costs()
+compact_session_state()
 
 # Constants (keep in sync with main app)
 CATEGORIES = ["Resource", "Technology"]
 
+# Initiatives drawn in the payback chart
+PAYBACK_CURVES = 10
+
+# Records or changes listed per function in the metric details; the rest are counted
+DETAIL_ITEMS = 20
+
+# Changes shown per page of the Summary of Changes tabs
+CHANGES_PAGE_SIZE = 25
+
+def show_remaining(shown, total):
+    """Note the items left out of a capped list"""
+    if total > shown:
+        st.caption(f"... and {total - shown:,} more")
+
+def changes_page(items, key):
+    """The page of items picked with a page selector, with a caption of what is shown"""
+    page_count = max(1, -(-len(items) // CHANGES_PAGE_SIZE))
+    if st.session_state.get(key, 1) > page_count:
+        st.session_state[key] = page_count
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key=key)
+    shown = items[(page - 1) * CHANGES_PAGE_SIZE:page * CHANGES_PAGE_SIZE]
+    st.caption(f"Showing {len(shown):,} of {len(items):,} changes, largest impact first")
+    return shown
+
+@timed
 def create_change_message(change, record):
     """Create a descriptive message for a change"""
     if change['type'] == 'count_change':
@@ -53,86 +79,16 @@ def create_change_message(change, record):
             f"- Reason: {change.get('description', 'No description provided')}"
         )
 
-def calculate_future_cost(record, changes, year=5):
-    """Calculate future cost for a record based on changes for a specific year"""
-    future_cost = record['total_cost']
-    
-    # Get all changes for this record, sorted by implementation year
-    record_changes = sorted(
-        [c for c in changes if get_base_record_id(record['id']) == str(c['record_id'])],
-        key=lambda x: x['implementation_year']
-    )
-    
-    # Apply changes sequentially up to the specified year
-    for change in record_changes:
-        if change['implementation_year'] <= year:
-            if change['type'] == 'count_change':
-                if record['category'] == 'Resource':
-                    future_cost = (change['to'] * record['unit_cost']) if record['unit_cost'] is not None else 0
-            elif change['type'] == 'location_change':
-                if record['category'] == 'Resource':
-                    # Use internal business name for assumptions lookup
-                    business_internal = record['business']  # This is already the internal name
-                    new_unit_cost = st.session_state.assumptions[business_internal][change['to']]
-                    future_cost = (record['count'] * new_unit_cost) if record['count'] is not None else future_cost
-            elif change['type'] == 'cost_change':
-                future_cost = change['to']
-    
-    # If all functions are "Unassigned", maintain the cost but mark it for reallocation
-    if record['functions'] == ['Unassigned']:
-        record['needs_reallocation'] = True
-    
-    return future_cost
-
-def create_summary_metrics(records, changes):
-    """Calculate summary metrics for all businesses over 5 years"""
-    # Calculate current total cost over 5 years
-    total_current = sum(r['total_cost'] * 5 for r in records)
-    
-    # Calculate future total by applying all changes and considering yearly costs
-    total_future = 0
-    for record in records:
-        # Calculate costs for each year (0-5) and sum them
-        yearly_costs = []
-        for year in range(1, 6):  # Years 1-5
-            future_cost = calculate_future_cost(record, changes, year)
-            # If the record needs reallocation, mark it in the yearly costs
-            if record.get('needs_reallocation'):
-                future_cost = future_cost  # Keep the cost but it's marked for reallocation
-            yearly_costs.append(future_cost)
-        total_future += sum(yearly_costs)
+@timed
+def create_summary_metrics(baseline, projection):
+    """Calculate summary metrics over 5 years from the per-year baseline and projected totals"""
+    # Yearly costs without any changes vs the projected yearly costs
+    total_current = baseline[1:].sum()
+    total_future = projection[1:].sum()
     
     total_savings = total_current - total_future
     return total_current, total_future, total_savings
 
-def calculate_change_impact(record, change):
-    """Calculate the 5-year impact of a change"""
-    if change['type'] == 'count_change':
-        if record['category'] == 'Resource':
-            old_annual_cost = record['total_cost']
-            new_annual_cost = (change['to'] * record['unit_cost']) if record['unit_cost'] is not None else 0
-        else:
-            old_annual_cost = record['total_cost']
-            new_annual_cost = record['total_cost']  # No impact for technology records
-    elif change['type'] == 'location_change':
-        old_annual_cost = record['total_cost']
-        # Use assumptions for new location cost
-        new_unit_cost = st.session_state.assumptions[record['business']][change['to']]
-        old_unit_cost = st.session_state.assumptions[record['business']][change['from']]
-        new_annual_cost = (record['count'] * new_unit_cost) if record['count'] is not None else record['total_cost']
-    elif change['type'] == 'cost_change':
-        old_annual_cost = record['total_cost']
-        new_annual_cost = change['to']
-    else:
-        return 0
-    
-    # Calculate impact considering implementation year
-    annual_savings = old_annual_cost - new_annual_cost
-    years_affected = 5 - change['implementation_year'] + 1
-    total_impact = annual_savings * years_affected
-    
-    return total_impact
-
 # Add business selector at the top
 business_options = ["All Businesses"] + [
     st.session_state.business_names[b] for b in ['Business A', 'Business B']
@@ -145,10 +101,14 @@ selected_business_view = st.selectbox(
 # Access session state from main app
 if 'records' in st.session_state and 'changes' in st.session_state:
     records = st.session_state.records
-    changes = st.session_state.changes
+    # Changes are matched to their record by id, or by the base part of a legacy
+    # timestamped id, exactly as the projections match them
+    records_by_id = {key: records[i] for key, i in record_positions(records).items()}
+    changes = [c for c in st.session_state.changes if str(c['record_id']) in records_by_id]
     
     if records:
         # Modify the data filtering based on business selection
+        internal_business_name = None
         if selected_business_view != "All Businesses":
             # Map display name back to internal name
             internal_business_name = next(
@@ -157,16 +117,8 @@ if 'records' in st.session_state and 'changes' in st.session_state:
             )
             # Filter records
             records = [r for r in records if r['business'] == internal_business_name]
-            # Filter changes using base record ID
-            changes = [c for c in changes if next(
-                (r for r in st.session_state.records 
-                 if get_base_record_id(r['id']) == str(c['record_id'])),
-                None
-            ) is not None and next(
-                (r for r in st.session_state.records 
-                 if get_base_record_id(r['id']) == str(c['record_id'])),
-                None
-            )['business'] == internal_business_name]
+            # Filter changes by the business of their record
+            changes = [c for c in changes if records_by_id[str(c['record_id'])]['business'] == internal_business_name]
         
         # When displaying business names in the interface, map internal names to display names
         def get_display_name(internal_name):
@@ -175,7 +127,23 @@ if 'records' in st.session_state and 'changes' in st.session_state:
         # Create three columns for high-level metrics with detailed breakdowns
         col1, col2, col3 = st.columns(3)
         
-        total_current, total_future, total_savings = create_summary_metrics(records, changes)
+        # Metrics and charts are slices of the cost cube (None selects every business);
+        # the per-record rows below come from the projections it keeps
+        lap("Projections")
+        cube = session_cube()
+        projection = cube.record_values(records, 'projected')
+        baseline = cube.record_values(records, 'baseline')
+        current = baseline[:, 0].tolist()
+        final_costs = projection[:, PROJECTION_YEARS].tolist()
+        
+        missing_fx = unknown_currencies(item_currencies(records), st.session_state.fx_rates)
+        if missing_fx:
+            st.warning(f"No FX rate for {', '.join(missing_fx)}; those costs are shown unconverted.")
+        
+        lap("Summary metrics")
+        total_current, total_future, total_savings = create_summary_metrics(
+            cube.total('baseline', internal_business_name), cube.total('projected', internal_business_name)
+        )
         
         # Current Cost Details
         with col1:
@@ -186,28 +154,31 @@ if 'records' in st.session_state and 'changes' in st.session_state:
             with st.expander("View Details", expanded=False):
                 # Resource costs by function
                 st.write("**Resource Costs by Function:**")
+                resource_costs = cube.by_function(
+                    'baseline', st.session_state.FUNCTIONS, 0, internal_business_name, 'Resource'
+                )
+                resource_counts = cube.by_function(
+                    'count', st.session_state.FUNCTIONS, 0, internal_business_name, 'Resource'
+                )
                 for function in st.session_state.FUNCTIONS:
-                    resource_cost = sum(r['total_cost'] for r in records 
-                                      if r['category'] == 'Resource' 
-                                      and function in r['functions'])
-                    if resource_cost > 0:
-                        st.write(f"{function}: ${resource_cost:,.2f}")
+                    if resource_costs[function] > 0:
+                        st.write(f"{function}: ${resource_costs[function]:,.2f}")
                         # Show resource count
-                        resource_count = sum(r['count'] for r in records 
-                                           if r['category'] == 'Resource' 
-                                           and function in r['functions'])
-                        st.caption(f"Resource Count: {resource_count}")
+                        st.caption(f"Resource Count: {round(resource_counts[function])}")
                 
                 st.divider()
                 
                 # Technology costs by function
                 st.write("**Technology Costs by Function:**")
                 for function in st.session_state.FUNCTIONS:
-                    tech_records = [r for r in records 
+                    tech_records = [(r, cost) for r, cost in zip(records, current)
                                   if r['category'] == 'Technology' 
                                   and function in r['functions']]
-                    for record in tech_records:
-                        st.write(f"{record['tech_name']}: ${record['total_cost']:,.2f}")
+                    # Only the largest are listed, so big portfolios stay quick to render
+                    tech_records.sort(key=lambda item: item[1], reverse=True)
+                    for record, current_cost in tech_records[:DETAIL_ITEMS]:
+                        st.write(f"{record['tech_name']}: ${current_cost:,.2f}")
+                    show_remaining(DETAIL_ITEMS, len(tech_records))
         
         # Future Cost Details
         with col2:
@@ -218,36 +189,34 @@ if 'records' in st.session_state and 'changes' in st.session_state:
             with st.expander("View Details", expanded=False):
                 # Resource costs by function
                 st.write("**Resource Costs:**")
+                future_resource_costs = cube.by_function(
+                    'projected', st.session_state.FUNCTIONS, PROJECTION_YEARS, internal_business_name, 'Resource'
+                )
                 for function in st.session_state.FUNCTIONS:
-                    future_resource_cost = sum(calculate_future_cost(r, changes) 
-                                            for r in records 
-                                            if r['category'] == 'Resource' 
-                                            and function in r['functions'])
+                    future_resource_cost = future_resource_costs[function]
                     if future_resource_cost > 0:
                         st.write(f"{function}: ${future_resource_cost:,.2f}")
                         # Show changes inline instead of in nested expander
                         changes_for_function = [
                             c for c in changes 
-                            if function in next(
-                                (r for r in records if get_base_record_id(r['id']) == str(c['record_id'])),
-                                {'functions': []}
-                            )['functions']
+                            if function in records_by_id[str(c['record_id'])]['functions']
                         ]
                         if changes_for_function:
                             st.markdown("*Changes:*")
-                            for change in changes_for_function:
+                            for change in changes_for_function[:DETAIL_ITEMS]:
                                 st.markdown(f"• {change['description']} (Year {change['implementation_year']})")
+                            show_remaining(DETAIL_ITEMS, len(changes_for_function))
                 
                 st.divider()
                 
                 # Technology costs by function
                 st.write("**Technology Costs:**")
                 for function in st.session_state.FUNCTIONS:
-                    tech_records = [r for r in records 
+                    tech_records = [(r, cost) for r, cost in zip(records, final_costs)
                                   if r['category'] == 'Technology' 
                                   and function in r['functions']]
-                    for record in tech_records:
-                        future_cost = calculate_future_cost(record, changes)
+                    tech_records.sort(key=lambda item: item[1], reverse=True)
+                    for record, future_cost in tech_records[:DETAIL_ITEMS]:
                         st.write(f"{record['tech_name']}: ${future_cost:,.2f}")
                         # Show changes inline
                         changes_for_tech = [c for c in changes if c['record_id'] == record['id']]
@@ -255,6 +224,7 @@ if 'records' in st.session_state and 'changes' in st.session_state:
                             st.markdown("*Changes:*")
                             for change in changes_for_tech:
                                 st.markdown(f"• {change['description']} (Year {change['implementation_year']})")
+                    show_remaining(DETAIL_ITEMS, len(tech_records))
         
         with col3:
             st.metric(
@@ -273,60 +243,21 @@ if 'records' in st.session_state and 'changes' in st.session_state:
         )
         
         # Charts with better colors
+        lap("Charts")
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Unit Count by Function")
-            # Create data for pie chart based on selected state
-            function_counts = {}
-            
-            if state_toggle == "Current State":
-                for record in records:
-                    if record['category'] == 'Resource':
-                        # If record has multiple functions, count it as "Multiple Functions"
-                        if len(record['functions']) > 1:
-                            function_counts["Multiple Functions"] = function_counts.get("Multiple Functions", 0) + (record['count'] or 0)
-                        else:
-                            # Single function case
-                            func = record['functions'][0]
-                            function_counts[func] = function_counts.get(func, 0) + (record['count'] or 0)
-            else:  # Future State
-                for record in records:
-                    if record['category'] == 'Resource':
-                        record_changes = [c for c in changes if c['record_id'] == record['id'] and c['type'] == 'count_change']
-                        if record_changes:
-                            latest_change = max(record_changes, key=lambda x: x['implementation_year'])
-                            count = latest_change['to']
-                        else:
-                            count = record['count']
-                        
-                        # If record has multiple functions, count it as "Multiple Functions"
-                        if len(record['functions']) > 1:
-                            function_counts["Multiple Functions"] = function_counts.get("Multiple Functions", 0) + (count or 0)
-                        else:
-                            # Single function case
-                            func = record['functions'][0]
-                            function_counts[func] = function_counts.get(func, 0) + (count or 0)
+            # Headcount now, or after the last projected year's count changes; records
+            # with several functions are counted as "Multiple Functions"
+            year = 0 if state_toggle == "Current State" else PROJECTION_YEARS
+            function_counts = {
+                function: round(count) for function, count in
+                cube.by_function_group('count', year, internal_business_name, 'Resource').items()
+            }
             
             if function_counts:
-                # Update color sequence to include a new color for "Multiple Functions"
-                colors = ['#3498db', '#2ecc71', '#9b59b6', '#e67e22']  # Added orange for Multiple Functions
-                
-                fig = px.pie(
-                    values=list(function_counts.values()),
-                    names=list(function_counts.keys()),
-                    color_discrete_sequence=colors,
-                )
-                # Update to show actual values instead of percentages
-                fig.update_traces(
-                    textinfo='value',
-                    textfont_size=14,
-                )
-                fig.update_layout(
-                    paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
-                    plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot
-                    showlegend=True
-                )
+                fig = function_count_pie(tuple(function_counts.keys()), tuple(function_counts.values()))
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("No resource data available")
@@ -336,24 +267,20 @@ if 'records' in st.session_state and 'changes' in st.session_state:
             
             # Prepare data for bar chart
             function_costs = []
+            if state_toggle == "Current State":
+                measure, year = 'baseline', 0
+            else:  # Future State
+                measure, year = 'projected', PROJECTION_YEARS
+            resource_costs = cube.by_function(
+                measure, st.session_state.FUNCTIONS, year, internal_business_name, 'Resource'
+            )
+            tech_costs = cube.by_function(
+                measure, st.session_state.FUNCTIONS, year, internal_business_name, 'Technology'
+            )
             
             for function in st.session_state.FUNCTIONS:
-                if state_toggle == "Current State":
-                    resource_cost = sum(r['total_cost'] for r in records 
-                                     if function in r['functions'] 
-                                     and r['category'] == 'Resource')
-                    tech_cost = sum(r['total_cost'] for r in records 
-                                  if function in r['functions'] 
-                                  and r['category'] == 'Technology')
-                else:  # Future State
-                    resource_cost = sum(calculate_future_cost(r, changes) 
-                                     for r in records 
-                                     if function in r['functions'] 
-                                     and r['category'] == 'Resource')
-                    tech_cost = sum(calculate_future_cost(r, changes) 
-                                  for r in records 
-                                  if function in r['functions'] 
-                                  and r['category'] == 'Technology')
+                resource_cost = resource_costs[function]
+                tech_cost = tech_costs[function]
                 
                 function_costs.extend([
                     {
@@ -368,38 +295,11 @@ if 'records' in st.session_state and 'changes' in st.session_state:
                     }
                 ])
             
-            # Create DataFrame for visualization
-            df_costs = pd.DataFrame(function_costs)
-            
             # Create stacked bar chart with better colors
-            fig = px.bar(
-                df_costs,
-                x='Function',
-                y='Cost',
-                color='Category',
-                barmode='stack',
-                color_discrete_map={
-                    'Resource': '#3498db',  # Softer blue
-                    'Technology': '#2ecc71'  # Softer green
-                }
-            )
-            
-            # Update layout for dark theme compatibility
-            fig.update_layout(
-                yaxis_title="Total Cost ($)",
-                showlegend=True,
-                paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
-                plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot
-                yaxis=dict(
-                    tickformat="$,.0f",
-                    gridcolor='rgba(128,128,128,0.2)',  # Subtle grid
-                    zerolinecolor='rgba(128,128,128,0.2)'  # Subtle zero line
-                ),
-                xaxis=dict(
-                    gridcolor='rgba(128,128,128,0.2)',  # Subtle grid
-                    zerolinecolor='rgba(128,128,128,0.2)'  # Subtle zero line
-                ),
-                hovermode='x unified'
+            fig = cost_distribution_bar(
+                tuple(c['Function'] for c in function_costs),
+                tuple(c['Category'] for c in function_costs),
+                tuple(c['Cost'] for c in function_costs)
             )
             
             st.plotly_chart(fig, use_container_width=True)
@@ -407,7 +307,16 @@ if 'records' in st.session_state and 'changes' in st.session_state:
         # Add divider before Summary of Changes
         st.divider()
         
+        # Each change projected with and without it against its record's baseline,
+        # in the reporting currency; gives the impacts below and the payback table
+        lap("Change payback")
+        payback = change_payback(
+            records, changes, st.session_state.implementation_costs,
+            st.session_state.assumptions, st.session_state.fx_rates
+        ) if changes else None
+        
         # Summary of Changes (renamed from Recent Changes)
+        lap("Summary of Changes")
         st.header("Summary of Changes")
         if changes:
             # Create tabs for Resource and Technology changes
@@ -417,15 +326,12 @@ if 'records' in st.session_state and 'changes' in st.session_state:
             resource_changes = []
             tech_changes = []
             
-            for change in changes:
-                # More specific record matching using both id and category
-                record = next(
-                    (r for r in st.session_state.records 
-                     if get_base_record_id(r['id']) == str(change['record_id'])),
-                    None
-                )
+            for j, change in enumerate(changes):
+                # Look up the record this change applies to
+                record = records_by_id[str(change['record_id'])]
                 
-                impact = calculate_change_impact(record, change)
+                # Savings over the projection years
+                impact = payback['savings'][j].sum()
                 
                 # Create descriptive message based on change type
                 if change['type'] == 'count_change':
@@ -482,7 +388,7 @@ if 'records' in st.session_state and 'changes' in st.session_state:
             
             # Display Resource Changes
             with change_tab1:
-                for change_info in resource_changes:
+                for change_info in changes_page(resource_changes, "resource_changes_page"):
                     with st.container():
                         col1, col2 = st.columns([3, 1])
                         
@@ -509,13 +415,14 @@ if 'records' in st.session_state and 'changes' in st.session_state:
                                 )
                                 if change_to_remove:
                                     st.session_state.changes.remove(change_to_remove)
+                                    publish_removed_items('changes', [change_to_remove])
                                     st.rerun()
                         
                         st.divider()
             
             # Display Technology Changes
             with change_tab2:
-                for change_info in tech_changes:
+                for change_info in changes_page(tech_changes, "tech_changes_page"):
                     with st.container():
                         col1, col2 = st.columns([3, 1])
                         
@@ -543,6 +450,7 @@ if 'records' in st.session_state and 'changes' in st.session_state:
                                 )
                                 if change_to_remove:
                                     st.session_state.changes.remove(change_to_remove)
+                                    publish_removed_items('changes', [change_to_remove])
                                     st.rerun()
                         
                         st.divider()
@@ -553,18 +461,13 @@ if 'records' in st.session_state and 'changes' in st.session_state:
         st.divider()
         
         # Update the Cost Analysis Table
+        lap("Cost Analysis by Year")
         st.subheader("Cost Analysis by Year")
         if records:
             yearly_analysis = []
             
-            for record in records:
-                yearly_costs = [record['total_cost']]  # Year 0
-                
-                # Calculate costs for years 1-5
-                for year in range(1, 6):
-                    cost = calculate_future_cost(record, changes, year)
-                    yearly_costs.append(cost)
-                
+            # Year 0 is the current cost, years 1-5 the projected costs
+            for record, yearly_costs, baseline_by_year in zip(records, projection.tolist(), baseline.tolist()):
                 # Different name construction for Resource vs Technology
                 if record['category'] == 'Technology':
                     name = f"{record['tech_name']} ({', '.join(record['functions'])})"
@@ -584,131 +487,139 @@ if 'records' in st.session_state and 'changes' in st.session_state:
                     'Year 3': yearly_costs[3],
                     'Year 4': yearly_costs[4],
                     'Year 5': yearly_costs[5],
-                    'Total 5Y Savings': sum(yearly_costs[0] - cost for cost in yearly_costs[1:])
+                    'Total 5Y Savings': sum(baseline_by_year[1:]) - sum(yearly_costs[1:])
                 })
             
             df = pd.DataFrame(yearly_analysis)
             
-            # Create style function for conditional formatting
-            def style_df(df):
-                styles = pd.DataFrame('', index=df.index, columns=df.columns)
-                
-                # For regular cost columns (Year 1-5)
-                for col in ['Year 1', 'Year 2', 'Year 3', 'Year 4', 'Year 5']:
-                    try:
-                        # Get the current cost values for comparison
-                        current_vals = df['Current Cost'].apply(
-                            lambda x: float(x.replace('$', '').replace(',', ''))
-                        )
-                        # Get the values for this year
-                        col_vals = df[col].apply(
-                            lambda x: float(x.replace('$', '').replace(',', ''))
-                        )
-                        
-                        # Add background color for year-over-year changes
-                        styles.loc[col_vals < current_vals, col] = 'background-color: #c6efce; color: #006100'  # Green background
-                        styles.loc[col_vals > current_vals, col] = 'background-color: #ffc7ce; color: #9c0006'  # Red background
-                    except Exception as e:
-                        print(f"Error processing column {col}: {str(e)}")
-                        continue
-                
-                # Special handling for Total 5Y Savings column
-                try:
-                    savings_vals = df['Total 5Y Savings'].apply(
-                        lambda x: float(x.replace('$', '').replace(',', ''))
-                    )
-                    # Apply background colors based on savings
-                    styles.loc[savings_vals > 0, 'Total 5Y Savings'] = 'background-color: #c6efce; color: #006100'  # Green background
-                    styles.loc[savings_vals < 0, 'Total 5Y Savings'] = 'background-color: #ffc7ce; color: #9c0006'  # Red background
-                    # Zero values will keep default formatting
-                except:
-                    pass
-                
-                return styles
-            
-            # Format currency columns
+            # Keep the values numeric; the dollar formatting is applied by the column config
             currency_cols = ['Current Cost', 'Year 1', 'Year 2', 'Year 3', 'Year 4', 'Year 5', 'Total 5Y Savings']
-            for col in currency_cols:
-                df[col] = df[col].apply(lambda x: f"${x:,.2f}")
             
             # Apply styling
-            styled_df = df.style\
-                .apply(style_df, axis=None)\
-                .set_properties(**{
-                    'text-align': 'right',
-                    'padding': '5px 15px'
-                })
+            if len(df) <= MAX_STYLED_ROWS:
+                styled_df = df.style\
+                    .apply(cost_change_styles, axis=None, saving_style=SAVING_CELL, increase_style=INCREASE_CELL)\
+                    .set_properties(**{
+                        'text-align': 'right',
+                        'padding': '5px 15px'
+                    })
+            else:
+                styled_df = df
+                st.caption(f"Savings and increases are colour coded for up to {MAX_STYLED_ROWS:,} records; "
+                           "pick a single business to narrow the table.")
             
-            st.dataframe(styled_df, use_container_width=True)
+            st.dataframe(
+                styled_df,
+                use_container_width=True,
+                column_config=currency_column_config(currency_cols)
+            )
         
         # Add divider before Savings Projection
         st.divider()
         
         # Cost Savings Timeline
+        lap("Savings Projection")
         st.subheader("Savings Projection")
         timeline_data = []
         
-        # Calculate baseline (current) annual cost
-        baseline_annual = sum(r['total_cost'] for r in records)
+        # Savings against the unchanged baseline; year 0 itself has no savings
+        annual_savings = (
+            cube.total('baseline', internal_business_name) - cube.total('projected', internal_business_name)
+        )
+        cumulative_savings = annual_savings.cumsum()
         
-        for year in range(6):  # Years 0-5
-            if year == 0:
-                # Year 0 has no savings
-                annual_savings = 0
-                cumulative_savings = 0
-            else:
-                # Calculate the total cost after changes for this year
-                year_cost = sum(calculate_future_cost(r, changes, year) for r in records)
-                annual_savings = baseline_annual - year_cost
-                # Cumulative savings is the sum of savings up to this year
-                cumulative_savings = sum(
-                    baseline_annual - sum(calculate_future_cost(r, changes, y) for r in records)
-                    for y in range(1, year + 1)
-                )
-            
+        for year in range(PROJECTION_YEARS + 1):  # Years 0-5
             timeline_data.append({
                 'Year': f'Year {year}',
-                'Annual Savings': annual_savings,
-                'Cumulative Savings': cumulative_savings
+                'Annual Savings': float(annual_savings[year]),
+                'Cumulative Savings': float(cumulative_savings[year])
             })
         
         # Create multi-line chart
-        df_timeline = pd.DataFrame(timeline_data)
-        fig = go.Figure()
-        
-        # Add traces with better colors and styling
-        fig.add_trace(go.Scatter(
-            x=df_timeline['Year'],
-            y=df_timeline['Annual Savings'],
-            name='Annual Savings',
-            mode='lines+markers',
-            line=dict(color='#3498db', width=2),
-            marker=dict(size=8)
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=df_timeline['Year'],
-            y=df_timeline['Cumulative Savings'],
-            name='Cumulative Savings',
-            mode='lines+markers',
-            line=dict(color='#2ecc71', width=2),
-            marker=dict(size=8)
-        ))
-        
-        fig.update_layout(
-            title="Projected Savings Over Time",
-            yaxis_title="Savings ($)",
-            hovermode='x unified',
-            yaxis=dict(tickformat="$,.0f"),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            yaxis_gridcolor='rgba(128,128,128,0.2)',
-            xaxis_gridcolor='rgba(128,128,128,0.2)'
+        fig = savings_timeline(
+            tuple(t['Year'] for t in timeline_data),
+            tuple(t['Annual Savings'] for t in timeline_data),
+            tuple(t['Cumulative Savings'] for t in timeline_data)
         )
         
         st.plotly_chart(fig, use_container_width=True)
         
+        # Add divider before Payback
+        st.divider()
+        
+        # Each change against the implementation lines funding it, quickest payback first
+        lap("Payback")
+        st.subheader("Payback by Initiative")
+        if changes:
+            initiatives = []
+            for change in changes:
+                record = records_by_id[str(change['record_id'])]
+                if record['category'] == 'Technology':
+                    name = record['tech_name']
+                else:
+                    name = f"{', '.join(record['functions'])} Team"
+                initiatives.append(f"{name}: {change.get('description') or change['type']}")
+            
+            payback_df = pd.DataFrame({
+                'Initiative': initiatives,
+                'Business': [get_display_name(records_by_id[str(c['record_id'])]['business']) for c in changes],
+                'Year': [c['implementation_year'] for c in changes],
+                'Implementation Cost': payback['implementation'].sum(axis=1),
+                'Total 5Y Savings': payback['savings'].sum(axis=1),
+                'Net Savings': payback['cumulative'][:, -1],
+                'ROI (%)': payback['roi'] * 100,
+                'Break-even Year': pd.Series(payback['break_even_year']).where(payback['break_even_year'] > 0),
+                'Payback (years)': payback['payback_years'],
+            })
+            ranking = payback_df.sort_values(
+                ['Payback (years)', 'Net Savings'], ascending=[True, False], na_position='last'
+            )
+            
+            st.dataframe(
+                ranking,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    **currency_column_config(['Implementation Cost', 'Total 5Y Savings', 'Net Savings']),
+                    'ROI (%)': st.column_config.NumberColumn(format="%.0f%%"),
+                    'Break-even Year': st.column_config.NumberColumn(format="%d"),
+                    'Payback (years)': st.column_config.NumberColumn(format="%.1f"),
+                }
+            )
+            
+            unlinked = sum(
+                cost.sum() for business, cost in payback['unlinked'].items()
+                if internal_business_name in (None, business)
+            )
+            if unlinked:
+                st.caption(
+                    f"${unlinked:,.0f} of implementation cost is not linked to a change and is left out; "
+                    "pick the change each line funds on the Implementation page."
+                )
+            unpriced = sum(
+                lines for business, lines in payback['unpriced'].items()
+                if internal_business_name in (None, business)
+            )
+            if unpriced:
+                st.caption(
+                    f"{unpriced:,} implementation line{'s' if unpriced != 1 else ''} of businesses without "
+                    "cost assumptions have no salary and cannot be priced; they are left out."
+                )
+            
+            # Cash flow curves of the quickest paybacks, starting from nothing spent in year 0
+            top = ranking.index[:PAYBACK_CURVES]
+            fig = payback_curves(
+                tuple(payback_df.loc[top, 'Initiative']),
+                tuple(f'Year {year}' for year in range(PROJECTION_YEARS + 1)),
+                tuple((0.0,) + tuple(payback['cumulative'][i].tolist()) for i in top)
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No changes recorded yet")
+        
     else:
         st.info("No data available. Please add some records in the main application.")
 else:
-    st.warning("Please add some records in the main application first.") 
\ No newline at end of file
+    st.warning("Please add some records in the main application first.") 
+
+render_timing_panel()
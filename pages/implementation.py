@@ -1,21 +1,42 @@
+import copy
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from utils import create_change_message
-from session_state import init_session_state, IMPLEMENTATION_TYPES
+from utils import calculate_implementation_costs, create_change_message
+from session_state import init_session_state, change_labels, IMPLEMENTATION_TYPES
+from cost_model import REPORTING_CURRENCY, change_key, line_currency, record_positions
+from portfolio_store import sync_shared_portfolio, publish
+from timing import begin_rerun, lap, render_timing_panel, timed
+from session_memory import compact_session_state
+
+begin_rerun('implementation')
 
 # Initialize session state
+lap("Session sync")
 init_session_state()
+sync_shared_portfolio()
+compact_session_state()
+
+# Changes listed per category in the change summary; the rest are counted
+SUMMARY_CHANGES = 20
+
+def show_remaining(shown, total):
+    """Note the items left out of a capped list"""
+    if total > shown:
+        st.caption(f"... and {total - shown:,} more; the dashboard lists every change")
 
 def delete_implementation_entry(business, record_id, timestamp, impl_type):
     """Delete a specific implementation row"""
     change_key = f"{business}_{record_id}_{timestamp}"
-    if change_key in st.session_state.implementation_costs:
-        if impl_type in st.session_state.implementation_costs[change_key]['resources']:
-            del st.session_state.implementation_costs[change_key]['resources'][impl_type]
+    entry = st.session_state.implementation_costs.get(change_key)
+    if entry is not None:
+        if impl_type in entry['resources']:
+            # Entries may be shared with other sessions, so the row is dropped from a copy
+            resources = {t: d for t, d in entry['resources'].items() if t != impl_type}
+            st.session_state.implementation_costs[change_key] = {**entry, 'resources': resources}
             
             # If no more implementation types, remove the entire record
-            if not st.session_state.implementation_costs[change_key]['resources']:
+            if not resources:
                 del st.session_state.implementation_costs[change_key]
                 st.session_state.records = [r for r in st.session_state.records if r['id'] != record_id]
                 st.session_state.changes = [c for c in st.session_state.changes if c['record_id'] != record_id]
@@ -24,6 +45,7 @@ def delete_implementation_entry(business, record_id, timestamp, impl_type):
     st.session_state.last_modified = datetime.now()
     st.rerun()
 
+@timed
 def create_editable_table(business, category):
     """Create an editable table with default rows for each implementation type"""
     # Get table data from session state or create default if not exists
@@ -38,6 +60,8 @@ def create_editable_table(business, category):
             row = {
                 'Description': 'No description added',  # Default description
                 'Implementation Type': impl_type,
+                'Change': None,
+                'Currency': REPORTING_CURRENCY,
             }
             
             if category == "Resource":
@@ -53,6 +77,8 @@ def create_editable_table(business, category):
         empty_row = {
             'Description': 'No description added',  # Default description for new row
             'Implementation Type': IMPLEMENTATION_TYPES[category][0],
+            'Change': None,
+            'Currency': REPORTING_CURRENCY,
             **({'Salary': 0} if category == "Resource" else {}),
             **{f'Year {i+1}': 0 for i in range(5)}
         }
@@ -63,23 +89,44 @@ def create_editable_table(business, category):
     
     return st.session_state[table_key]
 
-def handle_edited_table(edited_df, business, category):
-    """Handle changes to the editable table"""
-    # Update the stored table data
-    table_key = f"{business}_{category}_table"
-    st.session_state[table_key] = edited_df
+@timed
+def handle_edited_table(table_df, edited_df, editor_state, business, category):
+    """
+    Apply a data editor delta to the implementation costs.
+
+    Only the rows listed in the editor's edited/added/deleted deltas touch
+    `implementation_costs`; entries are keyed by the row's index label, which
+    stays stable across deletions. Returns True when anything changed.
+    """
+    edited_rows = editor_state.get('edited_rows', {})
+    added_rows = editor_state.get('added_rows', [])
+    deleted_rows = editor_state.get('deleted_rows', [])
+    if not (edited_rows or added_rows or deleted_rows):
+        return False
     
-    # Clear existing implementation costs for this business and category
-    keys_to_remove = []
-    for key in st.session_state.implementation_costs:
-        if key.startswith(f"{business}_") and any(impl_type in key for impl_type in IMPLEMENTATION_TYPES[category]):
-            keys_to_remove.append(key)
+    # Delta positions refer to rows of the table the editor was given
+    touched = [table_df.index[int(pos)] for pos in list(edited_rows) + list(deleted_rows)]
     
-    for key in keys_to_remove:
-        del st.session_state.implementation_costs[key]
+    # Drop the entries the touched rows produced before they were edited
+    changed_keys = set()
+    for idx in touched:
+        impl_type = table_df.at[idx, 'Implementation Type']
+        change_key = f"{business}_{impl_type}_{idx}"
+        entry = st.session_state.implementation_costs.get(change_key)
+        if entry is not None:
+            changed_keys.add(change_key)
+            # Entries may be shared with other sessions, so they are replaced, never edited
+            resources = {t: d for t, d in entry['resources'].items() if t != impl_type}
+            if resources:
+                st.session_state.implementation_costs[change_key] = {**entry, 'resources': resources}
+            else:
+                del st.session_state.implementation_costs[change_key]
     
-    # Add new implementation costs
-    for idx, row in edited_df.iterrows():
+    # Write the surviving edited rows and the newly added ones
+    new_rows = [idx for idx in edited_df.index if idx not in table_df.index]
+    for idx in [i for i in touched if i in edited_df.index] + new_rows:
+        row = edited_df.loc[idx]
+        
         # Skip empty or invalid rows
         if pd.isna(row.get('Implementation Type')):
             continue
@@ -96,6 +143,11 @@ def handle_edited_table(edited_df, business, category):
             except (ValueError, TypeError):
                 yearly_values.append(0)
         
+        # Amounts are entered in the row's currency
+        currency = row.get('Currency')
+        if pd.isna(currency) or not str(currency).strip():
+            currency = REPORTING_CURRENCY
+        
         # Handle salary
         try:
             salary = float(row.get('Salary', 0)) if category == "Resource" else None
@@ -104,49 +156,112 @@ def handle_edited_table(edited_df, business, category):
         except (ValueError, TypeError):
             salary = None
         
+        # Lines priced from the Implementation assumption are in the reporting currency
+        currency = line_currency(impl_type, {'salary': salary, 'currency': currency})
+        
+        # Key of the change this line funds, if one was picked
+        funded_change = row.get('Change')
+        if pd.isna(funded_change) or not funded_change:
+            funded_change = None
+        
         # Create unique key for this entry
         change_key = f"{business}_{impl_type}_{idx}"
         
         # Only add non-zero entries or entries with descriptions
         if any(v != 0 for v in yearly_values) or description.strip():
-            if change_key not in st.session_state.implementation_costs:
-                st.session_state.implementation_costs[change_key] = {'resources': {}}
-            
-            st.session_state.implementation_costs[change_key]['resources'][impl_type] = {
-                'values': yearly_values,
-                'salary': salary,
-                'description': description
-            }
+            entry = st.session_state.implementation_costs.get(change_key, {'resources': {}})
+            st.session_state.implementation_costs[change_key] = {**entry, 'resources': {
+                **entry['resources'],
+                impl_type: {
+                    'values': yearly_values,
+                    'salary': salary,
+                    'description': description,
+                    'currency': currency,
+                    'change': funded_change
+                }
+            }}
+            changed_keys.add(change_key)
+    
+    # Share the touched entries with other sessions
+    costs = st.session_state.implementation_costs
+    publish(
+        'implementation_costs',
+        {key: costs[key] for key in changed_keys if key in costs},
+        [key for key in changed_keys if key not in costs]
+    )
+    
+    # Update the stored table data
+    st.session_state[f"{business}_{category}_table"] = edited_df
     
     # Force update of last_modified to trigger recalculation
     st.session_state.last_modified = datetime.now()
+    return True
+
+@st.fragment
+def render_implementation_table(business_internal, category):
+    """
+    Render one implementation table editor.
 
-def calculate_total_costs(business_internal):
-    """Calculate total implementation costs for a business"""
-    total_by_type = {impl_type: [0] * 5 for impl_type in 
-                     IMPLEMENTATION_TYPES["Resource"] + IMPLEMENTATION_TYPES["Technology"]}
+    Runs as a fragment so typing in the table only reruns this editor; the
+    whole page reruns once an edit is committed so the cost summary updates.
+    """
+    table_df = create_editable_table(business_internal, category)
+    editor_key = f"{'resource' if category == 'Resource' else 'tech'}_table_{business_internal}"
     
-    for change_key, data in st.session_state.implementation_costs.items():
-        if change_key.startswith(business_internal):
-            for impl_type, impl_data in data['resources'].items():
-                if isinstance(impl_data, dict):
-                    values = impl_data.get('values', [0] * 5)
-                    salary = impl_data.get('salary')
-                    
-                    # For resources, multiply count by salary or assumption cost
-                    if impl_type in IMPLEMENTATION_TYPES["Resource"]:
-                        # Fix salary comparison
-                        cost_per_resource = salary if salary is not None and float(salary) > 0 else \
-                            st.session_state.assumptions[business_internal]['Implementation'][impl_type]
-                        for year in range(5):
-                            total_by_type[impl_type][year] += float(values[year]) * float(cost_per_resource)
-                    
-                    # For technology, use direct costs
-                    elif impl_type in IMPLEMENTATION_TYPES["Technology"]:
-                        for year in range(5):
-                            total_by_type[impl_type][year] += float(values[year])
+    # Lines can fund a change of this business's records. The table holds change
+    # keys and shows their labels, so a label that changes never unlinks a line
+    labels = change_labels(st.session_state.records, st.session_state.changes)
+    business_ids = {r['id'] for r in st.session_state.records if r['business'] == business_internal}
+    change_options = [change_key(c) for c in st.session_state.changes if c['record_id'] in business_ids]
+    # Keys of changes removed since the line was linked stay selectable so the cell shows them
+    linked = [k for k in table_df['Change'].dropna().unique() if k not in labels] if 'Change' in table_df else []
     
-    return total_by_type
+    edited_df = st.data_editor(
+        table_df,
+        hide_index=True,
+        num_rows="dynamic",
+        column_config={
+            "Description": st.column_config.TextColumn(
+                "Description",
+                help="Enter description",
+                width="medium",
+            ),
+            "Implementation Type": st.column_config.SelectboxColumn(
+                "Implementation Type",
+                help="Select implementation type",
+                width="medium",
+                options=IMPLEMENTATION_TYPES[category]
+            ),
+            "Change": st.column_config.SelectboxColumn(
+                "Funds Change",
+                help="Change this implementation cost pays for, used for its payback",
+                width="large",
+                options=change_options + linked,
+                format_func=lambda key: labels.get(key, f"Removed change ({key})")
+            ),
+            "Currency": st.column_config.SelectboxColumn(
+                "Currency",
+                help=(
+                    f"Currency the salary is entered in; lines without a salary are priced in {REPORTING_CURRENCY}"
+                    if category == "Resource" else "Currency the yearly amounts are entered in"
+                ),
+                options=[REPORTING_CURRENCY] + list(st.session_state.fx_rates),
+                default=REPORTING_CURRENCY
+            )
+        },
+        key=editor_key
+    )
+    
+    # Handle table edits. The last applied delta is remembered so an editor whose
+    # identity survives the rerun does not apply the same edits again.
+    editor_state = st.session_state[editor_key]
+    applied_key = f"{editor_key}_applied"
+    if not any(editor_state.values()):
+        st.session_state.pop(applied_key, None)
+    elif editor_state != st.session_state.get(applied_key):
+        if handle_edited_table(table_df, edited_df, editor_state, business_internal, category):
+            st.session_state[applied_key] = copy.deepcopy(editor_state)
+            st.rerun()
 
 def main():
     st.title("Implementation Planning")
@@ -158,15 +273,17 @@ def main():
         for business_internal, business_display in st.session_state.business_names.items():
             st.header(business_display)
             
+            lap("Change summaries")
             with st.expander("View Change Summary"):
                 resource_changes = []
                 tech_changes = []
                 
+                # Changes are matched to their record by id, as the projections do
+                positions = record_positions(st.session_state.records)
                 for change in st.session_state.changes:
-                    record = next((r for r in st.session_state.records 
-                                 if r['id'] == change['record_id'] and 
-                                 r['business'] == business_internal), None)
-                    if record:
+                    position = positions.get(str(change['record_id']))
+                    record = st.session_state.records[position] if position is not None else None
+                    if record and record['business'] == business_internal:
                         if record['category'] == "Resource":
                             resource_changes.append((change, record))
                         else:
@@ -174,86 +291,43 @@ def main():
                 
                 if resource_changes:
                     st.markdown("##### Resource Changes")
-                    for change, record in resource_changes:
+                    for change, record in resource_changes[:SUMMARY_CHANGES]:
                         st.markdown(f"**{', '.join(record['functions'])}**")
                         st.markdown(create_change_message(change, record))
                         st.divider()
+                    show_remaining(SUMMARY_CHANGES, len(resource_changes))
                 
                 if tech_changes:
                     st.markdown("##### Technology Changes")
-                    for change, record in tech_changes:
+                    for change, record in tech_changes[:SUMMARY_CHANGES]:
                         st.markdown(f"**{record['tech_name']}**")
                         st.markdown(create_change_message(change, record))
                         st.divider()
+                    show_remaining(SUMMARY_CHANGES, len(tech_changes))
                 
                 if not resource_changes and not tech_changes:
                     st.info("No changes recorded for this business")
             
             # Resource Implementation Table
+            lap("Implementation tables")
             st.subheader("Resource Implementation")
-            
-            resource_df = create_editable_table(business_internal, "Resource")
-            
-            edited_df = st.data_editor(
-                resource_df,
-                hide_index=True,
-                num_rows="dynamic",
-                column_config={
-                    "Description": st.column_config.TextColumn(
-                        "Description",
-                        help="Enter description",
-                        width="medium",
-                    ),
-                    "Implementation Type": st.column_config.SelectboxColumn(
-                        "Implementation Type",
-                        help="Select implementation type",
-                        width="medium",
-                        options=IMPLEMENTATION_TYPES["Resource"]
-                    )
-                },
-                key=f"resource_table_{business_internal}"
-            )
-            
-            # Handle table edits
-            handle_edited_table(edited_df, business_internal, "Resource")
+            render_implementation_table(business_internal, "Resource")
             
             # Technology Implementation Table
             st.subheader("Technology Implementation")
-            
-            tech_df = create_editable_table(business_internal, "Technology")
-            
-            edited_df = st.data_editor(
-                tech_df,
-                hide_index=True,
-                num_rows="dynamic",
-                column_config={
-                    "Description": st.column_config.TextColumn(
-                        "Description",
-                        help="Enter description",
-                        width="medium",
-                    ),
-                    "Implementation Type": st.column_config.SelectboxColumn(
-                        "Implementation Type",
-                        help="Select implementation type",
-                        width="medium",
-                        options=IMPLEMENTATION_TYPES["Technology"]
-                    )
-                },
-                key=f"tech_table_{business_internal}"
-            )
-            
-            # Handle table edits
-            handle_edited_table(edited_df, business_internal, "Technology")
+            render_implementation_table(business_internal, "Technology")
             
             st.divider()
     
     with tab2:
+        lap("Cost summary")
         st.header("Implementation Cost Summary")
         
         for business_internal, business_display in st.session_state.business_names.items():
             st.subheader(business_display)
             
-            total_by_type = calculate_total_costs(business_internal)
+            # {category: {implementation type: yearly costs}} in the reporting currency
+            costs_by_type = calculate_implementation_costs(business_internal)
             
             # Create summary tables
             resource_summary = []
@@ -264,10 +338,10 @@ def main():
             resource_df = pd.DataFrame([
                 {
                     'Implementation Type': impl_type,
-                    **{f'Year {i+1}': f'${cost:,.2f}' for i, cost in enumerate(total_by_type[impl_type])},
-                    'Total': f'${sum(total_by_type[impl_type]):,.2f}'
+                    **{f'Year {i+1}': f'${cost:,.2f}' for i, cost in enumerate(costs)},
+                    'Total': f'${sum(costs):,.2f}'
                 }
-                for impl_type in IMPLEMENTATION_TYPES["Resource"]
+                for impl_type, costs in costs_by_type["Resource"].items()
             ])
             st.dataframe(resource_df, hide_index=True, use_container_width=True)
             
@@ -276,18 +350,20 @@ def main():
             tech_df = pd.DataFrame([
                 {
                     'Implementation Type': impl_type,
-                    **{f'Year {i+1}': f'${cost:,.2f}' for i, cost in enumerate(total_by_type[impl_type])},
-                    'Total': f'${sum(total_by_type[impl_type]):,.2f}'
+                    **{f'Year {i+1}': f'${cost:,.2f}' for i, cost in enumerate(costs)},
+                    'Total': f'${sum(costs):,.2f}'
                 }
-                for impl_type in IMPLEMENTATION_TYPES["Technology"]
+                for impl_type, costs in costs_by_type["Technology"].items()
             ])
             st.dataframe(tech_df, hide_index=True, use_container_width=True)
             
             # Display total implementation cost
-            total_cost = sum(sum(costs) for costs in total_by_type.values())
+            total_cost = sum(sum(costs) for category in costs_by_type.values() for costs in category.values())
             st.metric("Total Implementation Cost", f"${total_cost:,.2f}")
             
             st.divider()
+    
+    render_timing_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
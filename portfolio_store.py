@@ -0,0 +1,291 @@
+import copy
+import threading
+import uuid
+from collections import deque
+
+import streamlit as st
+
+from cost_cube import invalidate_cost_cube, note_portfolio_edits
+from cost_model import change_key
+from record_import import assign_unique_ids
+from session_state import rebuild_implementation_tables
+
+# Portfolio entity kinds shared between sessions; records and changes are lists
+# in session state, implementation costs a dict keyed by entry key
+KINDS = ('records', 'changes', 'implementation_costs')
+
+# Marker returned by updates_since when a session has to reload everything
+FULL_RELOAD = 'full'
+
+
+class VersionConflict(Exception):
+    """Raised when a write is based on an entity version that is no longer current"""
+
+    def __init__(self, kind, keys):
+        super().__init__(f"{len(keys)} {kind} changed since they were read")
+        self.kind = kind
+        self.keys = keys
+
+
+def entity_key(kind, item):
+    """Stable key of a record or change within its kind"""
+    if kind == 'records':
+        return str(item['id'])
+    return change_key(item)
+
+
+class PortfolioStore:
+    """
+    Process-wide portfolio shared by every session.
+
+    Every entity carries a version that is bumped on each write. Writers pass
+    the versions they read, and a write based on a stale version is rejected
+    (optimistic concurrency) instead of silently overwriting another user's edit.
+    A bounded log of written keys lets sessions pull only what changed.
+
+    Stored entities are never modified: a write replaces them with a copy of the
+    written value. Sessions therefore get references to them rather than copies,
+    and must treat them as read-only, copying an entity before editing it.
+    """
+
+    def __init__(self, log_size=10000):
+        self._lock = threading.RLock()
+        self._items = {kind: {} for kind in KINDS}
+        self._versions = {kind: {} for kind in KINDS}
+        self._log = deque(maxlen=log_size)
+        self.revision = 0
+
+    def snapshot(self):
+        """Return (revision, items, versions) of the whole portfolio; items are shared and read-only"""
+        with self._lock:
+            return (
+                self.revision,
+                {kind: dict(items) for kind, items in self._items.items()},
+                {kind: dict(versions) for kind, versions in self._versions.items()}
+            )
+
+    def commit(self, session, kind, upserts, removals, expected):
+        """
+        Atomically write and remove entities of one kind.
+
+        expected maps every written key to the version the caller read (0 for
+        new entities). Returns (revision, versions of the written keys).
+        """
+        with self._lock:
+            versions = self._versions[kind]
+            keys = list(upserts) + list(removals)
+            conflicts = [key for key in keys if versions.get(key, 0) != expected.get(key, 0)]
+            if conflicts:
+                raise VersionConflict(kind, conflicts)
+
+            self.revision += 1
+            for key, value in upserts.items():
+                self._items[kind][key] = copy.deepcopy(value)
+                versions[key] = versions.get(key, 0) + 1
+                self._log.append((self.revision, session, kind, key))
+            for key in removals:
+                self._items[kind].pop(key, None)
+                versions.pop(key, None)
+                self._log.append((self.revision, session, kind, key))
+            return self.revision, {key: versions.get(key, 0) for key in keys}
+
+    def replace_all(self, session, portfolio):
+        """Replace the whole portfolio, e.g. after loading a workbook; returns (revision, versions)"""
+        with self._lock:
+            self.revision += 1
+            for kind in KINDS:
+                old_versions = self._versions[kind]
+                self._items[kind] = copy.deepcopy(portfolio[kind])
+                # Versions keep counting up so edits based on the old portfolio conflict
+                self._versions[kind] = {key: old_versions.get(key, 0) + 1 for key in self._items[kind]}
+            self._log.append((self.revision, session, None, None))
+            return self.revision, {kind: dict(versions) for kind, versions in self._versions.items()}
+
+    def updates_since(self, revision):
+        """
+        Return (revision, updates) for a session that has seen up to revision.
+
+        updates is None when nothing changed, FULL_RELOAD when the log no longer
+        covers the gap or the portfolio was replaced, and otherwise a list of
+        (session, kind, key, value, version) with value None for removals.
+        Values are shared and read-only.
+        """
+        with self._lock:
+            if revision == self.revision:
+                return self.revision, None
+            if not self._log or self._log[0][0] > revision + 1:
+                return self.revision, FULL_RELOAD
+
+            latest = {}
+            for rev, session, kind, key in self._log:
+                if rev <= revision:
+                    continue
+                if kind is None:
+                    return self.revision, FULL_RELOAD
+                latest[(kind, key)] = session
+            updates = [
+                (session, kind, key, self._items[kind].get(key), self._versions[kind].get(key, 0))
+                for (kind, key), session in latest.items()
+            ]
+            return self.revision, updates
+
+    def current(self, kind, keys):
+        """Return {key: (value, version)} for the given keys; removed entities are (None, 0)"""
+        with self._lock:
+            return {
+                key: (self._items[kind].get(key), self._versions[kind].get(key, 0))
+                for key in keys
+            }
+
+
+@st.cache_resource
+def shared_store():
+    """The portfolio store shared by every session of this server process"""
+    return PortfolioStore()
+
+
+def _session_id():
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex[:8]
+    return st.session_state.session_id
+
+
+def _session_items(kind):
+    """Session entities of a kind as a key -> value dict"""
+    items = st.session_state[kind]
+    if kind == 'implementation_costs':
+        return items
+    return {entity_key(kind, item): item for item in items}
+
+
+def _set_session_items(kind, items):
+    if kind == 'implementation_costs':
+        st.session_state[kind] = items
+    else:
+        st.session_state[kind] = list(items.values())
+
+
+def _load_snapshot(store):
+    """Replace the session portfolio with references to the store's"""
+    revision, items, versions = store.snapshot()
+    for kind in KINDS:
+        _set_session_items(kind, items[kind])
+    rebuild_implementation_tables(st.session_state.implementation_costs)
+    invalidate_cost_cube()
+    st.session_state.entity_versions = versions
+    st.session_state.store_revision = revision
+
+
+def _apply_updates(updates):
+    """Write pulled entities into the session; returns the number of entities changed"""
+    by_kind = {}
+    for _, kind, key, value, version in updates:
+        by_kind.setdefault(kind, {})[key] = (value, version)
+
+    for kind, entries in by_kind.items():
+        items = _session_items(kind)
+        items = dict(items) if kind != 'implementation_costs' else items
+        versions = st.session_state.entity_versions.setdefault(kind, {})
+        for key, (value, version) in entries.items():
+            if value is None:
+                items.pop(key, None)
+                versions.pop(key, None)
+            else:
+                items[key] = value
+                versions[key] = version
+        _set_session_items(kind, items)
+        note_portfolio_edits(kind, entries)
+
+    if 'implementation_costs' in by_kind:
+        rebuild_implementation_tables(st.session_state.implementation_costs)
+    return sum(len(entries) for entries in by_kind.values())
+
+
+def sync_shared_portfolio():
+    """
+    Bring the session up to date with the shared portfolio.
+
+    Cheap when nothing changed: a revision comparison. Otherwise only the
+    entities written since the session's last sync are pulled, and the user is
+    told how many came from other sessions.
+    """
+    store = shared_store()
+    session = _session_id()
+
+    if 'store_revision' not in st.session_state:
+        if store.revision == 0:
+            # The first session seeds the store with whatever it starts with
+            publish_portfolio()
+        else:
+            _load_snapshot(store)
+        return
+
+    revision, updates = store.updates_since(st.session_state.store_revision)
+    if updates is None:
+        return
+    if updates == FULL_RELOAD:
+        _load_snapshot(store)
+        st.toast("The portfolio was reloaded by another user")
+        return
+
+    others = [u for u in updates if u[0] != session]
+    changed = _apply_updates(others)
+    st.session_state.store_revision = revision
+    if changed:
+        st.toast(f"{changed} portfolio update{'s' if changed != 1 else ''} from other users")
+
+
+def publish(kind, upserts=None, removals=()):
+    """
+    Write session edits of one kind to the shared portfolio.
+
+    On a version conflict nothing is written, the conflicting entities are
+    reloaded from the store and the user is warned. Returns True on success.
+    """
+    store = shared_store()
+    upserts = upserts or {}
+    removals = list(removals)
+    if not upserts and not removals:
+        return True
+
+    versions = st.session_state.setdefault('entity_versions', {}).setdefault(kind, {})
+    expected = {key: versions.get(key, 0) for key in list(upserts) + removals}
+    try:
+        _, written = store.commit(_session_id(), kind, upserts, removals, expected)
+    except VersionConflict as e:
+        current = store.current(kind, e.keys)
+        _apply_updates([(None, kind, key, value, version) for key, (value, version) in current.items()])
+        st.warning(
+            f"{len(e.keys)} {kind.replace('_', ' ')} changed by another user since you loaded them; "
+            "your edit was not saved and the latest version is shown"
+        )
+        return False
+
+    for key, version in written.items():
+        if version:
+            versions[key] = version
+        else:
+            versions.pop(key, None)
+    note_portfolio_edits(kind, written)
+    return True
+
+
+def publish_items(kind, items):
+    """Publish new or edited records or changes"""
+    return publish(kind, {entity_key(kind, item): item for item in items})
+
+
+def publish_removed_items(kind, items):
+    """Publish the removal of records or changes"""
+    return publish(kind, removals=[entity_key(kind, item) for item in items])
+
+
+def publish_portfolio():
+    """Replace the shared portfolio with this session's, e.g. after loading a workbook"""
+    store = shared_store()
+    # Records are keyed by id from here on, so repeated ids would drop records
+    assign_unique_ids(st.session_state.records)
+    portfolio = {kind: _session_items(kind) for kind in KINDS}
+    store.replace_all(_session_id(), portfolio)
+    # The store keeps its own copy; the session switches to it rather than keeping a second one
+    _load_snapshot(store)
@@ -0,0 +1,186 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+
+from cost_model import REPORTING_CURRENCY, gather_rates, resource_locations
+from session_state import CATEGORIES
+
+# Record fields that can be filled from an import file, with the headers we recognise for each
+IMPORT_FIELDS = {
+    'business': ['business', 'business unit', 'bu'],
+    'category': ['category', 'record type'],
+    'functions': ['functions', 'function'],
+    'tech_name': ['tech_name', 'tech name', 'technology', 'technology name', 'application'],
+    'location': ['location', 'site', 'delivery center'],
+    'count': ['count', 'headcount', 'fte'],
+    'total_cost': ['total_cost', 'total cost', 'annual cost', 'cost'],
+    'currency': ['currency', 'ccy'],
+    'comments': ['comments', 'comment', 'notes'],
+}
+
+# Separators accepted between function names in a single cell
+FUNCTION_SEPARATORS = r'\s*[;,|]\s*'
+
+
+def read_import_file(name, data):
+    """Read an uploaded CSV or Excel extract into a DataFrame"""
+    if name.lower().endswith('.csv'):
+        return pd.read_csv(io.BytesIO(data))
+    return pd.read_excel(io.BytesIO(data))
+
+
+def guess_column_mapping(columns):
+    """Map each import field to the first source column whose header matches a known alias"""
+    normalized = {str(col).strip().lower().replace('-', ' '): col for col in columns}
+    mapping = {}
+    for field, aliases in IMPORT_FIELDS.items():
+        mapping[field] = next((normalized[a] for a in aliases if a in normalized), None)
+    return mapping
+
+
+def next_record_id(records):
+    """Return the first integer id above every existing record id"""
+    ids = pd.to_numeric(pd.Series([r['id'] for r in records], dtype=object), errors='coerce')
+    return 0 if ids.dropna().empty else int(ids.max()) + 1
+
+
+def assign_unique_ids(records):
+    """
+    Give every record that repeats an earlier record's id a fresh id, in place.
+
+    Renamed records are replaced in the list by copies, as records may be
+    shared with other sessions.
+
+    Older versions numbered new records by list length, so their workbooks hold
+    repeated ids once a record was deleted. The first record with an id keeps
+    it, along with the changes and implementation costs that point at it, as
+    the projections already matched those to the first record.
+    """
+    seen = set()
+    next_id = next_record_id(records)
+    for i, record in enumerate(records):
+        if str(record['id']) in seen:
+            records[i] = record = {**record, 'id': next_id}
+            next_id += 1
+        seen.add(str(record['id']))
+    return records
+
+
+def _case_insensitive_lookup(values, allowed):
+    """Map values onto their canonical spelling in allowed, NaN where there is no match"""
+    canonical = {str(a).lower(): a for a in allowed}
+    return values.astype('string').str.strip().str.lower().map(canonical)
+
+
+def build_import_records(df, mapping, assumptions, business_names, functions, start_id, fx_rates=None):
+    """
+    Validate an import extract and convert it to records in one vectorized pass.
+
+    Returns the list of new records and a DataFrame of row-level errors. Rows with
+    any error are left out of the records list.
+    """
+    n = len(df)
+    index = pd.RangeIndex(n)
+
+    def column(field):
+        source = mapping.get(field)
+        if source is None or source not in df.columns:
+            return pd.Series([pd.NA] * n, index=index, dtype=object)
+        return df[source].reset_index(drop=True)
+
+    errors = []
+
+    def flag(mask, field, message):
+        mask = pd.Series(mask, index=index).fillna(False).astype(bool)
+        if mask.any():
+            errors.append(pd.DataFrame({
+                'Row': index[mask.to_numpy()] + 1,
+                'Field': field,
+                'Error': message,
+            }))
+
+    # Business accepts either the internal or the display name
+    business_lookup = {**{b: b for b in business_names}, **{d: b for b, d in business_names.items()}}
+    business = column('business').astype('string').str.strip().map(business_lookup)
+    flag(business.isna(), 'business', 'Unknown business')
+
+    category = _case_insensitive_lookup(column('category'), CATEGORIES)
+    flag(category.isna(), 'category', f"Category must be one of {', '.join(CATEGORIES)}")
+    is_resource = (category == 'Resource').fillna(False)
+    is_tech = (category == 'Technology').fillna(False)
+
+    # Functions are split into one row per name so they can be checked with a single isin
+    function_lists = (
+        column('functions').fillna('').astype(str).str.strip()
+        .str.split(FUNCTION_SEPARATORS)
+        .apply(lambda names: [f for f in names if f])
+    )
+    exploded = function_lists.explode()
+    unknown = exploded.notna() & ~exploded.isin(functions)
+    flag(function_lists.str.len() == 0, 'functions', 'At least one function is required')
+    flag(unknown.groupby(level=0).any(), 'functions', 'Unknown function')
+
+    locations = resource_locations(assumptions)
+    location = _case_insensitive_lookup(column('location'), locations)
+    flag(is_resource & location.isna(), 'location',
+         f"Location must be one of {', '.join(locations)}")
+
+    count = pd.to_numeric(column('count'), errors='coerce')
+    flag(is_resource & ~((count >= 1) & (count % 1 == 0)), 'count', 'Count must be a whole number of at least 1')
+
+    tech_name = column('tech_name').astype('string').str.strip()
+    flag(is_tech & (tech_name.isna() | (tech_name == '')), 'tech_name', 'Technology name is required')
+
+    tech_cost = pd.to_numeric(column('total_cost'), errors='coerce')
+    flag(is_tech & ~(tech_cost >= 0), 'total_cost', 'Total cost must be a non-negative number')
+
+    # Resource unit cost is a gather from the business x location rate matrix
+    unit_cost = pd.Series(gather_rates(assumptions, business, location)[:, 0], index=index)
+    flag(is_resource & business.notna() & location.notna() & unit_cost.isna(),
+         'location', 'No cost assumption for this business and location')
+
+    # Blank currency means the reporting currency; others need an FX rate. Resource
+    # costs come from the rate table, so those rows are always in the reporting currency
+    currency_values = column('currency').astype('string').str.strip().str.upper().fillna('').replace('', REPORTING_CURRENCY)
+    known_currencies = [REPORTING_CURRENCY] + list(fx_rates or {})
+    flag(is_tech & ~currency_values.isin(known_currencies), 'currency',
+         f"Currency must be one of {', '.join(known_currencies)}")
+    currency_values = currency_values.where(~is_resource, REPORTING_CURRENCY)
+
+    error_df = (
+        pd.concat(errors, ignore_index=True).sort_values('Row', kind='stable').reset_index(drop=True)
+        if errors else pd.DataFrame(columns=['Row', 'Field', 'Error'])
+    )
+    valid = ~pd.Series(index.isin(error_df['Row'] - 1), index=index)
+
+    total_cost = unit_cost.where(is_resource, tech_cost) * count.where(is_resource, 1)
+    comments = column('comments').astype('string').fillna('')
+
+    rows = valid.to_numpy()
+    resource_rows = is_resource[valid].tolist()
+    timestamp = datetime.now().isoformat()
+    records = [
+        {
+            'id': start_id + i,
+            'business': b,
+            'category': c,
+            'functions': funcs,
+            'function_descriptions': {f: '' for f in funcs},
+            'tech_name': None if res else name,
+            'location': loc if res else None,
+            'count': int(cnt) if res else None,
+            'unit_cost': unit if res else None,
+            'total_cost': total,
+            'currency': currency,
+            'comments': comment,
+            'timestamp': timestamp,
+        }
+        for i, (b, c, funcs, name, loc, cnt, unit, total, currency, comment, res) in enumerate(zip(
+            business[rows].tolist(), category[rows].tolist(), function_lists[rows].tolist(),
+            tech_name[rows].tolist(), location[rows].tolist(), count[rows].tolist(),
+            unit_cost[rows].tolist(), total_cost[rows].tolist(), currency_values[rows].tolist(), comments[rows].tolist(),
+            resource_rows
+        ))
+    ]
+    return records, error_df
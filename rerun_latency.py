@@ -0,0 +1,231 @@
+"""
+Rerun-latency regression check for the app pages on large generated portfolios.
+
+Each page is driven headlessly with Streamlit's AppTest through a scripted set
+of typical interactions (switching the business view, applying a change,
+editing an implementation row, ...). The end-to-end time of every rerun is
+recorded, the median over --repeat sessions is compared with the stored
+baseline, and the check fails (exit status 1) when an interaction got slower
+than allowed or, on portfolios up to the default size, took longer than the
+absolute budget.
+
+    python rerun_latency.py                      # check against the baseline
+    python rerun_latency.py --update-baseline    # record a new baseline
+    python rerun_latency.py --records 50000 --pages app.py pages/dashboard.py
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(ROOT, 'rerun_latency_baseline.json')
+
+DEFAULT_RECORDS = 10000
+
+# An interaction fails when it is this much slower than its baseline, and by at
+# least MIN_DELTA seconds so that fast reruns are not failed on noise. Calibrated
+# on 33 sessions per page at 10k records: single reruns vary by up to 0.3 s, and
+# medians of MIN_REPEAT sessions against a baseline recorded the same way fail a
+# full run on noise alone about 1 time in 150
+TOLERANCE = 0.75
+MIN_DELTA = 0.25
+MIN_REPEAT = 5
+
+# Seconds any interaction may take on portfolios up to DEFAULT_RECORDS, whatever
+# the baseline says, so a slow baseline cannot make a slow page pass
+RERUN_BUDGET = 2.0
+
+# Seconds a single rerun may take before AppTest gives up
+RERUN_TIMEOUT = 300
+
+# Streamlit release the data editor edits below were written against
+TESTED_STREAMLIT = '1.66'
+
+
+def _first_key(at, element, prefix):
+    """Key of the first widget of a kind whose key starts with prefix"""
+    return next(w.key for w in getattr(at, element) if w.key and w.key.startswith(prefix))
+
+
+def _edit_data_editor(at, key, delta):
+    """
+    Rerun as if the user edited the data_editor with this key.
+
+    AppTest cannot drive data editors, so the edit is sent as the widget state
+    the browser would send: the editor's JSON delta. This goes through private
+    AppTest internals (_tree, _run); when a Streamlit release changes them the
+    check stops with an error naming the tested version instead of timing
+    something else.
+    """
+    import streamlit
+
+    try:
+        editor = next(d for d in at.dataframe if d.proto.editing_mode and d.proto.id.endswith(key))
+        states = at._tree.get_widget_states()
+        state = states.widgets.add()
+        state.id = editor.proto.id
+    except (AttributeError, StopIteration) as e:
+        raise RuntimeError(
+            f"Cannot edit data editor '{key}' through AppTest internals on Streamlit {streamlit.__version__} "
+            f"(written against {TESTED_STREAMLIT}); update _edit_data_editor"
+        ) from e
+    state.string_value = json.dumps({'edited_rows': {}, 'added_rows': [], 'deleted_rows': [], **delta})
+    return at._run(states, timeout=RERUN_TIMEOUT)
+
+
+def app_interactions(at):
+    yield "switch business view", lambda: at.button_group(key="selected_business").set_value("Business B").run()
+    yield "switch to cost analysis", lambda: at.button_group(key="selected_view").set_value("Cost Analysis").run()
+    yield "back to records", lambda: at.button_group(key="selected_view").set_value("Current Records").run()
+    yield "select record", lambda: at.selectbox(key="record_edit_Business B_Resource").select_index(1).run()
+    yield "plan change", lambda: at.selectbox(key=_first_key(at, 'selectbox', 'change_type_')).set_value(
+        "Modify Count").run()
+
+    def apply_change():
+        at.number_input(key=_first_key(at, 'number_input', 'new_count_')).set_value(0)
+        apply = next(b for b in at.button if b.key and b.key.startswith('apply_count_'))
+        return apply.click().run()
+    yield "apply change", apply_change
+
+
+def dashboard_interactions(at):
+    yield "switch business view", lambda: at.selectbox[0].select_index(1).run()
+    yield "switch to future state", lambda: at.radio[0].set_value("Future State").run()
+    yield "back to all businesses", lambda: at.selectbox[0].select_index(0).run()
+
+
+def implementation_interactions(at):
+    yield "edit implementation row", lambda: _edit_data_editor(
+        at, "resource_table_Business A", {'edited_rows': {'0': {'Year 1': 3}}}
+    )
+    yield "add implementation row", lambda: _edit_data_editor(
+        at, "tech_table_Business B",
+        {'added_rows': [{'Description': 'Harness row', 'Implementation Type': 'Internal Build Costs',
+                         'Year 1': 1000}]}
+    )
+
+
+def assumptions_interactions(at):
+    yield "idle rerun", lambda: at.run()
+
+
+PAGES = {
+    'app.py': app_interactions,
+    'pages/dashboard.py': dashboard_interactions,
+    'pages/implementation.py': implementation_interactions,
+    'pages/assumptions.py': assumptions_interactions,
+}
+
+
+def run_session(page, portfolio):
+    """Drive one fresh session of a page; returns {interaction: seconds}"""
+    from streamlit.testing.v1 import AppTest
+    from portfolio_store import entity_key, shared_store
+
+    # Every session starts from the generated portfolio in the shared store
+    shared_store.clear()
+    shared_store().replace_all('rerun-latency', {
+        'records': {entity_key('records', r): r for r in portfolio['records']},
+        'changes': {entity_key('changes', c): c for c in portfolio['changes']},
+        'implementation_costs': portfolio['implementation_costs'],
+    })
+
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=RERUN_TIMEOUT)
+    for key in ('assumptions', 'business_names', 'FUNCTIONS'):
+        at.session_state[key] = portfolio[key]
+
+    timings = {}
+
+    def measure(name, action):
+        start = time.perf_counter()
+        action()
+        timings[name] = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"{page} raised during '{name}': {at.exception[0].value}")
+
+    measure("initial load", at.run)
+    for name, action in PAGES[page](at):
+        measure(name, action)
+    return timings
+
+
+def measure_pages(pages, records, repeat, seed):
+    from synthetic_data import generate_portfolio
+
+    portfolio = generate_portfolio(records=records, seed=seed)
+    results = {}
+    for page in pages:
+        runs = [run_session(page, portfolio) for _ in range(repeat)]
+        results[page] = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check rerun latency of the app pages against a baseline")
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES))
+    parser.add_argument('--records', type=int, default=DEFAULT_RECORDS, help="generated portfolio size")
+    parser.add_argument('--repeat', type=int, default=MIN_REPEAT,
+                        help=f"sessions per page, at least {MIN_REPEAT}; the median is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="store these timings as the baseline")
+    args = parser.parse_args(argv)
+    if args.repeat < MIN_REPEAT:
+        parser.error(f"--repeat must be at least {MIN_REPEAT}; the thresholds are calibrated for that many sessions")
+
+    sys.path.insert(0, ROOT)
+    # AppTest runs pages in bare mode, which logs a warning per session state access
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings('ignore')
+
+    results = measure_pages(args.pages, args.records, args.repeat, args.seed)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(str(args.records), {})
+
+    failures = []
+    for page, timings in results.items():
+        for name, seconds in timings.items():
+            before = baseline.get(page, {}).get(name)
+            status = 'new'
+            if before is not None:
+                status = 'ok'
+                # A new baseline replaces the old one, so only the budget applies to it
+                if args.update_baseline:
+                    status = 'recorded'
+                elif seconds > before * (1 + TOLERANCE) and seconds - before > MIN_DELTA:
+                    status = 'FAIL'
+                    failures.append(f"{page} '{name}' took {seconds:.3f}s (baseline {before:.3f}s)")
+                shown = f"{seconds:.3f}s / {before:.3f}s"
+            else:
+                shown = f"{seconds:.3f}s"
+            if args.records <= DEFAULT_RECORDS and seconds > RERUN_BUDGET:
+                status = 'FAIL'
+                failures.append(f"{page} '{name}' took {seconds:.3f}s (budget {RERUN_BUDGET:.1f}s)")
+            print(f"{page:<26} {name:<26} {shown:<20} {status}")
+
+    for failure in failures:
+        print(f"  - {failure}")
+    if failures:
+        if args.update_baseline:
+            print("\nBaseline not written: interactions over budget")
+        return 1
+
+    if args.update_baseline:
+        baselines[str(args.records)] = {**baseline, **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2)
+        print(f"\nBaseline for {args.records:,} records written to {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from cost_cube import CostCube
+
+# Widgets rendered per record in the record editor, keyed {prefix}{id}_{hash of its functions}
+RECORD_WIDGET_PREFIXES = (
+    'change_type_', 'year_', 'del_record_',
+    'new_count_', 'desc_count_', 'apply_count_',
+    'new_location_', 'desc_location_', 'apply_location_',
+    'new_cost_', 'desc_cost_', 'apply_cost_',
+)
+
+# Delete buttons rendered per change, keyed {prefix}{record id}_{change timestamp}
+CHANGE_WIDGET_PREFIXES = ('del_change_resource_', 'del_change_tech_', 'del_change_')
+
+# Implementation table state kept per business
+TABLE_KEY = re.compile(r'^(?P<business>.+)_(Resource|Technology)_table$')
+EDITOR_KEY = re.compile(r'^(resource|tech)_table_(?P<business>.+?)(_applied)?$')
+
+# Change fields that only repeat their record; records are matched on their stable id
+DUPLICATED_CHANGE_FIELDS = ('functions', 'category', 'business', 'record_timestamp')
+
+# Session keys no code reads any more
+UNUSED_KEYS = ('pending_deletions',)
+
+# Report groups for session keys that belong together
+KEY_GROUPS = {
+    'timing_history': 'Timing history',
+    'timing_run': 'Timing history',
+    'background_jobs': 'Background jobs',
+    'analysis_download': 'Background jobs',
+    'entity_versions': 'Shared portfolio versions',
+    'cost_cube': 'Cost cube',
+}
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes held by obj and everything it references, counting shared objects once"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        # Includes the data buffer when the array owns it
+        return sys.getsizeof(obj)
+    if isinstance(obj, CostCube):
+        return obj.nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def _key_group(key):
+    if key in ('records', 'changes', 'implementation_costs'):
+        return key.replace('_', ' ').capitalize()
+    if TABLE_KEY.match(key) or EDITOR_KEY.match(key):
+        return 'Implementation tables'
+    if key.startswith(RECORD_WIDGET_PREFIXES) or key.startswith(CHANGE_WIDGET_PREFIXES):
+        return 'Record and change widgets'
+    return KEY_GROUPS.get(key, key)
+
+
+def memory_report():
+    """Bytes held per session-state structure, largest first"""
+    sizes = {}
+    counts = {}
+    seen = set()
+    for key in list(st.session_state.keys()):
+        value = st.session_state[key]
+        group = _key_group(key)
+        sizes[group] = sizes.get(group, 0) + deep_sizeof(value, seen)
+        # Portfolio structures count their entities, other groups their keys
+        entries = len(value) if key in ('records', 'changes', 'implementation_costs') else 1
+        counts[group] = counts.get(group, 0) + entries
+
+    report = pd.DataFrame({
+        'Structure': list(sizes),
+        'Entries': [counts[g] for g in sizes],
+        'Bytes': list(sizes.values()),
+    })
+    return report.sort_values('Bytes', ascending=False, ignore_index=True)
+
+
+def compact_session_state(force=False):
+    """
+    Drop session state that no longer belongs to anything in the portfolio.
+
+    Removes widget keys of deleted records (or of records whose functions
+    changed, which changes their key), delete buttons of removed changes,
+    implementation tables of businesses that no longer exist, unused keys and
+    change fields that only duplicate their record. Runs once per portfolio
+    revision, so reruns without portfolio edits cost one comparison.
+    Returns the number of keys removed.
+    """
+    revision = st.session_state.get('store_revision')
+    if not force and revision is not None and st.session_state.get('compacted_revision') == revision:
+        return 0
+
+    records = st.session_state.get('records', [])
+    changes = st.session_state.get('changes', [])
+    record_suffixes = {f"{r['id']}_{hash(tuple(sorted(r['functions'])))}" for r in records}
+    change_suffixes = {f"{c['record_id']}_{c['timestamp']}" for c in changes}
+    businesses = set(st.session_state.get('business_names', {})) | set(st.session_state.get('assumptions', {}))
+
+    stale = []
+    for key in list(st.session_state.keys()):
+        if key in UNUSED_KEYS:
+            stale.append(key)
+            continue
+        record_prefix = next((p for p in RECORD_WIDGET_PREFIXES if key.startswith(p)), None)
+        if record_prefix is not None:
+            if key[len(record_prefix):] not in record_suffixes:
+                stale.append(key)
+            continue
+        change_prefix = next((p for p in CHANGE_WIDGET_PREFIXES if key.startswith(p)), None)
+        if change_prefix is not None:
+            if key[len(change_prefix):] not in change_suffixes:
+                stale.append(key)
+            continue
+        table = TABLE_KEY.match(key) or EDITOR_KEY.match(key)
+        if table and table.group('business') not in businesses:
+            stale.append(key)
+
+    for key in stale:
+        del st.session_state[key]
+
+    # Session copies only; the shared store and saved workbooks keep what they have
+    for change in changes:
+        for field in DUPLICATED_CHANGE_FIELDS:
+            change.pop(field, None)
+
+    st.session_state.compacted_revision = revision
+    return len(stale)
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:,.0f} {unit}"
+        size /= 1024
+    return f"{size:,.1f} GB"
+
+
+def render_memory_panel():
+    """Sidebar panel measuring this session's state on demand and compacting it"""
+    with st.sidebar.expander("Session Memory"):
+        col1, col2 = st.columns(2)
+        measure = col1.button("Measure", key="measure_session_memory")
+        if col2.button("Compact", key="compact_session_memory"):
+            removed = compact_session_state(force=True)
+            st.caption(f"Removed {removed} stale key{'s' if removed != 1 else ''}")
+            measure = True
+        if measure:
+            report = memory_report()
+            st.caption(f"Total {_format_bytes(report['Bytes'].sum())} in {len(st.session_state.keys())} keys")
+            st.dataframe(
+                report.assign(Size=report['Bytes'].map(_format_bytes))[['Structure', 'Entries', 'Size']],
+                hide_index=True
+            )
@@ -1,12 +1,11 @@
+import copy
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+from cost_model import DEFAULT_ASSUMPTIONS, IMPLEMENTATION_TYPES, REPORTING_CURRENCY, change_key
 
-# Move constants here
-IMPLEMENTATION_TYPES = {
-    "Resource": ["Rebadge", "House Resources", "New Hire"],
-    "Technology": ["Internal Build Costs"]
-}
+CATEGORIES = ["Resource", "Technology"]
+TECH_LOCATIONS = ["On-premise", "Cloud"]
 
 def init_session_state():
     """Initialize session state with default values"""
@@ -20,34 +19,21 @@ def init_session_state():
         st.session_state.implementation_costs = {}
     
     if 'assumptions' not in st.session_state:
-        st.session_state.assumptions = {
-            'Business A': {
-                'Onshore': 100000.0,
-                'Offshore': 40000.0,
-                'Implementation': {
-                    'Rebadge': 15000.0,
-                    'House Resources': 20000.0,
-                    'New Hire': 25000.0
-                }
-            },
-            'Business B': {
-                'Onshore': 90000.0,
-                'Offshore': 35000.0,
-                'Implementation': {
-                    'Rebadge': 12000.0,
-                    'House Resources': 18000.0,
-                    'New Hire': 22000.0
-                }
-            }
-        }
+        st.session_state.assumptions = copy.deepcopy(DEFAULT_ASSUMPTIONS)
 
     # Initialize trigger rerun if not present
     if 'trigger_rerun' not in st.session_state:
         st.session_state.trigger_rerun = False
 
-    # Add a deletion tracker
-    if 'pending_deletions' not in st.session_state:
-        st.session_state.pending_deletions = set()
+    # Resource record costs are re-derived lazily when this version moves on
+    if 'assumptions_version' not in st.session_state:
+        st.session_state.assumptions_version = 0
+    if 'derived_costs_version' not in st.session_state:
+        st.session_state.derived_costs_version = st.session_state.assumptions_version
+
+    # Reporting-currency value of one unit of each other currency (flat or per year)
+    if 'fx_rates' not in st.session_state:
+        st.session_state.fx_rates = {}
 
     # Add a function to track the last modification time
     if 'last_modified' not in st.session_state:
@@ -66,6 +52,8 @@ def init_session_state():
                     row = {
                         'Description': 'No description added',
                         'Implementation Type': impl_type,
+                        'Change': None,
+                        'Currency': REPORTING_CURRENCY,
                     }
                     
                     if category == "Resource":
@@ -81,6 +69,8 @@ def init_session_state():
                 empty_row = {
                     'Description': 'No description added',
                     'Implementation Type': IMPLEMENTATION_TYPES[category][0],
+                    'Change': None,
+                    'Currency': REPORTING_CURRENCY,
                     **({'Salary': 0} if category == "Resource" else {}),
                     **{f'Year {i+1}': 0 for i in range(5)}
                 }
@@ -97,4 +87,74 @@ def init_session_state():
 
     # Initialize functions if not exists (note the uppercase FUNCTIONS)
     if 'FUNCTIONS' not in st.session_state:
-        st.session_state.FUNCTIONS = ["Development", "Testing", "Support"]
\ No newline at end of file
+        st.session_state.FUNCTIONS = ["Development", "Testing", "Support"]
+
+
+def change_labels(records, changes):
+    """
+    {change key: label} shown for the change an implementation line funds.
+
+    Labels name the record and describe the change; the change key is appended
+    only where two changes would otherwise share a label.
+    """
+    names = {}
+    for record in records:
+        if record['category'] == 'Technology':
+            names[record['id']] = record['tech_name']
+        else:
+            names[record['id']] = f"{', '.join(record['functions'])} Team"
+
+    labels = {}
+    for change in changes:
+        name = names.get(change['record_id'], f"Record {change['record_id']}")
+        description = change.get('description') or change['type']
+        labels[change_key(change)] = f"{name}: {description} (Year {change['implementation_year']})"
+
+    taken = {}
+    for label in labels.values():
+        taken[label] = taken.get(label, 0) + 1
+    return {key: label if taken[label] == 1 else f"{label} [{key}]" for key, label in labels.items()}
+
+
+def rebuild_implementation_tables(implementation_costs):
+    """
+    Rebuild the business/category tables from the implementation cost entries.
+
+    Rows keyed business_type_row keep that row label, so later table edits update
+    the same implementation cost entries. Tables left without entries, e.g. after
+    another session removed their last line, are dropped so the default table
+    is shown again.
+    """
+    table_rows = {}
+    for key, data in implementation_costs.items():
+        business, _, rest = key.partition('_')
+        middle, _, suffix = rest.partition('_')
+        for impl_type, impl_data in data['resources'].items():
+            # Older entries store bare yearly counts; they have no table row
+            if not isinstance(impl_data, dict):
+                continue
+            category = "Resource" if impl_type in IMPLEMENTATION_TYPES["Resource"] else "Technology"
+            row = {
+                'Description': impl_data['description'],
+                'Implementation Type': impl_type,
+                'Change': impl_data.get('change'),
+                'Currency': impl_data.get('currency') or REPORTING_CURRENCY,
+                **({'Salary': impl_data['salary']} if category == "Resource" else {}),
+                **{f'Year {i+1}': impl_data['values'][i] for i in range(5)}
+            }
+            label = int(suffix) if middle == impl_type and suffix.isdigit() else None
+            table_rows.setdefault(f"{business}_{category}_table", []).append((label, row))
+    
+    for table_key in [k for k in st.session_state if str(k).endswith(('_Resource_table', '_Technology_table'))]:
+        if table_key not in table_rows:
+            del st.session_state[table_key]
+    
+    for table_key, rows in table_rows.items():
+        next_label = max((label for label, _ in rows if label is not None), default=-1) + 1
+        labels = []
+        for label, _ in rows:
+            if label is None:
+                label = next_label
+                next_label += 1
+            labels.append(label)
+        st.session_state[table_key] = pd.DataFrame([row for _, row in rows], index=labels)
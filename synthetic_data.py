@@ -0,0 +1,171 @@
+"""
+Seeded synthetic portfolios for benchmarks and load tests.
+
+Portfolios have the same shape as the app's session state (records, changes,
+implementation_costs, assumptions, business_names, FUNCTIONS), so they can be
+saved with workbook_io, fed to cost_model or loaded into a session.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from cost_model import PROJECTION_YEARS, change_key
+
+LOCATIONS = ['Onshore', 'Offshore']
+
+IMPLEMENTATION_RATES = {'Rebadge': 15000.0, 'House Resources': 20000.0, 'New Hire': 25000.0}
+
+TECH_NAMES = ['Platform', 'Tooling', 'Licences', 'Hosting', 'Monitoring', 'Data Store']
+
+
+def business_name(i):
+    """Business A, Business B, ..., Business Z, Business AA, ..."""
+    letters = ''
+    i += 1
+    while i:
+        i, rem = divmod(i - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return f"Business {letters}"
+
+
+def generate_assumptions(businesses, rng):
+    assumptions = {}
+    for business in businesses:
+        onshore = float(rng.integers(80, 121) * 1000)
+        assumptions[business] = {
+            'Onshore': onshore,
+            'Offshore': float(round(onshore * rng.uniform(0.3, 0.5), -3)),
+            'Implementation': {
+                impl_type: float(round(rate * rng.uniform(0.8, 1.2), -3))
+                for impl_type, rate in IMPLEMENTATION_RATES.items()
+            }
+        }
+    return assumptions
+
+
+def generate_portfolio(records=1000, businesses=2, functions=12, changes_per_record=0.3,
+                       implementation_rows=None, resource_share=0.7, seed=0):
+    """
+    Build a reproducible portfolio of the given size.
+
+    changes_per_record is the mean number of changes planned per record and
+    implementation_rows the number of implementation table entries (defaults to
+    one per ten changes). The same arguments always give the same portfolio.
+    """
+    rng = np.random.default_rng(seed)
+    business_list = [business_name(i) for i in range(businesses)]
+    function_list = [f"Function {i + 1:02d}" for i in range(functions)]
+    assumptions = generate_assumptions(business_list, rng)
+    base_time = datetime(2024, 1, 1)
+
+    # Record attributes are drawn as whole columns, then zipped into dicts
+    n = records
+    business_idx = rng.integers(0, businesses, n)
+    is_resource = rng.random(n) < resource_share
+    location_idx = rng.integers(0, len(LOCATIONS), n)
+    count = rng.integers(1, 40, n)
+    tech_cost = rng.integers(10, 500, n) * 1000.0
+    function_count = np.minimum(rng.geometric(0.6, n), functions)
+    first_function = rng.integers(0, functions, n)
+
+    rates = np.array([[assumptions[b][loc] for loc in LOCATIONS] for b in business_list])
+    unit_cost = rates[business_idx, location_idx]
+
+    record_list = []
+    for i in range(n):
+        funcs = [function_list[(first_function[i] + k) % functions] for k in range(function_count[i])]
+        resource = bool(is_resource[i])
+        record_list.append({
+            'id': i,
+            'business': business_list[business_idx[i]],
+            'category': 'Resource' if resource else 'Technology',
+            'functions': funcs,
+            'function_descriptions': {f: '' for f in funcs},
+            'tech_name': None if resource else f"{TECH_NAMES[i % len(TECH_NAMES)]} {i}",
+            'location': LOCATIONS[location_idx[i]] if resource else None,
+            'count': int(count[i]) if resource else None,
+            'unit_cost': float(unit_cost[i]) if resource else None,
+            'total_cost': float(unit_cost[i] * count[i]) if resource else float(tech_cost[i]),
+            'currency': 'USD',
+            'comments': '',
+            'timestamp': base_time.isoformat(),
+        })
+
+    # Changes: a Poisson number per record, typed by the record's category
+    change_counts = rng.poisson(changes_per_record, n)
+    change_rows = np.repeat(np.arange(n), change_counts)
+    m = len(change_rows)
+    years = rng.integers(1, PROJECTION_YEARS + 1, m)
+    kind = rng.random(m)
+    new_count = rng.integers(0, 40, m)
+    cost_factor = rng.uniform(0.4, 1.1, m)
+
+    change_list = []
+    for j, (row, year) in enumerate(zip(change_rows.tolist(), years.tolist())):
+        record = record_list[row]
+        change = {
+            'record_id': record['id'],
+            'timestamp': (base_time + timedelta(seconds=j + 1)).isoformat(),
+            'implementation_year': year,
+            'description': f"Synthetic change {j}",
+        }
+        if record['category'] == 'Technology':
+            change.update({
+                'type': 'cost_change',
+                'from': record['total_cost'],
+                'to': float(round(record['total_cost'] * cost_factor[j], -2)),
+            })
+        elif kind[j] < 0.7:
+            change.update({'type': 'count_change', 'from': record['count'], 'to': int(new_count[j])})
+        else:
+            other = LOCATIONS[1 - LOCATIONS.index(record['location'])]
+            change.update({'type': 'location_change', 'from': record['location'], 'to': other})
+        change_list.append(change)
+
+    # Implementation table entries, keyed like rows saved from the Implementation page
+    if implementation_rows is None:
+        implementation_rows = max(m // 10, 1) if m else 0
+    implementation_costs = {}
+    impl_business = rng.integers(0, businesses, implementation_rows)
+    impl_resource = rng.random(implementation_rows) < resource_share
+    impl_values = rng.integers(0, 5, (implementation_rows, PROJECTION_YEARS))
+    impl_amounts = rng.integers(0, 200, (implementation_rows, PROJECTION_YEARS)) * 1000.0
+    impl_change = rng.random(implementation_rows)
+    resource_types = list(IMPLEMENTATION_RATES)
+
+    # Every implementation row funds a change of its own business
+    business_changes = {}
+    for change in change_list:
+        business = record_list[change['record_id']]['business']
+        business_changes.setdefault(business, []).append(change_key(change))
+    for k in range(implementation_rows):
+        business = business_list[impl_business[k]]
+        if impl_resource[k]:
+            impl_type = resource_types[k % len(resource_types)]
+            values = impl_values[k].astype(float).tolist()
+        else:
+            impl_type = 'Internal Build Costs'
+            values = impl_amounts[k].tolist()
+        candidates = business_changes.get(business, [])
+        funded = candidates[int(impl_change[k] * len(candidates))] if candidates else None
+        # No salary, so resource rows are priced at the business's implementation assumption
+        implementation_costs[f"{business}_{impl_type}_{k}"] = {
+            'resources': {
+                impl_type: {
+                    'values': values,
+                    'salary': None,
+                    'description': f"Synthetic implementation {k}",
+                    'currency': 'USD',
+                    'change': funded,
+                }
+            }
+        }
+
+    return {
+        'records': record_list,
+        'changes': change_list,
+        'implementation_costs': implementation_costs,
+        'assumptions': assumptions,
+        'business_names': {b: b for b in business_list},
+        'FUNCTIONS': function_list,
+    }
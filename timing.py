@@ -0,0 +1,166 @@
+import functools
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Reruns per page kept for the rolling percentiles
+HISTORY_SIZE = 100
+
+PERCENTILES = [50, 90, 99]
+
+
+def timing_enabled():
+    return st.session_state.get('timing_enabled', False)
+
+
+def _active_run():
+    """The timing record of the current rerun, or None when timing is off or outside a script run"""
+    if get_script_run_ctx() is None or not timing_enabled():
+        return None
+    run = st.session_state.get('timing_run')
+    if run is None or run['closed']:
+        return None
+    return run
+
+
+def begin_rerun(page):
+    """Start timing a page rerun; call once at the top of the page"""
+    if not timing_enabled():
+        st.session_state.pop('timing_run', None)
+        return
+    now = time.perf_counter()
+    st.session_state.timing_run = {
+        'page': page,
+        'start': now,
+        'lap': None,
+        'lap_start': now,
+        'sections': {},
+        'calls': {},
+        'closed': False,
+    }
+
+
+def _close_lap(run, now):
+    if run['lap'] is not None:
+        sections = run['sections']
+        sections[run['lap']] = sections.get(run['lap'], 0.0) + now - run['lap_start']
+    run['lap'] = None
+
+
+def lap(name):
+    """
+    End the current page section and start timing the next one.
+
+    Sections run back to back, so marking where each starts is enough and the
+    page code keeps its layout. A section that is entered again adds up.
+    """
+    run = _active_run()
+    if run is None:
+        return
+    now = time.perf_counter()
+    _close_lap(run, now)
+    run['lap'] = name
+    run['lap_start'] = now
+
+
+def end_lap():
+    """End the current section without starting another, so untimed code is not charged to it"""
+    run = _active_run()
+    if run is not None:
+        _close_lap(run, time.perf_counter())
+
+
+def timed(fn=None, name=None):
+    """Decorator timing every call of a calculation function during instrumented reruns"""
+    if fn is None:
+        return lambda f: timed(f, name)
+    label = name or fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        run = _active_run()
+        if run is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            total, count = run['calls'].get(label, (0.0, 0))
+            run['calls'][label] = (total + time.perf_counter() - start, count + 1)
+    return wrapper
+
+
+def _seconds(value):
+    # Sections store seconds, calls (seconds, count)
+    return value[0] if isinstance(value, tuple) else value
+
+
+def _timing_table(history, key):
+    """One row per timed name with the latest rerun's time and rolling percentiles, in milliseconds"""
+    current = history[-1][key]
+    names = list(dict.fromkeys(name for run in history for name in run[key]))
+
+    rows = []
+    for name in names:
+        seconds = [_seconds(run[key][name]) for run in history if name in run[key]]
+        row = {'Section': name, 'This rerun (ms)': _seconds(current[name]) * 1000 if name in current else None}
+        if key == 'calls':
+            row['Calls'] = current[name][1] if name in current else None
+        for q, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+            row[f"p{q} (ms)"] = value * 1000
+        row['Reruns'] = len(seconds)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def render_timing_panel():
+    """
+    Sidebar toggle and per-rerun timing breakdown; call at the very end of the page.
+
+    Closes the current rerun's timings, adds them to the page's rolling history
+    and shows this rerun next to the p50/p90/p99 of recent reruns.
+    """
+    run = st.session_state.get('timing_run')
+    if run is not None and not run['closed'] and timing_enabled():
+        now = time.perf_counter()
+        _close_lap(run, now)
+        run['sections']['Total'] = now - run['start']
+        run['closed'] = True
+        history = st.session_state.setdefault('timing_history', {}).setdefault(
+            run['page'], deque(maxlen=HISTORY_SIZE)
+        )
+        history.append({'sections': dict(run['sections']), 'calls': dict(run['calls'])})
+
+    with st.sidebar:
+        enabled = st.toggle(
+            "Time page sections",
+            value=timing_enabled(),
+            help="Record how long each part of the page takes on every rerun"
+        )
+        if enabled != timing_enabled():
+            st.session_state.timing_enabled = enabled
+            st.rerun()
+        if not enabled or run is None or not run['closed']:
+            return
+
+        history = st.session_state.timing_history[run['page']]
+        with st.expander(f"Timings: {run['sections']['Total'] * 1000:,.0f} ms", expanded=True):
+            number_format = {c: st.column_config.NumberColumn(format="%.1f") for c in
+                             ['This rerun (ms)'] + [f"p{q} (ms)" for q in PERCENTILES]}
+            st.caption("Page sections")
+            st.dataframe(
+                _timing_table(history, 'sections'),
+                hide_index=True, column_config=number_format
+            )
+            if any(past['calls'] for past in history):
+                st.caption("Calculation calls")
+                st.dataframe(
+                    _timing_table(history, 'calls'),
+                    hide_index=True, column_config=number_format
+                )
+            if st.button("Reset timings"):
+                history.clear()
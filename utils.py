@@ -1,5 +1,12 @@
 import streamlit as st
 
+from cost_model import (
+    PROJECTION_YEARS, baseline_costs, convert_costs, derive_resource_costs, implementation_costs_by_type,
+    implementation_totals, item_currencies, project_costs
+)
+from timing import timed
+
+@timed
 def create_change_message(change, record):
     """Create a descriptive message for a change"""
     if change['type'] == 'count_change':
@@ -27,79 +34,53 @@ def create_change_message(change, record):
             f"- Reason: {change.get('description', 'No description provided')}"
         )
 
+@timed
+def refresh_derived_costs():
+    """Re-price Resource records once after the cost assumptions have changed"""
+    version = st.session_state.get('assumptions_version', 0)
+    if st.session_state.get('derived_costs_version') != version:
+        derive_resource_costs(st.session_state.get('records', []), st.session_state.assumptions)
+        st.session_state.derived_costs_version = version
+
+@timed
 def calculate_future_cost(record, changes, year=5):
     """Calculate future cost for a record based on changes for a specific year"""
-    future_cost = record['total_cost']
-    
-    # Get all changes for this record, sorted by implementation year
-    record_changes = sorted(
-        [c for c in changes if str(c['record_id']) == str(record['id'])],
-        key=lambda x: x['implementation_year']
-    )
-    
-    # Apply changes sequentially up to the specified year
-    for change in record_changes:
-        if change['implementation_year'] <= year:
-            if change['type'] == 'count_change':
-                if record['category'] == 'Resource':
-                    future_cost = (change['to'] * record['unit_cost']) if record['unit_cost'] is not None else 0
-            elif change['type'] == 'location_change':
-                if record['category'] == 'Resource':
-                    new_unit_cost = st.session_state.assumptions[record['business']][change['to']]
-                    future_cost = (record['count'] * new_unit_cost) if record['count'] is not None else future_cost
-            elif change['type'] == 'cost_change':
-                future_cost = change['to']
-    
-    return future_cost
+    projection = project_costs([record], changes, st.session_state.assumptions, max(year, PROJECTION_YEARS))
+    return projection[0, max(year, 0)]
 
+@timed
 def calculate_total_savings():
     """Calculate total savings over 5 years"""
-    total_current = sum(r['total_cost'] * 5 for r in st.session_state.records)
-    
-    total_future = 0
-    for record in st.session_state.records:
-        yearly_costs = []
-        for year in range(1, 6):  # Years 1-5
-            future_cost = calculate_future_cost(record, st.session_state.changes, year)
-            yearly_costs.append(future_cost)
-        total_future += sum(yearly_costs)
-    
-    return total_current - total_future
+    records = st.session_state.records
+    currencies = item_currencies(records)
+    fx_rates = st.session_state.get('fx_rates', {})
+    baseline = convert_costs(baseline_costs(records, st.session_state.assumptions), currencies, fx_rates)
+    projection = convert_costs(
+        project_costs(records, st.session_state.changes, st.session_state.assumptions), currencies, fx_rates
+    )
+    return baseline[:, 1:].sum() - projection[:, 1:].sum()
 
+@timed
 def calculate_implementation_costs(business):
     """Calculate implementation costs for a business"""
-    costs = {
-        'Resource': {impl_type: [0] * 5 for impl_type in ['Rebadge', 'House Resources', 'New Hire']},
-        'Technology': {impl_type: [0] * 5 for impl_type in ['Internal Build Costs']}
-    }
-    
-    for change_key, data in st.session_state.implementation_costs.items():
-        if change_key.startswith(business):
-            for impl_type, impl_data in data['resources'].items():
-                if isinstance(impl_data, dict):
-                    values = impl_data.get('values', [0] * 5)
-                    salary = impl_data.get('salary', 0)
-                    
-                    if impl_type in costs['Resource']:
-                        cost_per_resource = salary if salary > 0 else st.session_state.assumptions[business]['Implementation'][impl_type]
-                        for year in range(5):
-                            costs['Resource'][impl_type][year] += float(values[year]) * float(cost_per_resource)
-                    elif impl_type in costs['Technology']:
-                        for year in range(5):
-                            costs['Technology'][impl_type][year] += float(values[year])
-    
-    return costs
+    return implementation_costs_by_type(
+        st.session_state.implementation_costs,
+        st.session_state.assumptions,
+        st.session_state.get('fx_rates', {}),
+        business
+    )
 
+@timed
 def calculate_total_implementation_cost():
     """Calculate total implementation cost across all businesses"""
-    total_cost = 0
-    for business in ['Business A', 'Business B']:
-        costs = calculate_implementation_costs(business)
-        for category in costs.values():
-            for yearly_costs in category.values():
-                total_cost += sum(yearly_costs)
-    return total_cost
+    return implementation_totals(
+        st.session_state.implementation_costs,
+        st.session_state.assumptions,
+        st.session_state.get('fx_rates', {}),
+        ['Business A', 'Business B']
+    ).sum()
 
+@timed
 def calculate_net_savings():
     """Calculate net savings (total savings minus implementation costs)"""
-    return calculate_total_savings() - calculate_total_implementation_cost() 
\ No newline at end of file
+    return calculate_total_savings() - calculate_total_implementation_cost() 
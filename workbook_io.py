@@ -0,0 +1,146 @@
+import io
+import json
+
+import pandas as pd
+
+from cost_model import REPORTING_CURRENCY, line_currency
+
+
+def _no_progress(fraction, message=None):
+    pass
+
+
+def write_analysis(records, changes, implementation_costs, progress=_no_progress):
+    """
+    Serialize a portfolio to the "Save Analysis" Excel format and return the bytes.
+
+    progress(fraction, message) is called as each sheet is written.
+    """
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        # Save records
+        progress(0.0, "Writing records")
+        records_df = pd.DataFrame(records)
+        if not records_df.empty:
+            records_df['functions'] = records_df['functions'].apply(lambda x: json.dumps(x))
+            records_df['function_descriptions'] = records_df['function_descriptions'].apply(lambda x: json.dumps(x))
+        records_df.to_excel(writer, sheet_name='Records', index=False)
+
+        # Save changes
+        progress(0.4, "Writing changes")
+        changes_df = pd.DataFrame(changes)
+        changes_df.to_excel(writer, sheet_name='Changes', index=False)
+
+        # Save implementation costs
+        progress(0.6, "Writing implementation costs")
+        impl_costs_data = []
+        for key, data in implementation_costs.items():
+            if isinstance(data, dict) and 'resources' in data:
+                for impl_type, impl_data in data['resources'].items():
+                    if isinstance(impl_data, dict):
+                        row = {
+                            'key': key,
+                            'implementation_type': impl_type,
+                            'values': json.dumps(impl_data.get('values', [])),
+                            'salary': impl_data.get('salary'),
+                            'description': impl_data.get('description', ''),
+                            'currency': impl_data.get('currency'),
+                            'change': impl_data.get('change')
+                        }
+                        impl_costs_data.append(row)
+
+        if impl_costs_data:
+            impl_costs_df = pd.DataFrame(impl_costs_data)
+            impl_costs_df.to_excel(writer, sheet_name='Implementation', index=False)
+        progress(0.8, "Compressing workbook")
+
+    progress(1.0, "Done")
+    return buffer.getvalue()
+
+
+def read_analysis(source, progress=_no_progress):
+    """
+    Load a "Save Analysis" workbook.
+
+    `source` may be a path, raw bytes or a file-like object. Returns a
+    (records, changes, implementation_costs) tuple; implementation_costs is
+    empty when the workbook has no Implementation sheet. progress(fraction,
+    message) is called as each sheet is read.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    progress(0.0, "Opening workbook")
+    with pd.ExcelFile(source) as workbook:
+        progress(0.2, "Reading records")
+        records_df = workbook.parse('Records')
+        progress(0.5, "Reading changes")
+        changes_df = workbook.parse('Changes')
+        progress(0.7, "Reading implementation costs")
+        impl_costs_df = workbook.parse('Implementation') if 'Implementation' in workbook.sheet_names else None
+
+    implementation_costs = {}
+    if impl_costs_df is not None:
+        # Rebuild implementation costs structure
+        for _, row in impl_costs_df.iterrows():
+            key = row['key']
+            impl_type = row['implementation_type']
+
+            try:
+                values = json.loads(row['values']) if isinstance(row['values'], str) else []
+                values = [float(v) if not pd.isna(v) else 0.0 for v in values]
+            except (ValueError, TypeError):
+                values = [0.0] * 5
+
+            try:
+                salary = float(row['salary']) if not pd.isna(row['salary']) else None
+            except (ValueError, TypeError):
+                salary = None
+
+            description = row.get('description', '') if not pd.isna(row.get('description')) else ''
+            currency = row.get('currency') if not pd.isna(row.get('currency')) else None
+            currency = line_currency(impl_type, {'salary': salary, 'currency': currency})
+            # Key of the change the line funds; older workbooks have no such column
+            change = row.get('change') if not pd.isna(row.get('change')) else None
+
+            if key not in implementation_costs:
+                implementation_costs[key] = {'resources': {}}
+
+            implementation_costs[key]['resources'][impl_type] = {
+                'values': values,
+                'salary': salary,
+                'description': description,
+                'currency': currency,
+                'change': change
+            }
+
+    if not records_df.empty:
+        records_df['functions'] = records_df['functions'].apply(lambda x: json.loads(x) if isinstance(x, str) else [])
+        records_df['function_descriptions'] = records_df['function_descriptions'].apply(
+            lambda x: json.loads(x) if isinstance(x, str) else {}
+        )
+
+    records = records_df.to_dict('records')
+    changes = changes_df.to_dict('records')
+
+    # Clean up NaN values
+    for record in records:
+        for key, value in record.items():
+            if not isinstance(value, (list, dict)) and pd.isna(value):
+                if key in ['functions']:
+                    record[key] = []
+                elif key in ['function_descriptions']:
+                    record[key] = {}
+                else:
+                    record[key] = None
+        # Resource costs are priced from the reporting-currency rate table
+        if record.get('category') == 'Resource':
+            record['currency'] = REPORTING_CURRENCY
+
+    for change in changes:
+        for key, value in change.items():
+            if not isinstance(value, (list, dict)) and pd.isna(value):
+                change[key] = None
+
+    progress(1.0, "Done")
+    return records, changes, implementation_costs